@@ -28,7 +28,7 @@ class EducationLevelAdmin(ContentAdminSite):
 class ClassLevelAdmin(ContentAdminSite):
     """Admin configuration for ClassLevel model."""
     
-    list_display = ('name', 'education_level', 'order')
+    list_display = ('name', 'education_level', 'order', 'lesson_count', 'free_lesson_count')
     list_filter = ('education_level',)
     prepopulated_fields = {'slug': ('name',)}
     search_fields = ('name',)
@@ -39,7 +39,7 @@ class ClassLevelAdmin(ContentAdminSite):
 class SubjectAdmin(ContentAdminSite):
     """Admin configuration for Subject model."""
     
-    list_display = ('name', 'slug')
+    list_display = ('name', 'slug', 'lesson_count', 'free_lesson_count')
     prepopulated_fields = {'slug': ('name',)}
     search_fields = ('name',)
 
@@ -0,0 +1,154 @@
+import random
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from core.cache import bump_version, cache_timeout, get_version, is_shared
+from .models import EducationLevel, ClassLevel, Subject, SubjectClassLevel, VideoLesson
+
+CATALOG_VERSION_KEY = 'content:catalog-tree:version'
+CATALOG_CACHE_KEY = 'content:catalog-tree:%s'
+# Trees of retired versions are never read again; let them run out.
+CATALOG_CACHE_TIMEOUT = 60 * 60 * 24
+FREE_SAMPLE_VERSION_KEY = 'content:free-sample-pool:version'
+
+# (version, loaded_at, cards) of the free-lesson pool held by this process.
+# Replaced as a whole so concurrent readers always see a consistent tuple.
+_free_sample_pool = (None, 0.0, ())
+
+
+def _counts(lessons=0, free_lessons=0):
+    return {'lesson_count': lessons, 'free_lesson_count': free_lessons}
+
+
+def build_catalog_tree():
+    """
+    Build the education level -> class level -> subject tree with lesson and
+    free-lesson counts per node. Costs four queries regardless of catalog size.
+    """
+    cells = SubjectClassLevel.objects.filter(lesson_count__gt=0).values(
+        'class_level_id', 'subject_id', 'lesson_count', 'free_lesson_count'
+    )
+    by_class_level = defaultdict(dict)
+    for cell in cells:
+        by_class_level[cell['class_level_id']][cell['subject_id']] = cell
+
+    subjects = []
+    subject_nodes = {}
+    for subject in Subject.objects.all():
+        node = {
+            'id': subject.id,
+            'name': subject.name,
+            'slug': subject.slug,
+            'description': subject.description,
+            'icon': subject.icon.url if subject.icon else None,
+        }
+        subject_nodes[subject.id] = node
+        subjects.append({**node, **_counts(subject.lesson_count, subject.free_lesson_count)})
+
+    class_levels = defaultdict(list)
+    for class_level in ClassLevel.objects.all():
+        level_subjects = []
+        for subject_id, node in subject_nodes.items():
+            cell = by_class_level[class_level.id].get(subject_id)
+            if cell:
+                level_subjects.append({**node, **_counts(cell['lesson_count'], cell['free_lesson_count'])})
+        class_levels[class_level.education_level_id].append({
+            'id': class_level.id,
+            'name': class_level.name,
+            'slug': class_level.slug,
+            'description': class_level.description,
+            'order': class_level.order,
+            **_counts(class_level.lesson_count, class_level.free_lesson_count),
+            'subjects': level_subjects,
+        })
+
+    education_levels = []
+    for education_level in EducationLevel.objects.all():
+        children = class_levels.get(education_level.id, [])
+        education_levels.append({
+            'id': education_level.id,
+            'name': education_level.name,
+            'slug': education_level.slug,
+            'description': education_level.description,
+            'order': education_level.order,
+            **_counts(
+                sum(child['lesson_count'] for child in children),
+                sum(child['free_lesson_count'] for child in children),
+            ),
+            'class_levels': children,
+        })
+
+    return {'education_levels': education_levels, 'subjects': subjects}
+
+
+def get_catalog_tree():
+    """
+    Return the cached catalog tree, building it on the first call after a change.
+
+    The tree is stored under the current version token, so a build that
+    started before an invalidation can only write to the retired key. With a
+    per-process cache the tree is kept for LOCAL_CACHE_TIMEOUT seconds at
+    most, since other workers' invalidations do not reach it.
+    """
+    key = CATALOG_CACHE_KEY % get_version(CATALOG_VERSION_KEY)
+    tree = cache.get(key)
+    if tree is None:
+        tree = build_catalog_tree()
+        cache.set(key, tree, timeout=cache_timeout(CATALOG_CACHE_TIMEOUT))
+    return tree
+
+
+def invalidate_catalog_tree():
+    bump_version(CATALOG_VERSION_KEY)
+
+
+def build_free_sample_cards():
+    """Serialize every free lesson into the card dict the landing page shows."""
+    lessons = (
+        VideoLesson.objects.filter(is_free=True)
+        .select_related('subject')
+        .only('id', 'title', 'thumbnail', 'duration', 'subject__id', 'subject__name')
+        .order_by('id')
+    )
+    return tuple(
+        {
+            "id": str(video.id),
+            "title": video.title,
+            "thumbnail": video.thumbnail.url if video.thumbnail else "",
+            "subject": video.subject.name,
+            "duration": str(video.duration),
+            "courseId": str(video.subject.id),
+        }
+        for video in lessons
+    )
+
+
+def get_free_sample_cards():
+    """
+    Return the pre-serialized free-lesson pool.
+
+    The pool lives in process memory; a version token in the shared cache tells
+    each worker when lessons changed and its copy must be rebuilt. A
+    per-process cache cannot carry the token between workers, so the pool is
+    then also rebuilt every LOCAL_CACHE_TIMEOUT seconds.
+    """
+    global _free_sample_pool
+    version = get_version(FREE_SAMPLE_VERSION_KEY)
+    pool_version, loaded_at, cards = _free_sample_pool
+    expired = not is_shared() and time.monotonic() - loaded_at >= settings.LOCAL_CACHE_TIMEOUT
+    if pool_version != version or expired:
+        cards = build_free_sample_cards()
+        _free_sample_pool = (version, time.monotonic(), cards)
+    return cards
+
+
+def sample_free_lessons(count):
+    cards = get_free_sample_cards()
+    return random.sample(cards, min(count, len(cards)))
+
+
+def invalidate_free_sample_pool():
+    bump_version(FREE_SAMPLE_VERSION_KEY)
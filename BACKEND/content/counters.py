@@ -0,0 +1,112 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, QuerySet
+
+from .models import ClassLevel, EducationLevel, Subject, SubjectClassLevel, VideoLesson
+
+
+def deleted_with(origin, *models):
+    """
+    Whether a cascade started by deleting ``origin`` (the instance or queryset
+    post_delete reports) is removing rows of one of ``models``.
+    """
+    model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return issubclass(model, models)
+
+
+def _changes(lessons, free_lessons):
+    return {
+        'lesson_count': F('lesson_count') + lessons,
+        'free_lesson_count': F('free_lesson_count') + free_lessons,
+    }
+
+
+def apply_lesson_delta(subject_id, class_level_id, lessons, free_lessons):
+    """Shift the lesson counters of one subject/class level cell with F() updates."""
+    changes = _changes(lessons, free_lessons)
+    Subject.objects.filter(pk=subject_id).update(**changes)
+    ClassLevel.objects.filter(pk=class_level_id).update(**changes)
+
+    cell = SubjectClassLevel.objects.filter(subject_id=subject_id, class_level_id=class_level_id)
+    if cell.update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            SubjectClassLevel.objects.create(
+                subject_id=subject_id,
+                class_level_id=class_level_id,
+                lesson_count=max(lessons, 0),
+                free_lesson_count=max(free_lessons, 0),
+            )
+    except IntegrityError:
+        # Created concurrently.
+        cell.update(**changes)
+
+
+def record_lesson_saved(instance, created):
+    # VideoLesson.save() reads the stored state of a lesson it was not loaded
+    # with, so an existing lesson always has one here.
+    old_state = None if created else getattr(instance, '_counter_state', None)
+    new_state = instance.counter_state(old_state)
+    if old_state == new_state:
+        return
+
+    if old_state is not None:
+        subject_id, class_level_id, is_free = old_state
+        apply_lesson_delta(subject_id, class_level_id, -1, -int(is_free))
+    subject_id, class_level_id, is_free = new_state
+    apply_lesson_delta(subject_id, class_level_id, 1, int(is_free))
+    instance._counter_state = new_state
+
+
+def record_lesson_deleted(instance, origin=None):
+    """
+    Take a deleted lesson out of the counters. Only existing rows are updated:
+    when the lesson goes because its subject, class level or education level
+    is being deleted, that row and its matrix cells are going too and are left
+    alone rather than counted down (or recreated) mid-cascade.
+    """
+    state = getattr(instance, '_counter_state', None) or instance.counter_state()
+    subject_id, class_level_id, is_free = state
+    changes = _changes(-1, -int(is_free))
+    subject_deleted = deleted_with(origin, Subject)
+    class_level_deleted = deleted_with(origin, ClassLevel, EducationLevel)
+    if not subject_deleted:
+        Subject.objects.filter(pk=subject_id).update(**changes)
+    if not class_level_deleted:
+        ClassLevel.objects.filter(pk=class_level_id).update(**changes)
+    if not (subject_deleted or class_level_deleted):
+        SubjectClassLevel.objects.filter(subject_id=subject_id, class_level_id=class_level_id).update(**changes)
+
+
+@transaction.atomic
+def rebuild_lesson_counters():
+    """Recompute every counter and the availability matrix from VideoLesson."""
+    cells = (
+        VideoLesson.objects.order_by()
+        .values('subject_id', 'class_level_id')
+        .annotate(lessons=Count('id'), free_lessons=Count('id', filter=Q(is_free=True)))
+    )
+    subject_totals = {}
+    class_level_totals = {}
+    matrix = []
+    for cell in cells:
+        for totals, key in ((subject_totals, cell['subject_id']), (class_level_totals, cell['class_level_id'])):
+            lessons, free_lessons = totals.get(key, (0, 0))
+            totals[key] = (lessons + cell['lessons'], free_lessons + cell['free_lessons'])
+        matrix.append(SubjectClassLevel(
+            subject_id=cell['subject_id'],
+            class_level_id=cell['class_level_id'],
+            lesson_count=cell['lessons'],
+            free_lesson_count=cell['free_lessons'],
+        ))
+
+    SubjectClassLevel.objects.all().delete()
+    SubjectClassLevel.objects.bulk_create(matrix)
+
+    for model, totals in ((Subject, subject_totals), (ClassLevel, class_level_totals)):
+        objects = list(model.objects.only('id'))
+        for obj in objects:
+            obj.lesson_count, obj.free_lesson_count = totals.get(obj.id, (0, 0))
+        model.objects.bulk_update(objects, ['lesson_count', 'free_lesson_count'], batch_size=500)
+
+    return len(matrix)
@@ -0,0 +1,121 @@
+import random
+import threading
+import time
+from uuid import uuid4
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, close_old_connections, connection
+
+from content.models import EducationLevel, ClassLevel, Subject, VideoLesson, ViewHistory
+from content.progress import record_progress
+from users.models import User
+
+DURATION = 1000
+
+
+def legacy_write(user, video, position):
+    """The old two-step path: get_or_create, then update_watch_progress."""
+    history, _ = ViewHistory.objects.get_or_create(user=user, video=video)
+    history.update_watch_progress(position, DURATION)
+
+
+def upsert_write(user, video, position):
+    record_progress(user.id, video.id, position, DURATION)
+
+
+class Command(BaseCommand):
+    help = (
+        'Hammer one user/video progress row from several threads with the legacy '
+        'get_or_create + save path and with the single-statement upsert, and report '
+        'round trips per heartbeat, throughput and lost updates. The seeded rows are '
+        'deleted afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--heartbeats', type=int, default=200, help='Heartbeats per thread')
+        parser.add_argument('--seed', type=int, default=None, help='Random seed for the heartbeat order')
+
+    def handle(self, *args, **options):
+        tag = uuid4().hex[:8]
+        education_level = EducationLevel.objects.create(name=f'Bench {tag}', slug=f'bench-{tag}')
+        class_level = ClassLevel.objects.create(
+            name=f'Bench {tag}', slug=f'bench-{tag}', education_level=education_level
+        )
+        subject = Subject.objects.create(name=f'Bench {tag}', slug=f'bench-subject-{tag}')
+        video = VideoLesson.objects.create(
+            title=f'Bench lesson {tag}',
+            slug=f'bench-{tag}-lesson',
+            description='Benchmark lesson',
+            subject=subject,
+            class_level=class_level,
+            duration=DURATION,
+        )
+        user = User.objects.create(email=f'bench-{tag}@example.com', password=make_password(None))
+        try:
+            rng = random.Random(options['seed'])
+            for label, write in (('get_or_create + save', legacy_write), ('upsert', upsert_write)):
+                ViewHistory.objects.filter(user=user, video=video).delete()
+                self.run(label, write, user, video, rng, options)
+        finally:
+            user.delete()
+            video.delete()
+            subject.delete()
+            education_level.delete()
+
+    def run(self, label, write, user, video, rng, options):
+        threads = max(options['threads'], 1)
+        per_thread = max(options['heartbeats'], 1)
+        # Every thread replays a shuffled slice of positions, so the expected
+        # high-water mark is known and the video ends up completed.
+        positions = list(range(1, threads * per_thread + 1))
+        scale = DURATION / len(positions)
+        positions = [int(position * scale) for position in positions]
+        rng.shuffle(positions)
+        slices = [positions[i::threads] for i in range(threads)]
+
+        queries = [0] * threads
+        errors = [0] * threads
+        barrier = threading.Barrier(threads)
+
+        def worker(index):
+            def count(execute, sql, params, many, context):
+                queries[index] += 1
+                return execute(sql, params, many, context)
+
+            close_old_connections()
+            try:
+                with connection.execute_wrapper(count):
+                    barrier.wait()
+                    for position in slices[index]:
+                        try:
+                            write(user, video, position)
+                        except DatabaseError:
+                            errors[index] += 1
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+        started = time.perf_counter()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        total = threads * per_thread
+        history = ViewHistory.objects.get(user=user, video=video)
+        expected = max(positions)
+        lost = history.watched_duration != expected or not history.is_completed
+        self.stdout.write(self.style.MIGRATE_HEADING(label))
+        self.stdout.write(
+            f'  {total} heartbeats from {threads} threads in {elapsed:.2f}s '
+            f'({total / elapsed:.0f}/s), {sum(queries) / total:.2f} queries per heartbeat, '
+            f'{sum(errors)} failed'
+        )
+        result = (
+            f'  watched_duration {history.watched_duration} (expected {expected}), '
+            f'is_completed {history.is_completed}'
+        )
+        self.stdout.write(self.style.ERROR(result + ' - lost update') if lost else result)
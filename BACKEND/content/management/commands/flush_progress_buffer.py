@@ -0,0 +1,30 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from content.progress import flush_progress_buffer
+
+
+class Command(BaseCommand):
+    help = 'Write buffered video progress heartbeats to ViewHistory in bulk'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep flushing every --interval seconds')
+        parser.add_argument('--interval', type=int, default=settings.PROGRESS_FLUSH_INTERVAL)
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.perf_counter()
+            applied = flush_progress_buffer()
+            if applied is None:
+                self.stdout.write('Another flusher is running.')
+            elif applied or not options['loop']:
+                self.stdout.write(
+                    f'Applied {applied} progress events in {time.perf_counter() - started:.2f}s.'
+                )
+            if not options['loop']:
+                break
+            close_old_connections()
+            time.sleep(options['interval'])
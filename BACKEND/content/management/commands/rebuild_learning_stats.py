@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from content.stats import rebuild_learning_stats
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute UserLearningStats (watched, completed and seconds per user and subject) '
+        'from ViewHistory (e.g. after bulk imports that bypass signals)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--subject', type=int, action='append', dest='subjects',
+                            help='Only rebuild this subject id (repeatable)')
+
+    def handle(self, *args, **options):
+        rows = rebuild_learning_stats(subject_ids=options['subjects'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {rows} user/subject learning stats rows.'))
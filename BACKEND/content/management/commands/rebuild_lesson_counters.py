@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from content.counters import rebuild_lesson_counters
+from content.catalog import invalidate_catalog_tree
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute Subject/ClassLevel lesson counters and the subject x class level '
+        'availability matrix from VideoLesson (e.g. after bulk imports that bypass signals)'
+    )
+
+    def handle(self, *args, **options):
+        cells = rebuild_lesson_counters()
+        invalidate_catalog_tree()
+        self.stdout.write(
+            self.style.SUCCESS(f'Rebuilt lesson counters for {cells} subject/class level pairs.')
+        )
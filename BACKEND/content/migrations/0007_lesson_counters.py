@@ -0,0 +1,76 @@
+# Generated by Django 5.2.1 on 2026-10-18 12:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def populate_lesson_counters(apps, schema_editor):
+    VideoLesson = apps.get_model('content', 'VideoLesson')
+    Subject = apps.get_model('content', 'Subject')
+    ClassLevel = apps.get_model('content', 'ClassLevel')
+    SubjectClassLevel = apps.get_model('content', 'SubjectClassLevel')
+
+    cells = (
+        VideoLesson.objects.order_by()
+        .values('subject_id', 'class_level_id')
+        .annotate(lessons=Count('id'), free_lessons=Count('id', filter=Q(is_free=True)))
+    )
+    totals = {Subject: {}, ClassLevel: {}}
+    for cell in cells:
+        SubjectClassLevel.objects.create(
+            subject_id=cell['subject_id'],
+            class_level_id=cell['class_level_id'],
+            lesson_count=cell['lessons'],
+            free_lesson_count=cell['free_lessons'],
+        )
+        for model, key in ((Subject, cell['subject_id']), (ClassLevel, cell['class_level_id'])):
+            lessons, free_lessons = totals[model].get(key, (0, 0))
+            totals[model][key] = (lessons + cell['lessons'], free_lessons + cell['free_lessons'])
+    for model, counts in totals.items():
+        for pk, (lessons, free_lessons) in counts.items():
+            model.objects.filter(pk=pk).update(lesson_count=lessons, free_lesson_count=free_lessons)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('content', '0006_alter_videolesson_options_videolesson_access_token_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='classlevel',
+            name='free_lesson_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='classlevel',
+            name='lesson_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='subject',
+            name='free_lesson_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='subject',
+            name='lesson_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.CreateModel(
+            name='SubjectClassLevel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('lesson_count', models.PositiveIntegerField(default=0)),
+                ('free_lesson_count', models.PositiveIntegerField(default=0)),
+                ('class_level', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='subject_availability', to='content.classlevel')),
+                ('subject', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='class_level_availability', to='content.subject')),
+            ],
+            options={
+                'unique_together': {('class_level', 'subject')},
+            },
+        ),
+        migrations.RunPython(populate_lesson_counters, migrations.RunPython.noop),
+    ]
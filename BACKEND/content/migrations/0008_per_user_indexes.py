@@ -0,0 +1,27 @@
+# Generated by Django 5.2.1 on 2026-10-18 12:10
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('content', '0007_lesson_counters'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bookmark',
+            index=models.Index(fields=['user', '-created_at'], name='bookmark_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='viewhistory',
+            index=models.Index(fields=['user', '-updated_at'], name='viewhist_user_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='viewhistory',
+            index=models.Index(fields=['user', 'is_completed'], name='viewhist_user_completed_idx'),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.1 on 2026-10-18 12:18
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def populate_learning_stats(apps, schema_editor):
+    ViewHistory = apps.get_model('content', 'ViewHistory')
+    UserLearningStats = apps.get_model('content', 'UserLearningStats')
+
+    cells = (
+        ViewHistory.objects.order_by()
+        .values('user_id', 'video__subject_id')
+        .annotate(
+            watched=Count('id'),
+            completed=Count('id', filter=Q(is_completed=True)),
+            seconds=Sum('watched_duration'),
+        )
+    )
+    UserLearningStats.objects.bulk_create([
+        UserLearningStats(
+            user_id=cell['user_id'],
+            subject_id=cell['video__subject_id'],
+            watched=cell['watched'],
+            completed=cell['completed'],
+            seconds=cell['seconds'] or 0,
+        )
+        for cell in cells
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('content', '0008_per_user_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserLearningStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('watched', models.PositiveIntegerField(default=0, help_text='Videos with a view history')),
+                ('completed', models.PositiveIntegerField(default=0, help_text='Videos completed')),
+                ('seconds', models.PositiveBigIntegerField(default=0, help_text='Total watched duration in seconds')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('subject', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='learner_stats', to='content.subject')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='learning_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'User learning stats',
+                'unique_together': {('user', 'subject')},
+            },
+        ),
+        migrations.RunPython(populate_learning_stats, migrations.RunPython.noop),
+    ]
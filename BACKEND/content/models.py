@@ -1,6 +1,27 @@
-from django.db import models
+from django.db import connections, models
+from django.db.models import BooleanField, Case, Exists, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 from django.utils.text import slugify
 from users.models import User
+from subscription.models import UserSubscription
+
+LESSON_COUNTER_FIELDS = ('lesson_count', 'free_lesson_count')
+
+
+def _protect_lesson_counters(instance, kwargs):
+    """
+    Lesson counters only change through F() updates in content.counters, so an
+    ordinary save of an existing row must not write back a stale copy of them.
+    """
+    if not instance._state.adding and kwargs.get('update_fields') is None:
+        deferred = instance.get_deferred_fields()
+        kwargs['update_fields'] = [
+            field.name for field in instance._meta.concrete_fields
+            if not field.primary_key
+            and field.name not in LESSON_COUNTER_FIELDS
+            and field.attname not in deferred
+        ]
 
 
 class EducationLevel(models.Model):
@@ -31,6 +52,8 @@ class ClassLevel(models.Model):
     education_level = models.ForeignKey(EducationLevel, on_delete=models.CASCADE, related_name='class_levels')
     description = models.TextField(blank=True)
     order = models.PositiveIntegerField(default=0)
+    lesson_count = models.PositiveIntegerField(default=0, editable=False)
+    free_lesson_count = models.PositiveIntegerField(default=0, editable=False)
     
     class Meta:
         ordering = ['education_level__order', 'order']
@@ -41,6 +64,7 @@ class ClassLevel(models.Model):
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
+        _protect_lesson_counters(self, kwargs)
         super().save(*args, **kwargs)
 
 
@@ -51,6 +75,8 @@ class Subject(models.Model):
     slug = models.SlugField(unique=True)
     description = models.TextField(blank=True)
     icon = models.ImageField(upload_to='subject_icons/', blank=True, null=True)
+    lesson_count = models.PositiveIntegerField(default=0, editable=False)
+    free_lesson_count = models.PositiveIntegerField(default=0, editable=False)
     
     class Meta:
         ordering = ['name']
@@ -61,9 +87,46 @@ class Subject(models.Model):
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
+        _protect_lesson_counters(self, kwargs)
         super().save(*args, **kwargs)
 
 
+class VideoLessonQuerySet(models.QuerySet):
+    """Query helpers for VideoLesson."""
+
+    def for_listing(self):
+        """
+        Load everything VideoLessonSerializer renders in the same query:
+        subject, class level and its education level, skipping columns the
+        listings never show.
+        """
+        return self.select_related(
+            'subject', 'class_level__education_level'
+        ).defer('error_message')
+
+    def with_user_state(self, user):
+        """
+        Annotate each lesson with ``user``'s last_position, is_completed,
+        is_bookmarked and can_play (free, or covered by an active
+        subscription) as subqueries of the same statement.
+        """
+        now = timezone.now()
+        history = ViewHistory.objects.filter(user=user, video=OuterRef('pk')).order_by()
+        subscribed = UserSubscription.objects.filter(
+            user=user, is_active=True, start_date__lte=now, end_date__gte=now
+        )
+        return self.annotate(
+            last_position=Coalesce(Subquery(history.values('last_position')[:1]), 0),
+            is_completed=Coalesce(Subquery(history.values('is_completed')[:1]), False),
+            is_bookmarked=Exists(Bookmark.objects.filter(user=user, video=OuterRef('pk'))),
+            can_play=Case(
+                When(Q(is_free=True) | Exists(subscribed), then=Value(True)),
+                default=Value(False),
+                output_field=BooleanField(),
+            ),
+        )
+
+
 class VideoLesson(models.Model):
     """Video lesson model."""
     
@@ -130,6 +193,8 @@ class VideoLesson(models.Model):
     order_in_subject = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    objects = VideoLessonQuerySet.as_manager()
     
     class Meta:
         ordering = ['subject__name', 'class_level__order', 'order_in_subject']
@@ -141,9 +206,33 @@ class VideoLesson(models.Model):
     def __str__(self):
         return f"{self.title} - {self.subject} ({self.class_level})"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._counter_state = instance.counter_state()
+        return instance
+
+    def counter_state(self, stored=None):
+        """
+        (subject_id, class_level_id, is_free) as far as they are loaded, taking
+        the fields that are not from ``stored`` (None if one is missing).
+        """
+        fields = ('subject_id', 'class_level_id', 'is_free')
+        if stored is None:
+            if any(field not in self.__dict__ for field in fields):
+                return None
+            stored = (None, None, None)
+        return tuple(self.__dict__.get(field, value) for field, value in zip(fields, stored))
+
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.title)
+        if self.pk is not None and getattr(self, '_counter_state', None) is None:
+            # Not loaded with the counted fields: read what the counters
+            # reflect now so the save is applied as a delta for this lesson.
+            self._counter_state = VideoLesson._base_manager.filter(pk=self.pk).values_list(
+                'subject_id', 'class_level_id', 'is_free'
+            ).first()
         super().save(*args, **kwargs)
     
     @property
@@ -162,6 +251,26 @@ class VideoLesson(models.Model):
         return None
 
 
+class SubjectClassLevel(models.Model):
+    """Lesson availability of a subject within a class level, kept in step with VideoLesson."""
+
+    class_level = models.ForeignKey(ClassLevel, on_delete=models.CASCADE, related_name='subject_availability')
+    subject = models.ForeignKey(Subject, on_delete=models.CASCADE, related_name='class_level_availability')
+    lesson_count = models.PositiveIntegerField(default=0)
+    free_lesson_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('class_level', 'subject')
+
+    def __str__(self):
+        return f"{self.subject} ({self.class_level}) - {self.lesson_count} lessons"
+
+
+def listing_video_prefetch(lookup='video'):
+    """Prefetch a related VideoLesson with everything its serializer needs."""
+    return models.Prefetch(lookup, queryset=VideoLesson.objects.for_listing())
+
+
 class Bookmark(models.Model):
     """Bookmark model for saving favorite lessons."""
     
@@ -172,11 +281,75 @@ class Bookmark(models.Model):
     class Meta:
         unique_together = ('user', 'video')
         ordering = ['-created_at']
+        indexes = [
+            # A user's bookmarks, newest first
+            models.Index(fields=['user', '-created_at'], name='bookmark_user_created_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.email} - {self.video.title}"
 
 
+class ViewHistoryQuerySet(models.QuerySet):
+    """Query helpers for ViewHistory."""
+
+    def upsert_progress(self, user_id, video_id, position, duration):
+        """
+        Record one heartbeat with a single INSERT ... ON CONFLICT DO UPDATE.
+
+        watched_duration only grows and is_completed is sticky, and both are
+        resolved by the database against the stored row, so concurrent
+        heartbeats for the same user/video cannot overwrite each other. Returns
+        the resulting row, or None if the video does not exist. Works on SQLite
+        and PostgreSQL; ``post_save`` is not sent.
+        """
+        connection = connections[self.db]
+        greatest = 'GREATEST' if connection.vendor == 'postgresql' else 'MAX'
+        qn = connection.ops.quote_name
+        table = qn(self.model._meta.db_table)
+        video_table = qn(VideoLesson._meta.db_table)
+        now = timezone.now()
+        # Selecting from the lesson table turns an unknown video into "no row"
+        # instead of a foreign key error. Completion is 90% of the duration.
+        sql = f"""
+            INSERT INTO {table} (user_id, video_id, last_position, watched_duration,
+                                 is_completed, created_at, updated_at)
+            SELECT %s, id, %s, %s, %s >= %s * 0.9, %s, %s FROM {video_table} WHERE id = %s
+            ON CONFLICT (user_id, video_id) DO UPDATE SET
+                last_position = excluded.last_position,
+                watched_duration = {greatest}({table}.watched_duration, excluded.watched_duration),
+                is_completed = {table}.is_completed OR excluded.is_completed,
+                updated_at = excluded.updated_at
+            RETURNING id, user_id, video_id, last_position, watched_duration,
+                      is_completed, created_at, updated_at
+        """
+        params = [user_id, position, position, position, duration, now, now, video_id]
+        rows = list(self.raw(sql, params))
+        return rows[0] if rows else None
+
+    def lock_progress(self, user_id, video_id):
+        """
+        Lock the user's row for ``video_id`` until the end of the transaction
+        and return its ``(watched_duration, is_completed)``, or None if there is
+        no row. SQLite has no row locks: a no-op UPDATE takes the database write
+        lock up front instead, so concurrent heartbeats queue for it rather
+        than fail upgrading a read lock.
+        """
+        connection = connections[self.db]
+        rows = self.filter(user_id=user_id, video_id=video_id)
+        if connection.features.has_select_for_update:
+            return rows.select_for_update().values_list('watched_duration', 'is_completed').first()
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        sql = f"""
+            UPDATE {table} SET user_id = user_id WHERE user_id = %s AND video_id = %s
+            RETURNING watched_duration, is_completed
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [user_id, video_id])
+            row = cursor.fetchone()
+        return None if row is None else (row[0], bool(row[1]))
+
+
 class ViewHistory(models.Model):
     """Track user video view history."""
     
@@ -187,14 +360,35 @@ class ViewHistory(models.Model):
     is_completed = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    objects = ViewHistoryQuerySet.as_manager()
     
     class Meta:
         unique_together = ('user', 'video')
         ordering = ['-updated_at']
         verbose_name_plural = 'View histories'
+        indexes = [
+            # Recent activity / "continue watching"
+            models.Index(fields=['user', '-updated_at'], name='viewhist_user_updated_idx'),
+            # Completed counts and per-subject completion
+            models.Index(fields=['user', 'is_completed'], name='viewhist_user_completed_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.email} - {self.video.title}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._stats_state = instance.stats_state()
+        return instance
+
+    def stats_state(self):
+        """(video_id, watched_duration, is_completed) as far as they are loaded."""
+        fields = ('video_id', 'watched_duration', 'is_completed')
+        if any(field not in self.__dict__ for field in fields):
+            return None
+        return tuple(self.__dict__[field] for field in fields)
     
     def update_watch_progress(self, position, duration):
         """Update watch progress."""
@@ -205,4 +399,65 @@ class ViewHistory(models.Model):
         if position >= duration * 0.9:
             self.is_completed = True
         
-        self.save(update_fields=['last_position', 'watched_duration', 'is_completed', 'updated_at'])
\ No newline at end of file
+        self.save(update_fields=['last_position', 'watched_duration', 'is_completed', 'updated_at'])
+
+class UserLearningStatsQuerySet(models.QuerySet):
+    """Query helpers for UserLearningStats."""
+
+    def totals(self):
+        """Sum the selected rows into ``{'watched', 'completed', 'seconds'}``."""
+        return self.aggregate(
+            watched=Coalesce(Sum('watched'), 0),
+            completed=Coalesce(Sum('completed'), 0),
+            seconds=Coalesce(Sum('seconds'), 0),
+        )
+
+    def refresh(self, user_id, video_id):
+        """
+        Recount the user's row for the subject of ``video_id`` from ViewHistory
+        in one INSERT ... SELECT ... ON CONFLICT DO UPDATE. Only for repairs,
+        where the previous state of the view history row is not known.
+        """
+        connection = connections[self.db]
+        qn = connection.ops.quote_name
+        table = qn(self.model._meta.db_table)
+        history_table = qn(ViewHistory._meta.db_table)
+        video_table = qn(VideoLesson._meta.db_table)
+        sql = f"""
+            INSERT INTO {table} (user_id, subject_id, watched, completed, seconds, updated_at)
+            SELECT h.user_id, v.subject_id, COUNT(*),
+                   SUM(CASE WHEN h.is_completed THEN 1 ELSE 0 END), SUM(h.watched_duration), %s
+            FROM {history_table} h INNER JOIN {video_table} v ON v.id = h.video_id
+            WHERE h.user_id = %s AND v.subject_id = (SELECT subject_id FROM {video_table} WHERE id = %s)
+            GROUP BY h.user_id, v.subject_id
+            ON CONFLICT (user_id, subject_id) DO UPDATE SET
+                watched = excluded.watched,
+                completed = excluded.completed,
+                seconds = excluded.seconds,
+                updated_at = excluded.updated_at
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [timezone.now(), user_id, video_id])
+
+
+class UserLearningStats(models.Model):
+    """
+    Per-user, per-subject totals of the user's ViewHistory, kept up to date by
+    content.stats. A user's overall totals are the sum of their rows.
+    """
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='learning_stats')
+    subject = models.ForeignKey(Subject, on_delete=models.CASCADE, related_name='learner_stats')
+    watched = models.PositiveIntegerField(default=0, help_text="Videos with a view history")
+    completed = models.PositiveIntegerField(default=0, help_text="Videos completed")
+    seconds = models.PositiveBigIntegerField(default=0, help_text="Total watched duration in seconds")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = UserLearningStatsQuerySet.as_manager()
+
+    class Meta:
+        unique_together = ('user', 'subject')
+        verbose_name_plural = 'User learning stats'
+
+    def __str__(self):
+        return f"{self.user_id} - {self.subject_id}: {self.completed}/{self.watched}"
@@ -0,0 +1,134 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+from rest_framework.utils.urls import replace_query_param
+
+KeysetCursor = namedtuple('KeysetCursor', ['reverse', 'position'])
+
+
+class KeysetCursorPagination(CursorPagination):
+    """
+    Cursor pagination that seeks on the complete ordering tuple.
+
+    DRF's CursorPagination only keys on the first ordering field and falls
+    back to an OFFSET for rows sharing that value. Here the cursor carries the
+    value of every ordering field of the boundary row, and the next page is
+    fetched with a lexicographic ``(a, b, c) > (x, y, z)`` filter, so every
+    page costs the same however deep the client scrolls. The last ordering
+    field must be unique (normally ``id``).
+    """
+    ordering = ('id',)
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def _key_aliases(self):
+        return ['keyset_%d' % index for index in range(len(self.ordering))]
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor.reverse if self.cursor else False
+
+        aliases = self._key_aliases()
+        queryset = queryset.annotate(**{
+            alias: F(field) for alias, field in zip(aliases, self.ordering)
+        })
+        if self.cursor is not None:
+            try:
+                queryset = queryset.filter(self._seek_filter(self.cursor.position, reverse))
+            except (TypeError, ValueError, ValidationError):
+                # A position whose values do not fit the ordering fields.
+                raise NotFound(self.invalid_cursor_message)
+        prefix = '-' if reverse else ''
+        queryset = queryset.order_by(*[prefix + field for field in self.ordering])
+
+        # Fetch one extra row to find out whether another page follows.
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        if reverse:
+            self.page.reverse()
+
+        if reverse:
+            self.has_next = self.cursor is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = self.cursor is not None
+
+        return self.page
+
+    def _seek_filter(self, position, reverse):
+        """Build ``ordering > position`` (or ``<`` when paging backwards)."""
+        lookup = 'lt' if reverse else 'gt'
+        condition = Q()
+        for index, field in enumerate(self.ordering):
+            clause = Q(**{f'{field}__{lookup}': position[index]})
+            for previous_field, value in zip(self.ordering[:index], position[:index]):
+                clause &= Q(**{previous_field: value})
+            condition |= clause
+        return condition
+
+    def _position_of(self, instance):
+        return [getattr(instance, alias) for alias in self._key_aliases()]
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        if self.page:
+            position = self._position_of(self.page[-1])
+        else:
+            position = self.cursor.position
+        return self.encode_cursor(KeysetCursor(reverse=False, position=position))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if self.page:
+            position = self._position_of(self.page[0])
+        else:
+            position = self.cursor.position
+        return self.encode_cursor(KeysetCursor(reverse=True, position=position))
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+
+        try:
+            payload = json.loads(urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            reverse = bool(payload.get('r', 0))
+            position = payload['p']
+            if not isinstance(position, list) or len(position) != len(self.ordering):
+                raise ValueError('Cursor does not match the ordering')
+        except (TypeError, ValueError, KeyError, AttributeError):
+            raise NotFound(self.invalid_cursor_message)
+
+        return KeysetCursor(reverse=reverse, position=position)
+
+    def encode_cursor(self, cursor):
+        payload = {'p': cursor.position}
+        if cursor.reverse:
+            payload['r'] = 1
+        encoded = urlsafe_b64encode(
+            json.dumps(payload, separators=(',', ':'), default=str).encode('utf-8')
+        ).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+
+class VideoLessonCursorPagination(KeysetCursorPagination):
+    """Keyset pagination over VideoLesson's stable catalog ordering."""
+    ordering = ('subject__name', 'class_level__order', 'order_in_subject', 'id')
+    page_size = getattr(settings, 'LESSON_PAGE_SIZE', 20)
+    max_page_size = getattr(settings, 'LESSON_MAX_PAGE_SIZE', 100)
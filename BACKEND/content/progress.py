@@ -0,0 +1,247 @@
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import IntegrityError, close_old_connections, transaction
+from django.utils import timezone
+
+from .models import VideoLesson, ViewHistory
+from .stats import apply_learning_delta, record_progress_upsert
+
+logger = logging.getLogger(__name__)
+
+SEQUENCE_KEY = 'progress:seq'
+FLUSHED_KEY = 'progress:flushed'
+GAP_KEY = 'progress:gap'
+LOCK_KEY = 'progress:flush-lock'
+EVENT_KEY = 'progress:event:%d'
+EVENT_TIMEOUT = 60 * 60 * 24
+LOCK_TIMEOUT = 120
+FLUSH_BATCH_SIZE = 2000
+APPLY_ATTEMPTS = 3
+
+
+def is_completed_position(position, duration):
+    """A video counts as completed once 90% of it has been watched."""
+    return position >= duration * 0.9
+
+
+def record_progress(user_id, video_id, position, duration):
+    """
+    Write one heartbeat through ViewHistory's single-statement upsert, move
+    the user's learning stats by the difference it made and award any
+    watch/completion points it may have earned. Returns the ViewHistory row,
+    or None if the video does not exist.
+    """
+    from .signals import award_video_progress_points
+
+    with transaction.atomic():
+        # Locked until the stats are moved, so concurrent heartbeats for the
+        # row apply their differences one after the other.
+        before = ViewHistory.objects.lock_progress(user_id, video_id)
+        history = ViewHistory.objects.upsert_progress(user_id, video_id, position, duration)
+        if history is None:
+            return None
+        record_progress_upsert(history, before)
+        # Only the heartbeats that can have crossed a threshold go to the
+        # (idempotent) award check: the one that completes the video, or one
+        # that moved the watched high-water mark.
+        if history.is_completed:
+            if is_completed_position(position, duration):
+                award_video_progress_points(history)
+        elif position > 0 and history.watched_duration == position:
+            award_video_progress_points(history)
+    return history
+
+
+def apply_progress_events(events):
+    """
+    Apply ``(user_id, video_id, last_position, duration)`` events, oldest first,
+    with one read and bulk writes. Events for the same user/video are merged:
+    the last position wins, watched_duration only grows and completion is
+    sticky. Points are awarded once for each row that newly becomes watched or
+    completed, and UserLearningStats is moved by the combined deltas.
+    Returns ``{(user_id, video_id): ViewHistory}``.
+    """
+    merged = {}
+    for user_id, video_id, position, duration in events:
+        entry = merged.setdefault((user_id, video_id), {'watched': 0, 'completed': False})
+        entry['last_position'] = position
+        entry['watched'] = max(entry['watched'], position)
+        entry['completed'] = entry['completed'] or is_completed_position(position, duration)
+    if not merged:
+        return {}
+
+    video_ids = {video_id for _, video_id in merged}
+    subject_of = dict(VideoLesson.objects.filter(id__in=video_ids).values_list('id', 'subject_id'))
+    for attempt in range(APPLY_ATTEMPTS):
+        try:
+            with transaction.atomic():
+                return _apply_merged_progress(merged, subject_of)
+        except IntegrityError:
+            # A row was inserted (by a direct write or another flush) after
+            # the locking read; read it again under the lock and merge into it.
+            if attempt == APPLY_ATTEMPTS - 1:
+                raise
+
+
+def _apply_merged_progress(merged, subject_of):
+    """
+    Merge events into the stored rows, read under a row lock. Missing rows
+    are inserted with a plain INSERT, so one that appeared in the meantime
+    raises IntegrityError instead of being overwritten.
+    """
+    # Imported here: content.signals imports the rewards app, which imports content.models.
+    from .signals import award_video_progress_points
+
+    user_ids = {user_id for user_id, _ in merged}
+    video_ids = {video_id for _, video_id in merged}
+    now = timezone.now()
+    states = {}
+    existing = {
+        (history.user_id, history.video_id): history
+        for history in ViewHistory.objects.select_for_update().filter(
+            user_id__in=user_ids, video_id__in=video_ids
+        )
+    }
+    to_update, to_create, newly_rewarded = [], [], []
+    deltas = {}
+    for key, entry in merged.items():
+        if key[1] not in subject_of:
+            continue
+        history = existing.get(key)
+        created = history is None
+        if created:
+            history = ViewHistory(user_id=key[0], video_id=key[1])
+            to_create.append(history)
+        else:
+            to_update.append(history)
+        was_watched, was_completed = history.watched_duration > 0, history.is_completed
+        old_duration = history.watched_duration
+
+        history.last_position = entry['last_position']
+        history.watched_duration = max(history.watched_duration, entry['watched'])
+        history.is_completed = history.is_completed or entry['completed']
+        history.updated_at = now
+        states[key] = history
+
+        delta = deltas.setdefault((key[0], subject_of[key[1]]), [0, 0, 0])
+        delta[0] += int(created)
+        delta[1] += int(history.is_completed) - int(was_completed)
+        delta[2] += history.watched_duration - old_duration
+
+        if history.is_completed and not was_completed:
+            newly_rewarded.append(history)
+        elif not history.is_completed and not was_watched and history.watched_duration > 0:
+            newly_rewarded.append(history)
+
+    fields = ['last_position', 'watched_duration', 'is_completed', 'updated_at']
+    ViewHistory.objects.bulk_update(to_update, fields, batch_size=500)
+    ViewHistory.objects.bulk_create(to_create, batch_size=500)
+    for (user_id, subject_id), (watched, completed, seconds) in deltas.items():
+        apply_learning_delta(user_id, subject_id, watched, completed, seconds)
+    for history in newly_rewarded:
+        award_video_progress_points(history)
+
+    return states
+
+
+def buffer_cache():
+    return caches[settings.PROGRESS_BUFFER_CACHE]
+
+
+def is_buffered():
+    return settings.PROGRESS_INGEST_MODE == 'buffered'
+
+
+def buffer_heartbeat(user_id, video_id, position, duration):
+    """
+    Queue a heartbeat in the shared buffer instead of writing ViewHistory.
+
+    Events are stored under an increasing sequence number so the flusher can
+    replay them in order with plain get_many/delete_many on any cache backend.
+    """
+    cache = buffer_cache()
+    cache.add(SEQUENCE_KEY, 0, timeout=None)
+    seq = cache.incr(SEQUENCE_KEY)
+    cache.set(EVENT_KEY % seq, (user_id, video_id, position, duration), timeout=EVENT_TIMEOUT)
+    _ensure_local_flusher(cache)
+    return seq
+
+
+def flush_progress_buffer():
+    """
+    Write all buffered heartbeats to ViewHistory. Returns the number of events
+    applied, or None if another flusher holds the lock.
+    """
+    cache = buffer_cache()
+    if not cache.add(LOCK_KEY, 1, timeout=LOCK_TIMEOUT):
+        return None
+    applied = 0
+    try:
+        head = cache.get(SEQUENCE_KEY) or 0
+        flushed = cache.get(FLUSHED_KEY) or 0
+        while flushed < head:
+            sequence = range(flushed + 1, min(head, flushed + FLUSH_BATCH_SIZE) + 1)
+            found = cache.get_many([EVENT_KEY % seq for seq in sequence])
+            events = []
+            last = flushed
+            for seq in sequence:
+                event = found.get(EVENT_KEY % seq)
+                if event is None:
+                    # Either the writer has taken the number but not stored the
+                    # event yet, or the cache evicted it. Wait one round; if it
+                    # is still missing on the next flush, skip it.
+                    if cache.get(GAP_KEY) != seq:
+                        cache.set(GAP_KEY, seq, timeout=None)
+                        break
+                else:
+                    events.append(event)
+                last = seq
+
+            apply_progress_events(events)
+            cache.delete_many([EVENT_KEY % seq for seq in range(flushed + 1, last + 1)])
+            cache.set(FLUSHED_KEY, last, timeout=None)
+            applied += len(events)
+            if last == flushed or last < sequence[-1]:
+                break
+            flushed = last
+    finally:
+        cache.delete(LOCK_KEY)
+    return applied
+
+
+_local_flusher = None
+_local_flusher_lock = threading.Lock()
+
+
+def _ensure_local_flusher(cache):
+    """
+    A local-memory cache is private to this process, so nothing else can flush
+    it: run the flusher on a daemon thread here instead of the
+    flush_progress_buffer command.
+    """
+    global _local_flusher
+    if _local_flusher is not None or not isinstance(cache, LocMemCache):
+        return
+    with _local_flusher_lock:
+        if _local_flusher is None:
+            _local_flusher = threading.Thread(
+                target=_run_local_flusher, name='progress-flusher', daemon=True
+            )
+            _local_flusher.start()
+
+
+def _run_local_flusher():
+    while True:
+        time.sleep(settings.PROGRESS_FLUSH_INTERVAL)
+        close_old_connections()
+        try:
+            flush_progress_buffer()
+        except Exception:
+            logger.exception('Flushing buffered video progress failed')
+        finally:
+            close_old_connections()
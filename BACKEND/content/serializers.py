@@ -11,12 +11,12 @@ class ClassLevelSerializer(serializers.ModelSerializer):
     education_level = EducationLevelSerializer(read_only=True)
     class Meta:
         model = ClassLevel
-        fields = ['id', 'name', 'slug', 'education_level', 'description', 'order']
+        fields = ['id', 'name', 'slug', 'education_level', 'description', 'order', 'lesson_count', 'free_lesson_count']
 
 class SubjectSerializer(serializers.ModelSerializer):
     class Meta:
         model = Subject
-        fields = ['id', 'name', 'slug', 'description', 'icon']
+        fields = ['id', 'name', 'slug', 'description', 'icon', 'lesson_count', 'free_lesson_count']
 
 class VideoLessonSerializer(serializers.ModelSerializer):
     subject = SubjectSerializer(read_only=True)
@@ -72,7 +72,7 @@ class VideoLessonSerializer(serializers.ModelSerializer):
             'id', 'title', 'slug', 'description', 'subject', 'class_level',
             'subject_id', 'class_level_id', 'video_source', 'video_id',
             'video_file', 'video_url', 'thumbnail', 'duration', 'is_free', 
-            'order_in_subject', 'created_at', 'updated_at'
+            'order_in_subject', 'upload_progress', 'created_at', 'updated_at'
         ]
         def validate(self, data):
         # Ensure required fields are present
@@ -135,6 +135,18 @@ class VideoLessonSerializer(serializers.ModelSerializer):
             return f"https://drive.google.com/file/d/{obj.video_id}/preview"
         return None
 
+class VideoLessonUserStateSerializer(VideoLessonSerializer):
+    """VideoLessonSerializer plus the caller's state from VideoLessonQuerySet.with_user_state()."""
+    last_position = serializers.IntegerField(read_only=True)
+    is_completed = serializers.BooleanField(read_only=True)
+    is_bookmarked = serializers.BooleanField(read_only=True)
+    can_play = serializers.BooleanField(read_only=True)
+
+    class Meta(VideoLessonSerializer.Meta):
+        fields = VideoLessonSerializer.Meta.fields + [
+            'last_position', 'is_completed', 'is_bookmarked', 'can_play'
+        ]
+
 class BookmarkSerializer(serializers.ModelSerializer):
     video = VideoLessonSerializer(read_only=True)
     class Meta:
@@ -149,6 +161,17 @@ class ViewHistorySerializer(serializers.ModelSerializer):
             'id', 'video', 'watched_duration', 'last_position', 'is_completed', 'created_at', 'updated_at'
         ]
 
+class ProgressHeartbeatSerializer(serializers.Serializer):
+    video = serializers.IntegerField()
+    last_position = serializers.IntegerField(min_value=0)
+    watched_duration = serializers.IntegerField(min_value=0)
+
+class ProgressEventSerializer(ProgressHeartbeatSerializer):
+    client_ts = serializers.DateTimeField()
+
+class ProgressBatchSerializer(serializers.Serializer):
+    events = ProgressEventSerializer(many=True, allow_empty=False, max_length=500)
+
 class VideoProgressSerializer(serializers.ModelSerializer):
     class Meta:
         model = ViewHistory
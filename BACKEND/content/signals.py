@@ -1,55 +1,89 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from .models import ViewHistory
-from rewards.models import UserPoints, PointsRule
+from .models import EducationLevel, ClassLevel, Subject, VideoLesson, ViewHistory
+from .catalog import invalidate_catalog_tree, invalidate_free_sample_pool
+from .counters import record_lesson_saved, record_lesson_deleted
+from .stats import record_history_saved, record_history_deleted, rebuild_learning_stats
+from rewards.outbox import enqueue_award
+from rewards.rules import rule_points
 
 
 @receiver(post_save, sender=ViewHistory)
 def update_points_on_video_progress(sender, instance, created, **kwargs):
     """Award points for watching videos."""
+    award_video_progress_points(instance, created)
+
+
+def award_video_progress_points(instance, created=False):
+    """
+    Queue watch/completion points for a ViewHistory row (also used by bulk
+    progress writes). Each award carries an idempotency key, so it is made at
+    most once per user and video however often the row is saved.
+    """
     # Check if video is completed
     if instance.is_completed:
         # Give points for completing a video
-        try:
-            complete_rule = PointsRule.objects.get(action_type='complete_video', is_active=True)
-            user_points = UserPoints.objects.get(user=instance.user)
-            
-            # Check if points already given for this completion
-            from rewards.models import PointsTransaction
-            existing_transaction = PointsTransaction.objects.filter(
-                user_points=user_points,
-                video=instance.video,
-                reason__contains='Completed video',
-                transaction_type='earned'
-            ).exists()
-            
-            if not existing_transaction:
-                user_points.add_points(
-                    complete_rule.points, 
-                    f'Completed video: {instance.video.title}',
-                )
-        except (PointsRule.DoesNotExist, UserPoints.DoesNotExist):
-            pass
+        action_type, key, label = 'complete_video', 'complete', 'Completed video'
     # For non-completed videos that have some progress
     elif not created and instance.watched_duration > 0:
         # Give points for watching videos (if not already given)
-        try:
-            watch_rule = PointsRule.objects.get(action_type='video_watch', is_active=True)
-            user_points = UserPoints.objects.get(user=instance.user)
-            
-            # Check if points already given for watching this video
-            from rewards.models import PointsTransaction
-            existing_transaction = PointsTransaction.objects.filter(
-                user_points=user_points,
-                video=instance.video,
-                reason__contains='Watched video',
-                transaction_type='earned'
-            ).exists()
-            
-            if not existing_transaction:
-                user_points.add_points(
-                    watch_rule.points, 
-                    f'Watched video: {instance.video.title}',
-                )
-        except (PointsRule.DoesNotExist, UserPoints.DoesNotExist):
-            pass
\ No newline at end of file
+        action_type, key, label = 'video_watch', 'watch', 'Watched video'
+    else:
+        return
+    points = rule_points(action_type)
+    if points is None:
+        return
+    enqueue_award(
+        instance.user_id,
+        points,
+        label,
+        f'{key}:{instance.user_id}:{instance.video_id}',
+        video_id=instance.video_id,
+    )
+
+
+@receiver([post_save, post_delete], sender=EducationLevel)
+@receiver([post_save, post_delete], sender=ClassLevel)
+@receiver([post_save, post_delete], sender=Subject)
+@receiver([post_save, post_delete], sender=VideoLesson)
+def invalidate_catalog_on_change(sender, **kwargs):
+    """Drop the cached catalog tree once the change is committed."""
+    transaction.on_commit(invalidate_catalog_tree)
+
+
+@receiver([post_save, post_delete], sender=Subject)
+@receiver([post_save, post_delete], sender=VideoLesson)
+def invalidate_free_samples_on_change(sender, **kwargs):
+    """Tell every worker to rebuild its free-lesson pool after the commit."""
+    transaction.on_commit(invalidate_free_sample_pool)
+
+
+@receiver(post_save, sender=VideoLesson)
+def update_lesson_counters_on_save(sender, instance, created, raw=False, **kwargs):
+    """Keep Subject/ClassLevel lesson counters and the availability matrix in step."""
+    if raw:
+        return
+    old_state = None if created else getattr(instance, '_counter_state', None)
+    record_lesson_saved(instance, created)
+    if old_state is not None and old_state[0] != instance.subject_id:
+        # The lesson's view histories now count towards another subject.
+        rebuild_learning_stats(subject_ids=[old_state[0], instance.subject_id])
+
+
+@receiver(post_delete, sender=VideoLesson)
+def update_lesson_counters_on_delete(sender, instance, origin=None, **kwargs):
+    record_lesson_deleted(instance, origin)
+
+
+@receiver(post_save, sender=ViewHistory)
+def update_learning_stats_on_save(sender, instance, created, raw=False, **kwargs):
+    """Keep the user's UserLearningStats in step with their view history."""
+    if raw:
+        return
+    record_history_saved(instance, created)
+
+
+@receiver(post_delete, sender=ViewHistory)
+def update_learning_stats_on_delete(sender, instance, origin=None, **kwargs):
+    record_history_deleted(instance, origin)
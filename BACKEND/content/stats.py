@@ -0,0 +1,181 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, FilteredRelation, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from users.models import User
+from .counters import deleted_with
+from .models import Subject, UserLearningStats, VideoLesson, ViewHistory
+
+
+def _changes(watched, completed, seconds):
+    return {
+        'watched': F('watched') + watched,
+        'completed': F('completed') + completed,
+        'seconds': F('seconds') + seconds,
+    }
+
+
+def apply_learning_delta(user_id, subject_id, watched, completed, seconds):
+    """Shift one user's totals for a subject with F() updates."""
+    if not (watched or completed or seconds):
+        return
+    changes = _changes(watched, completed, seconds)
+    row = UserLearningStats.objects.filter(user_id=user_id, subject_id=subject_id)
+    if row.update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            UserLearningStats.objects.create(
+                user_id=user_id,
+                subject_id=subject_id,
+                watched=max(watched, 0),
+                completed=max(completed, 0),
+                seconds=max(seconds, 0),
+            )
+    except IntegrityError:
+        # Created concurrently.
+        row.update(**changes)
+
+
+def apply_video_delta(user_id, video_id, watched, completed, seconds):
+    """
+    apply_learning_delta for the subject of ``video_id``, which the UPDATE
+    looks up itself; the lesson is only read when the row has to be created.
+    """
+    if not (watched or completed or seconds):
+        return
+    subject_id = VideoLesson.objects.filter(pk=video_id).values('subject_id')
+    row = UserLearningStats.objects.filter(user_id=user_id, subject_id=Subquery(subject_id))
+    if not row.update(**_changes(watched, completed, seconds)):
+        apply_learning_delta(user_id, subject_id.get()['subject_id'], watched, completed, seconds)
+
+
+def record_progress_upsert(history, before):
+    """
+    Move the user's totals by one ViewHistory.objects.upsert_progress() write.
+    ``before`` is the row's ``(watched_duration, is_completed)`` read under a
+    row lock ahead of the upsert, or None if there was no row.
+    """
+    if history.created_at == history.updated_at:
+        # Both are set to the statement's timestamp only when it inserts.
+        watched, completed, seconds = 1, int(history.is_completed), history.watched_duration
+    elif before is not None:
+        old_duration, old_completed = before
+        watched = 0
+        completed = int(history.is_completed) - int(old_completed)
+        seconds = history.watched_duration - old_duration
+    else:
+        # Another request inserted the row between the read and the upsert.
+        UserLearningStats.objects.refresh(history.user_id, history.video_id)
+        return
+    apply_video_delta(history.user_id, history.video_id, watched, completed, seconds)
+
+
+def subjects_progress(user, subject_ids=None):
+    """
+    ``{subject_id: {'total', 'completed', 'seconds'}}`` for every subject, or
+    only ``subject_ids``, in one query: each subject's lesson counter joined
+    with the user's stats row.
+    """
+    subjects = Subject.objects.annotate(
+        mine=FilteredRelation('learner_stats', condition=Q(learner_stats__user=user))
+    )
+    if subject_ids is not None:
+        subjects = subjects.filter(pk__in=subject_ids)
+    rows = subjects.order_by('pk').values_list(
+        'pk', 'lesson_count', Coalesce('mine__completed', 0), Coalesce('mine__seconds', 0)
+    )
+    return {
+        subject_id: {'total': total, 'completed': completed, 'seconds': seconds}
+        for subject_id, total, completed, seconds in rows
+    }
+
+
+def subject_progress(user, subject_id):
+    """(lessons in the subject, lessons the user completed) in a single query."""
+    progress = subjects_progress(user, [subject_id]).get(subject_id)
+    return (progress['total'], progress['completed']) if progress else (0, 0)
+
+
+def _subject_id(history):
+    if ViewHistory.video.is_cached(history):
+        return history.video.subject_id
+    return VideoLesson.objects.filter(pk=history.video_id).values_list('subject_id', flat=True).first()
+
+
+def record_history_saved(history, created):
+    new_state = history.stats_state()
+    old_state = None if created else getattr(history, '_stats_state', None)
+    if old_state == new_state:
+        return
+
+    if new_state is None or (old_state is None and not created):
+        # Saved without having been loaded from the database: we cannot tell
+        # what changed, so recount this user's row for the subject.
+        UserLearningStats.objects.refresh(history.user_id, history.video_id)
+    elif old_state is not None and old_state[0] != new_state[0]:
+        # Moved to another video, possibly of another subject.
+        old_video_id, old_duration, old_completed = old_state
+        _, watched_duration, is_completed = new_state
+        apply_video_delta(history.user_id, old_video_id, -1, -int(old_completed), -old_duration)
+        apply_video_delta(history.user_id, history.video_id, 1, int(is_completed), watched_duration)
+    else:
+        _, watched_duration, is_completed = new_state
+        if old_state is None:
+            watched, completed, seconds = 1, int(is_completed), watched_duration
+        else:
+            _, old_duration, old_completed = old_state
+            watched, completed, seconds = 0, int(is_completed) - int(old_completed), watched_duration - old_duration
+        apply_learning_delta(history.user_id, _subject_id(history), watched, completed, seconds)
+    history._stats_state = history.stats_state()
+
+
+def record_history_deleted(history, origin=None):
+    """
+    Take a deleted view history out of the user's totals. Only an existing
+    stats row is updated: when the history goes because its user or subject
+    is being deleted, that row is going too and is left alone rather than
+    counted down (or recreated) mid-cascade.
+    """
+    if deleted_with(origin, User, Subject):
+        return
+    state = getattr(history, '_stats_state', None) or history.stats_state()
+    if state is None:
+        return
+    _, watched_duration, is_completed = state
+    subject_id = _subject_id(history)
+    if subject_id is not None:
+        UserLearningStats.objects.filter(user_id=history.user_id, subject_id=subject_id).update(
+            **_changes(-1, -int(is_completed), -watched_duration)
+        )
+
+
+@transaction.atomic
+def rebuild_learning_stats(subject_ids=None):
+    """
+    Recompute UserLearningStats from ViewHistory, for every subject or only
+    for ``subject_ids``. Returns the number of rows written.
+    """
+    history = ViewHistory.objects.order_by()
+    stats = UserLearningStats.objects.all()
+    if subject_ids is not None:
+        history = history.filter(video__subject_id__in=subject_ids)
+        stats = stats.filter(subject_id__in=subject_ids)
+    cells = history.values('user_id', 'video__subject_id').annotate(
+        watched=Count('id'),
+        completed=Count('id', filter=Q(is_completed=True)),
+        seconds=Sum('watched_duration'),
+    )
+    rows = [
+        UserLearningStats(
+            user_id=cell['user_id'],
+            subject_id=cell['video__subject_id'],
+            watched=cell['watched'],
+            completed=cell['completed'],
+            seconds=cell['seconds'] or 0,
+        )
+        for cell in cells
+    ]
+    stats.delete()
+    UserLearningStats.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
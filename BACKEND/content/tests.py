@@ -1,3 +1,337 @@
+import json
+import time
+from base64 import urlsafe_b64encode
+from datetime import timedelta
+from unittest import mock
+
+from django.db.models import QuerySet
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from subscription.models import SubscriptionPlan, UserSubscription
+from users.models import User
+from .counters import rebuild_lesson_counters
+from .models import (
+    Bookmark, ClassLevel, EducationLevel, Subject, SubjectClassLevel, UserLearningStats, VideoLesson, ViewHistory,
+)
+from .pagination import VideoLessonCursorPagination
+from .progress import apply_progress_events, record_progress
+from .stats import rebuild_learning_stats
+
+
+class CatalogMixin:
+    """A small catalog: two subjects taught in two class levels, two lessons per pair."""
+
+    def setUp(self):
+        self.education_level = EducationLevel.objects.create(name='JSS', slug='jss')
+        self.class_levels = [
+            ClassLevel.objects.create(name=f'JSS{i}', slug=f'jss{i}', education_level=self.education_level, order=i)
+            for i in (1, 2)
+        ]
+        self.subjects = [
+            Subject.objects.create(name=name, slug=name.lower()) for name in ('Maths', 'English')
+        ]
+        self.lessons = [
+            self.lesson(subject, class_level, order, is_free=order == 0)
+            for subject in self.subjects
+            for class_level in self.class_levels
+            for order in (0, 1)
+        ]
+
+    def lesson(self, subject, class_level, order, is_free=False):
+        return VideoLesson.objects.create(
+            title=f'{subject.name} {class_level.name} {order}',
+            slug=f'{subject.slug}-{class_level.slug}-{order}',
+            description='Lesson',
+            subject=subject,
+            class_level=class_level,
+            order_in_subject=order,
+            is_free=is_free,
+            duration=600,
+        )
+
+
+class LessonCounterTests(CatalogMixin, TestCase):
+    def counters(self):
+        return (
+            sorted(Subject.objects.values_list('pk', 'lesson_count', 'free_lesson_count')),
+            sorted(ClassLevel.objects.values_list('pk', 'lesson_count', 'free_lesson_count')),
+            # Emptied cells stay behind with zero counts; the catalog skips them.
+            sorted(SubjectClassLevel.objects.filter(lesson_count__gt=0).values_list(
+                'subject_id', 'class_level_id', 'lesson_count', 'free_lesson_count'
+            )),
+        )
+
+    def assertCountersMatchLessons(self):
+        maintained = self.counters()
+        rebuild_lesson_counters()
+        self.assertEqual(maintained, self.counters())
+
+    def test_create_counts_lesson(self):
+        subject = Subject.objects.get(pk=self.subjects[0].pk)
+        self.assertEqual((subject.lesson_count, subject.free_lesson_count), (4, 2))
+        cell = SubjectClassLevel.objects.get(subject=self.subjects[0], class_level=self.class_levels[0])
+        self.assertEqual((cell.lesson_count, cell.free_lesson_count), (2, 1))
+        self.assertCountersMatchLessons()
+
+    def test_move_and_unfree_lesson(self):
+        lesson = VideoLesson.objects.get(pk=self.lessons[0].pk)
+        lesson.subject = self.subjects[1]
+        lesson.order_in_subject = 5
+        lesson.is_free = False
+        lesson.save()
+        self.assertCountersMatchLessons()
+
+    def test_save_of_partly_loaded_lesson(self):
+        lesson = VideoLesson.objects.only('title').get(pk=self.lessons[0].pk)
+        lesson.is_free = False
+        lesson.save(update_fields=['is_free'])
+        self.assertCountersMatchLessons()
+
+    def test_save_of_unloaded_lesson(self):
+        stored = self.lessons[0]
+        VideoLesson(
+            pk=stored.pk, title=stored.title, slug=stored.slug, description='Lesson',
+            subject=self.subjects[1], class_level=self.class_levels[1], order_in_subject=9,
+            is_free=False, duration=600, created_at=stored.created_at,
+        ).save()
+        self.assertCountersMatchLessons()
+
+    def test_delete_lesson(self):
+        self.lessons[0].delete()
+        VideoLesson.objects.filter(pk=self.lessons[1].pk).delete()
+        self.assertCountersMatchLessons()
+
+    def test_delete_subject_with_lessons(self):
+        self.subjects[0].delete()
+        self.assertCountersMatchLessons()
+
+    def test_delete_class_level_with_lessons(self):
+        self.class_levels[0].delete()
+        self.assertCountersMatchLessons()
+
+    def test_delete_education_level_with_lessons(self):
+        self.education_level.delete()
+        self.assertCountersMatchLessons()
+        self.assertFalse(SubjectClassLevel.objects.exists())
+
+    def test_queryset_delete_of_subjects(self):
+        Subject.objects.filter(pk=self.subjects[1].pk).delete()
+        self.assertCountersMatchLessons()
+
+
+class ProgressEventTests(CatalogMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create(email='learner@example.com')
+        self.video = self.lessons[0]
+
+    def test_merges_into_stored_progress(self):
+        ViewHistory.objects.upsert_progress(self.user.pk, self.video.pk, 580, 600)
+        apply_progress_events([(self.user.pk, self.video.pk, 30, 600)])
+        history = ViewHistory.objects.get(user=self.user, video=self.video)
+        self.assertEqual((history.last_position, history.watched_duration, history.is_completed), (30, 580, True))
+
+    def test_row_inserted_after_locking_read_is_merged(self):
+        # The first locking read misses a row that a direct write has just
+        # inserted: the INSERT conflicts and the batch is merged again.
+        ViewHistory.objects.upsert_progress(self.user.pk, self.video.pk, 580, 600)
+        select_for_update = QuerySet.select_for_update
+        reads = []
+
+        def miss_first_read(queryset, *args, **kwargs):
+            reads.append(queryset.model)
+            locked = select_for_update(queryset, *args, **kwargs)
+            return locked.none() if len(reads) == 1 else locked
+
+        with mock.patch.object(QuerySet, 'select_for_update', miss_first_read):
+            apply_progress_events([(self.user.pk, self.video.pk, 30, 600)])
+        history = ViewHistory.objects.get(user=self.user, video=self.video)
+        self.assertEqual(len(reads), 2)
+        self.assertEqual((history.watched_duration, history.is_completed), (580, True))
+
+
+class LearningStatsTests(CatalogMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.users = [
+            User.objects.create(email=f'learner{i}@example.com') for i in range(2)
+        ]
+        for user in self.users:
+            for lesson, position in zip(self.lessons, (600, 120, 300, 0, 550)):
+                record_progress(user.pk, lesson.pk, position, 600)
+
+    def stats(self):
+        return sorted(UserLearningStats.objects.values_list('user_id', 'subject_id', 'watched', 'completed', 'seconds'))
+
+    def assertStatsMatchHistory(self):
+        maintained = self.stats()
+        rebuild_learning_stats()
+        self.assertEqual(maintained, self.stats())
+
+    def test_heartbeats_move_stats(self):
+        record_progress(self.users[0].pk, self.lessons[1].pk, 580, 600)
+        record_progress(self.users[0].pk, self.lessons[1].pk, 10, 600)
+        record_progress(self.users[0].pk, self.lessons[6].pk, 40, 600)
+        row = UserLearningStats.objects.get(user=self.users[0], subject=self.subjects[0])
+        self.assertEqual((row.watched, row.completed, row.seconds), (4, 2, 1480))
+        self.assertStatsMatchHistory()
+
+    def test_saves_and_moves_of_history(self):
+        history = ViewHistory.objects.get(user=self.users[0], video=self.lessons[1])
+        history.update_watch_progress(590, 600)
+        history.video = self.lessons[7]
+        history.save()
+        self.assertStatsMatchHistory()
+
+    def test_delete_history_and_lesson(self):
+        ViewHistory.objects.filter(user=self.users[0], video=self.lessons[0]).delete()
+        self.lessons[2].delete()
+        self.assertStatsMatchHistory()
+
+    def test_delete_user_with_history(self):
+        self.users[0].delete()
+        self.assertFalse(UserLearningStats.objects.filter(user_id=self.users[0].pk).exists())
+        self.assertStatsMatchHistory()
+
+    def test_delete_subject_and_class_level_with_history(self):
+        self.subjects[0].delete()
+        self.class_levels[1].delete()
+        self.assertStatsMatchHistory()
+
+
+class LessonAccessTests(CatalogMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create(email='learner@example.com', is_active=True)
+        self.premium = self.lessons[1]
+        self.client = APIClient()
+
+    def authenticate(self, plan_exp=None):
+        token = AccessToken.for_user(self.user)
+        token['plan'] = 'standard' if plan_exp else None
+        token['plan_exp'] = plan_exp
+        token['role'] = None
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_premium_lesson_needs_plan_claim(self):
+        self.authenticate()
+        for url in (f'/api/content/videos/{self.premium.pk}/', f'/api/content/lessons/{self.premium.slug}/'):
+            self.assertEqual(self.client.get(url).status_code, 403, url)
+        self.assertEqual(self.client.get(f'/api/content/videos/{self.lessons[0].pk}/').status_code, 200)
+
+    def test_premium_lesson_with_plan_claim(self):
+        self.authenticate(plan_exp=int(time.time()) + 3600)
+        for url in (f'/api/content/videos/{self.premium.pk}/', f'/api/content/lessons/{self.premium.slug}/'):
+            self.assertEqual(self.client.get(url).status_code, 200, url)
+
+    def test_expired_plan_claim_is_refused(self):
+        self.authenticate(plan_exp=int(time.time()) - 60)
+        self.assertEqual(self.client.get(f'/api/content/videos/{self.premium.pk}/').status_code, 403)
+
+
+class LessonPaginationTests(CatalogMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        # A class level sharing JSS1's order: its lessons tie with JSS1's on
+        # every ordering field but the ID.
+        education_level = EducationLevel.objects.create(name='SSS', slug='sss')
+        class_level = ClassLevel.objects.create(name='SSS1', slug='sss1', education_level=education_level, order=1)
+        for order in (0, 1, 2):
+            self.lesson(self.subjects[0], class_level, order)
+        self.user = User.objects.create(email='learner@example.com')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.expected = list(VideoLesson.objects.order_by(*VideoLessonCursorPagination.ordering).values_list('pk', flat=True))
+
+    def get(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def cursor(self, position, reverse=False):
+        payload = {'p': position, 'r': 1} if reverse else {'p': position}
+        return urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+    def test_walk_forward_and_back(self):
+        pages = []
+        data = self.get('/api/content/lessons/?page_size=3')
+        self.assertIsNone(data['previous'])
+        while True:
+            pages.append([lesson['id'] for lesson in data['results']])
+            if data['next'] is None:
+                break
+            data = self.get(data['next'])
+        self.assertEqual([pk for page in pages for pk in page], self.expected)
+        self.assertEqual([len(page) for page in pages], [3, 3, 3, 2])
+
+        back = []
+        while data['previous'] is not None:
+            data = self.get(data['previous'])
+            back.append([lesson['id'] for lesson in data['results']])
+        self.assertEqual(back, pages[-2::-1])
+
+    def test_cursor_seeks_past_ties(self):
+        # Resume right after the first of the tying lessons.
+        first = VideoLesson.objects.get(pk=self.expected[2])
+        position = [first.subject.name, first.class_level.order, first.order_in_subject, first.pk]
+        data = self.get(f'/api/content/lessons/?page_size=3&cursor={self.cursor(position)}')
+        self.assertEqual([lesson['id'] for lesson in data['results']], self.expected[3:6])
+        data = self.get(f'/api/content/lessons/?page_size=3&cursor={self.cursor(position, reverse=True)}')
+        self.assertEqual([lesson['id'] for lesson in data['results']], self.expected[:2])
+
+    def test_tampered_cursor_is_rejected(self):
+        for cursor in ('not-base64!', 'e30=', self.cursor([1, 2]), self.cursor(['Maths', 'x', 0, 1]),
+                       self.cursor(['Maths', 1, 0, None]), self.cursor('Maths')):
+            response = self.client.get(f'/api/content/lessons/?cursor={cursor}')
+            self.assertEqual(response.status_code, 404, cursor)
+
+
+class LessonUserStateTests(CatalogMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user, other = [User.objects.create(email=f'learner{i}@example.com') for i in range(2)]
+        self.free, self.premium = self.lessons[0], self.lessons[1]
+        ViewHistory.objects.upsert_progress(self.user.pk, self.free.pk, 590, 600)
+        ViewHistory.objects.upsert_progress(self.user.pk, self.premium.pk, 120, 600)
+        Bookmark.objects.create(user=self.user, video=self.premium)
+        # Another user's state must not show up.
+        ViewHistory.objects.upsert_progress(other.pk, self.lessons[2].pk, 300, 600)
+        Bookmark.objects.create(user=other, video=self.lessons[2])
+        self.plan = SubscriptionPlan.objects.create(name='Standard', plan_type='standard', description='Standard')
+
+    def state(self):
+        lessons = VideoLesson.objects.with_user_state(self.user).order_by('pk')
+        return {
+            lesson.pk: (lesson.last_position, lesson.is_completed, lesson.is_bookmarked, lesson.can_play)
+            for lesson in lessons
+        }
+
+    def test_state_without_subscription(self):
+        state = self.state()
+        self.assertEqual(state[self.free.pk], (590, True, False, True))
+        self.assertEqual(state[self.premium.pk], (120, False, True, False))
+        self.assertEqual(state[self.lessons[2].pk], (0, False, False, True))
+        self.assertEqual(state[self.lessons[3].pk], (0, False, False, False))
+
+    def test_active_subscription_plays_premium_lessons(self):
+        now = timezone.now()
+        UserSubscription.objects.create(user=self.user, plan=self.plan, end_date=now + timedelta(days=1))
+        self.assertTrue(all(can_play for *_, can_play in self.state().values()))
+        UserSubscription.objects.update(end_date=now - timedelta(minutes=1))
+        self.assertFalse(self.state()[self.premium.pk][3])
 
-# Create your tests here.
+    def test_listing_with_user_state_is_one_query(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        with self.assertNumQueries(1):
+            response = client.get('/api/content/lessons/?user_state=1&page_size=100')
+        lessons = {lesson['id']: lesson for lesson in response.data['results']}
+        self.assertEqual(len(lessons), len(self.lessons))
+        self.assertEqual(
+            {key: lessons[self.premium.pk][key] for key in ('last_position', 'is_completed', 'is_bookmarked', 'can_play')},
+            {'last_position': 120, 'is_completed': False, 'is_bookmarked': True, 'can_play': False},
+        )
+        self.assertNotIn('can_play', client.get('/api/content/lessons/').data['results'][0])
@@ -1,10 +1,10 @@
 from django.urls import path
 from .views import (
-    EducationLevelListView, ClassLevelListView, SubjectListView,
+    EducationLevelListView, ClassLevelListView, SubjectListView, CatalogTreeView,
     VideoLessonListView, VideoLessonDetailView, VideoLessonCreateView, VideoLessonUpdateView, VideoLessonDeleteView,
     CourseListView, CourseDetailView, CourseBySubjectView, CourseByClassView, FeaturedCourseListView,
-    VideoListView, VideoDetailView, VideosByCourseView, VideoProgressView, VideoProgressDetailView, VideoBookmarkView,
-    ProgressDashboardView, CourseProgressView, SubjectProgressView, TrackLearningView, RecentActivityView,
+    VideoListView, VideoDetailView, VideosByCourseView, VideoProgressView, VideoProgressBatchView, VideoProgressDetailView, VideoBookmarkView,
+    ProgressDashboardView, CourseProgressView, SubjectProgressView, SubjectsProgressView, TrackLearningView, RecentActivityView,
     AnalyticsPerformanceView, AnalyticsTimeSpentView, AnalyticsSubjectStrengthsView, AnalyticsRecommendationsView,
     AdminCourseListCreateView, AdminCourseDetailView, AdminVideoListCreateView, AdminVideoDetailView, AdminSubjectListCreateView, AdminSubjectDetailView, AdminClassLevelListView, FreeSampleVideoListView, VideoBookmarksListView, VideoCurrentView,
     AdminVideoUploadView
@@ -14,6 +14,7 @@ urlpatterns = [
     path('education-levels/', EducationLevelListView.as_view(), name='education-level-list'),
     path('class-levels/', ClassLevelListView.as_view(), name='class-level-list'),
     path('subjects/', SubjectListView.as_view(), name='subject-list'),
+    path('catalog/', CatalogTreeView.as_view(), name='catalog-tree'),
     path('lessons/', VideoLessonListView.as_view(), name='lesson-list'),
     path('lessons/<slug:slug>/', VideoLessonDetailView.as_view(), name='lesson-detail'),
     path('lessons/create/', VideoLessonCreateView.as_view(), name='lesson-create'),
@@ -29,6 +30,7 @@ urlpatterns = [
     path('videos/course/<int:course_id>/', VideosByCourseView.as_view(), name='videos-by-course'),
     path('videos/free-sample/', FreeSampleVideoListView.as_view(), name='free-sample-videos'),
     path('videos/progress/', VideoProgressView.as_view(), name='video-progress'),
+    path('videos/progress/batch/', VideoProgressBatchView.as_view(), name='video-progress-batch'),
     path('videos/progress/<int:id>/', VideoProgressDetailView.as_view(), name='video-progress-detail'),
     path('videos/<int:id>/bookmark/', VideoBookmarkView.as_view(), name='video-bookmark'),
     path('videos/bookmarks/', VideoBookmarksListView.as_view(), name='video-bookmarks'),
@@ -37,6 +39,7 @@ urlpatterns = [
     path('progress/dashboard/', ProgressDashboardView.as_view(), name='progress-dashboard'),
     path('progress/course/<int:course_id>/', CourseProgressView.as_view(), name='progress-course'),
     path('progress/subject/<int:subject_id>/', SubjectProgressView.as_view(), name='progress-subject'),
+    path('progress/subjects/', SubjectsProgressView.as_view(), name='progress-subjects'),
     path('progress/track/', TrackLearningView.as_view(), name='progress-track'),
     path('progress/recent-activity/', RecentActivityView.as_view(), name='progress-recent-activity'),
     path('analytics/performance/', AnalyticsPerformanceView.as_view(), name='analytics-performance'),
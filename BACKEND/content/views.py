@@ -1,5 +1,5 @@
 from django.shortcuts import render, get_object_or_404
-import random
+from django.http import Http404
 import re
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
@@ -7,14 +7,24 @@ from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 from django.core.files.storage import default_storage
 from django.conf import settings
 import os
-from .models import EducationLevel, ClassLevel, Subject, VideoLesson, ViewHistory
+from .models import (
+    EducationLevel, ClassLevel, Subject, VideoLesson, ViewHistory, UserLearningStats, listing_video_prefetch
+)
 from .serializers import (
     EducationLevelSerializer, ClassLevelSerializer, SubjectSerializer, 
-    VideoLessonSerializer, VideoProgressSerializer
+    VideoLessonSerializer, VideoLessonUserStateSerializer, VideoProgressSerializer, ProgressHeartbeatSerializer, ProgressBatchSerializer
 )
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.views import APIView
-from .permissions import HasActiveSubscriptionOrIsFree
+from .permissions import HasEntitlementClaimOrIsFree, token_grants_premium
+from users.authentication import ClaimsJWTAuthentication
+from subscription.entitlements import has_active_subscription
+from .pagination import VideoLessonCursorPagination
+from .catalog import get_catalog_tree, sample_free_lessons
+from .stats import subject_progress, subjects_progress
+from .progress import (
+    apply_progress_events, buffer_heartbeat, is_buffered, is_completed_position, record_progress
+)
 
 class IsContentAdmin(permissions.BasePermission):
     def has_permission(self, request, view):
@@ -35,9 +45,38 @@ class SubjectListView(generics.ListAPIView):
     serializer_class = SubjectSerializer
     permission_classes = [permissions.AllowAny]
 
-class VideoLessonListView(generics.ListAPIView):
-    queryset = VideoLesson.objects.all()
+class CatalogTreeView(APIView):
+    """Full education level -> class level -> subject tree with lesson counts, served from cache."""
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request):
+        return Response(get_catalog_tree())
+
+class UserStateListMixin:
+    """
+    Opt-in ``?user_state=1`` for lesson listings: every lesson also carries the
+    caller's last_position, is_completed, is_bookmarked and can_play, computed
+    in the listing query itself.
+    """
+    def wants_user_state(self):
+        return self.request.query_params.get('user_state') in ('1', 'true')
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.wants_user_state():
+            queryset = queryset.with_user_state(self.request.user)
+        return queryset
+
+    def get_serializer_class(self):
+        if self.wants_user_state():
+            return VideoLessonUserStateSerializer
+        return super().get_serializer_class()
+
+class VideoLessonListView(UserStateListMixin, generics.ListAPIView):
+    queryset = VideoLesson.objects.for_listing()
     serializer_class = VideoLessonSerializer
+    pagination_class = VideoLessonCursorPagination
+    authentication_classes = [ClaimsJWTAuthentication]
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
@@ -54,9 +93,10 @@ class VideoLessonListView(generics.ListAPIView):
         return queryset
 
 class VideoLessonDetailView(generics.RetrieveAPIView):
-    queryset = VideoLesson.objects.all()
+    queryset = VideoLesson.objects.for_listing()
     serializer_class = VideoLessonSerializer
-    permission_classes = [IsAuthenticated, HasActiveSubscriptionOrIsFree]
+    authentication_classes = [ClaimsJWTAuthentication]
+    permission_classes = [IsAuthenticated, HasEntitlementClaimOrIsFree]
     lookup_field = 'slug'
 
     def retrieve(self, request, *args, **kwargs):
@@ -66,15 +106,10 @@ class VideoLessonDetailView(generics.RetrieveAPIView):
 
         # Add subscription status for premium videos
         if not instance.is_free:
-            from subscription.models import Subscription
-            has_active_subscription = Subscription.objects.filter(
-                user=request.user,
-                payment_status='completed',
-                start_date__lte=timezone.now(),
-                end_date__gte=timezone.now()
-            ).exists()
             data['requires_subscription'] = True
-            data['has_active_subscription'] = has_active_subscription
+            data['has_active_subscription'] = (
+                token_grants_premium(request.auth) or has_active_subscription(request.user)
+            )
 
         return Response(data)
 
@@ -294,44 +329,97 @@ class CourseByClassView(generics.ListAPIView):
     permission_classes = [IsAuthenticated]
     def get_queryset(self):
         class_level = self.kwargs.get('class_level')
-        return Subject.objects.filter(videos__class_level__slug=class_level).distinct()
+        return Subject.objects.filter(
+            class_level_availability__class_level__slug=class_level,
+            class_level_availability__lesson_count__gt=0,
+        )
 
 class FeaturedCourseListView(generics.ListAPIView):
     serializer_class = SubjectSerializer
     permission_classes = [permissions.AllowAny]  # Allow public access to featured courses
     def get_queryset(self):
-        return Subject.objects.filter(videos__is_free=True).distinct()
+        return Subject.objects.filter(free_lesson_count__gt=0)
 
-class VideoListView(generics.ListAPIView):
-    queryset = VideoLesson.objects.all()
+class VideoListView(UserStateListMixin, generics.ListAPIView):
+    queryset = VideoLesson.objects.for_listing()
     serializer_class = VideoLessonSerializer
+    pagination_class = VideoLessonCursorPagination
+    authentication_classes = [ClaimsJWTAuthentication]
     permission_classes = [IsAuthenticated]
 
 class VideoDetailView(generics.RetrieveAPIView):
-    queryset = VideoLesson.objects.all()
+    queryset = VideoLesson.objects.for_listing()
     serializer_class = VideoLessonSerializer
-    permission_classes = [IsAuthenticated]
+    authentication_classes = [ClaimsJWTAuthentication]
+    permission_classes = [IsAuthenticated, HasEntitlementClaimOrIsFree]
     lookup_field = 'id'
 
-class VideosByCourseView(generics.ListAPIView):
+class VideosByCourseView(UserStateListMixin, generics.ListAPIView):
+    queryset = VideoLesson.objects.for_listing()
     serializer_class = VideoLessonSerializer
+    pagination_class = VideoLessonCursorPagination
+    authentication_classes = [ClaimsJWTAuthentication]
     permission_classes = [IsAuthenticated]
     def get_queryset(self):
         course_id = self.kwargs.get('course_id')
-        return VideoLesson.objects.filter(subject_id=course_id)
+        return super().get_queryset().filter(subject_id=course_id)
+
+def buffer_progress_heartbeat(request):
+    """Queue a heartbeat for the bulk flusher instead of writing ViewHistory now."""
+    serializer = ProgressHeartbeatSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    data = serializer.validated_data
+    buffer_heartbeat(request.user.id, data['video'], data['last_position'], data['watched_duration'])
+    return Response({
+        'video': data['video'],
+        'last_position': data['last_position'],
+        'is_completed': is_completed_position(data['last_position'], data['watched_duration']),
+        'buffered': True,
+    }, status=status.HTTP_202_ACCEPTED)
+
+def record_progress_heartbeat(request):
+    """Write a heartbeat straight to ViewHistory with one upsert."""
+    serializer = ProgressHeartbeatSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    data = serializer.validated_data
+    history = record_progress(request.user.id, data['video'], data['last_position'], data['watched_duration'])
+    if history is None:
+        raise Http404('No VideoLesson matches the given query.')
+    return history
 
 class VideoProgressView(APIView):
     permission_classes = [IsAuthenticated]
     def post(self, request):
-        video_id = request.data.get('video')
-        position = request.data.get('last_position')
-        duration = request.data.get('watched_duration')
-        video = get_object_or_404(VideoLesson, id=video_id)
-        history, _ = ViewHistory.objects.get_or_create(user=request.user, video=video)
-        history.update_watch_progress(position, duration)
+        if is_buffered():
+            return buffer_progress_heartbeat(request)
+        history = record_progress_heartbeat(request)
         serializer = VideoProgressSerializer(history)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+class VideoProgressBatchView(APIView):
+    """Apply a queue of offline progress events in one transaction."""
+    permission_classes = [IsAuthenticated]
+    def post(self, request):
+        serializer = ProgressBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        # Replayed duplicates collapse; the rest are applied per video in client order
+        events = {
+            (event['video'], event['client_ts']): event
+            for event in serializer.validated_data['events']
+        }
+        ordered = sorted(events.values(), key=lambda event: (event['video'], event['client_ts']))
+        states = apply_progress_events([
+            (request.user.id, event['video'], event['last_position'], event['watched_duration'])
+            for event in ordered
+        ])
+        applied_videos = {video_id for _, video_id in states}
+        return Response({
+            'results': VideoProgressSerializer(
+                sorted(states.values(), key=lambda history: history.video_id), many=True
+            ).data,
+            'ignored_videos': sorted({event['video'] for event in ordered} - applied_videos),
+        }, status=status.HTTP_200_OK)
+
 class VideoProgressDetailView(APIView):
     permission_classes = [IsAuthenticated]
     def get(self, request, id):
@@ -358,7 +446,7 @@ class VideoBookmarkView(APIView):
 class VideoBookmarksListView(APIView):
     permission_classes = [IsAuthenticated]
     def get(self, request):
-        bookmarks = Bookmark.objects.filter(user=request.user).select_related('video')
+        bookmarks = Bookmark.objects.filter(user=request.user).prefetch_related(listing_video_prefetch())
         videos = [b.video for b in bookmarks if b.video]
         data = VideoLessonSerializer(videos, many=True).data
         return Response(data)
@@ -367,41 +455,47 @@ class ProgressDashboardView(APIView):
     permission_classes = [IsAuthenticated]
     def get(self, request):
         # Returns overall learning progress (e.g., total videos watched, completed, etc.)
-        total_watched = ViewHistory.objects.filter(user=request.user).count()
-        total_completed = ViewHistory.objects.filter(user=request.user, is_completed=True).count()
+        totals = UserLearningStats.objects.filter(user=request.user).totals()
         return Response({
-            'total_watched': total_watched,
-            'total_completed': total_completed
+            'total_watched': totals['watched'],
+            'total_completed': totals['completed']
         })
 
 class CourseProgressView(APIView):
     permission_classes = [IsAuthenticated]
     def get(self, request, course_id):
         # Returns progress for a specific course (subject)
-        videos = VideoLesson.objects.filter(subject_id=course_id)
-        total = videos.count()
-        completed = ViewHistory.objects.filter(user=request.user, video__in=videos, is_completed=True).count()
+        total, completed = subject_progress(request.user, course_id)
         return Response({'course_id': course_id, 'total': total, 'completed': completed})
 
 class SubjectProgressView(APIView):
     permission_classes = [IsAuthenticated]
     def get(self, request, subject_id):
         # Returns progress for a specific subject (alias for course)
-        videos = VideoLesson.objects.filter(subject_id=subject_id)
-        total = videos.count()
-        completed = ViewHistory.objects.filter(user=request.user, video__in=videos, is_completed=True).count()
+        total, completed = subject_progress(request.user, subject_id)
         return Response({'subject_id': subject_id, 'total': total, 'completed': completed})
 
+class SubjectsProgressView(APIView):
+    permission_classes = [IsAuthenticated]
+    def get(self, request):
+        # Progress for every subject card at once; ?ids=1,2,3 limits it to those subjects
+        ids = request.query_params.get('ids')
+        subject_ids = None
+        if ids:
+            try:
+                subject_ids = [int(value) for value in ids.split(',') if value.strip()]
+            except ValueError:
+                return Response({'ids': 'Expected a comma-separated list of subject ids.'},
+                                status=status.HTTP_400_BAD_REQUEST)
+        return Response(subjects_progress(request.user, subject_ids))
+
 class TrackLearningView(APIView):
     permission_classes = [IsAuthenticated]
     def post(self, request):
         # Update learning progress (same as video progress, but can be extended)
-        video_id = request.data.get('video')
-        position = request.data.get('last_position')
-        duration = request.data.get('watched_duration')
-        video = get_object_or_404(VideoLesson, id=video_id)
-        history, _ = ViewHistory.objects.get_or_create(user=request.user, video=video)
-        history.update_watch_progress(position, duration)
+        if is_buffered():
+            return buffer_progress_heartbeat(request)
+        history = record_progress_heartbeat(request)
         serializer = VideoProgressSerializer(history)
         return Response(serializer.data)
 
@@ -423,12 +517,11 @@ class AnalyticsPerformanceView(APIView):
     permission_classes = [IsAuthenticated]
     def get(self, request):
         # Example: total videos watched, completed, average watch time
-        total_watched = ViewHistory.objects.filter(user=request.user).count()
-        total_completed = ViewHistory.objects.filter(user=request.user, is_completed=True).count()
-        avg_watch_time = ViewHistory.objects.filter(user=request.user).aggregate(avg=Avg('watched_duration'))['avg'] or 0
+        totals = UserLearningStats.objects.filter(user=request.user).totals()
+        avg_watch_time = totals['seconds'] / totals['watched'] if totals['watched'] else 0
         return Response({
-            'total_watched': total_watched,
-            'total_completed': total_completed,
+            'total_watched': totals['watched'],
+            'total_completed': totals['completed'],
             'average_watch_time': avg_watch_time
         })
 
@@ -436,7 +529,7 @@ class AnalyticsTimeSpentView(APIView):
     permission_classes = [IsAuthenticated]
     def get(self, request):
         # Total time spent learning (sum of watched_duration)
-        total_time = ViewHistory.objects.filter(user=request.user).aggregate(total=Sum('watched_duration'))['total'] or 0
+        total_time = UserLearningStats.objects.filter(user=request.user).totals()['seconds']
         return Response({'total_time_spent': total_time})
 
 class AnalyticsSubjectStrengthsView(APIView):
@@ -444,12 +537,13 @@ class AnalyticsSubjectStrengthsView(APIView):
     def get(self, request):
         # Videos completed per subject
         data = (
-            ViewHistory.objects.filter(user=request.user, is_completed=True)
-            .values('video__subject__name')
-            .annotate(completed=Count('id'))
+            UserLearningStats.objects.filter(user=request.user, completed__gt=0)
             .order_by('-completed')
+            .values_list('subject__name', 'completed')
         )
-        return Response({'subject_strengths': list(data)})
+        return Response({'subject_strengths': [
+            {'video__subject__name': name, 'completed': completed} for name, completed in data
+        ]})
 
 class AnalyticsRecommendationsView(APIView):
     permission_classes = [IsAuthenticated]
@@ -480,8 +574,9 @@ class AdminCourseDetailView(generics.RetrieveUpdateDestroyAPIView):
     lookup_field = 'id'
 
 class AdminVideoListCreateView(generics.ListCreateAPIView):
-    queryset = VideoLesson.objects.all()
+    queryset = VideoLesson.objects.for_listing()
     serializer_class = VideoLessonSerializer
+    pagination_class = VideoLessonCursorPagination
     permission_classes = [IsSuperAdmin|IsContentAdmin]
     parser_classes = (MultiPartParser, FormParser)
     
@@ -536,7 +631,7 @@ class AdminVideoListCreateView(generics.ListCreateAPIView):
         return match.group(6) if match else None
 
 class AdminVideoDetailView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = VideoLesson.objects.all()
+    queryset = VideoLesson.objects.for_listing()
     serializer_class = VideoLessonSerializer
     permission_classes = [IsSuperAdmin|IsContentAdmin]
     lookup_field = 'id'
@@ -558,28 +653,22 @@ class AdminClassLevelListView(generics.ListAPIView):
     permission_classes = [IsSuperAdmin|IsContentAdmin]
 
 class FreeSampleVideoListView(APIView):
+    permission_classes = [permissions.AllowAny]
+
     def get(self, request):
-        free_videos = VideoLesson.objects.filter(is_free=True)
-        sample = random.sample(list(free_videos), min(12, free_videos.count()))
-        # Map to required structure
-        data = [
-            {
-                "id": str(video.id),
-                "title": video.title,
-                "thumbnail": video.thumbnail.url if video.thumbnail else "",
-                "subject": video.subject.name if video.subject else "",
-                "duration": str(video.duration) if hasattr(video, 'duration') else "",
-                "courseId": str(video.subject.id) if video.subject else ""
-            }
-            for video in sample
-        ]
-        return Response(data, status=status.HTTP_200_OK)
+        # Sampled from an in-memory pool of pre-serialized free lesson cards
+        return Response(sample_free_lessons(12), status=status.HTTP_200_OK)
 
 class VideoCurrentView(APIView):
     permission_classes = [IsAuthenticated]
     def get(self, request):
         # Return the most recently watched video for the user
-        last_history = ViewHistory.objects.filter(user=request.user).order_by('-updated_at').first()
+        last_history = (
+            ViewHistory.objects.filter(user=request.user)
+            .prefetch_related(listing_video_prefetch())
+            .order_by('-updated_at')
+            .first()
+        )
         if last_history and last_history.video:
             data = VideoLessonSerializer(last_history.video).data
             return Response(data)
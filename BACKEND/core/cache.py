@@ -0,0 +1,42 @@
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+
+
+def is_shared(backend=None):
+    """
+    Whether every process sees the same entries in ``backend`` (the default
+    cache if omitted). A local-memory cache is private to its process, so a
+    delete or version bump made in one worker never reaches the others.
+    """
+    # ``cache`` is a proxy, so test the backend object behind it.
+    return not isinstance(backend or caches[DEFAULT_CACHE_ALIAS], LocMemCache)
+
+
+def cache_timeout(timeout, backend=None):
+    """
+    ``timeout`` for an entry derived from the database (None meaning forever),
+    capped at LOCAL_CACHE_TIMEOUT when the cache is per-process: other workers
+    cannot be told about a change, so their copy has to run out instead.
+    """
+    if is_shared(backend):
+        return timeout
+    if timeout is None:
+        return settings.LOCAL_CACHE_TIMEOUT
+    return min(timeout, settings.LOCAL_CACHE_TIMEOUT)
+
+
+def get_version(key):
+    """The current version token stored under ``key``, created on first use."""
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid4().hex, timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(key):
+    """Replace the version token under ``key``, retiring everything keyed by the old one."""
+    cache.set(key, uuid4().hex, timeout=None)
@@ -0,0 +1,184 @@
+import time
+from datetime import timedelta
+from uuid import uuid4
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from content.counters import rebuild_lesson_counters
+from content.models import EducationLevel, ClassLevel, Subject, VideoLesson, Bookmark, ViewHistory
+from rewards.models import UserPoints, PointsTransaction
+from subscription.models import SubscriptionPlan, UserSubscription
+from users.models import User
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a large synthetic dataset and print EXPLAIN plans and timings for the '
+        'per-user queries behind the content, dashboard, rewards and subscription endpoints. '
+        'Everything is rolled back afterwards unless --keep is given.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--videos', type=int, default=500)
+        parser.add_argument('--history', type=int, default=100, help='ViewHistory rows per user')
+        parser.add_argument('--bookmarks', type=int, default=20, help='Bookmarks per user')
+        parser.add_argument('--transactions', type=int, default=50, help='PointsTransaction rows per user')
+        parser.add_argument('--subscriptions', type=int, default=3, help='UserSubscription rows per user')
+        parser.add_argument('--repeat', type=int, default=50, help='Timed executions per query')
+        parser.add_argument('--no-explain', action='store_true', help='Only print timings')
+        parser.add_argument('--keep', action='store_true', help='Commit the seeded data instead of rolling back')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                user, videos = self.seed(options)
+                self.run_queries(user, videos, options)
+                if not options['keep']:
+                    raise Rollback
+        except Rollback:
+            self.stdout.write('Seeded data rolled back.')
+        else:
+            rebuild_lesson_counters()
+            self.stdout.write(self.style.SUCCESS('Seeded data kept.'))
+
+    def seed(self, options):
+        started = time.perf_counter()
+        tag = uuid4().hex[:8]
+        now = timezone.now()
+
+        education_level = EducationLevel.objects.create(name=f'Bench {tag}', slug=f'bench-{tag}')
+        class_levels = ClassLevel.objects.bulk_create([
+            ClassLevel(name=f'Bench {tag} {i}', slug=f'bench-{tag}-{i}', education_level=education_level, order=i)
+            for i in range(6)
+        ])
+        subjects = Subject.objects.bulk_create([
+            Subject(name=f'Bench {tag} {i}', slug=f'bench-subject-{tag}-{i}') for i in range(10)
+        ])
+        videos = VideoLesson.objects.bulk_create([
+            VideoLesson(
+                title=f'Bench lesson {i}',
+                slug=f'bench-{tag}-lesson-{i}',
+                description='Benchmark lesson',
+                subject=subjects[i % len(subjects)],
+                class_level=class_levels[(i // len(subjects)) % len(class_levels)],
+                order_in_subject=i,
+                duration=600,
+                is_free=i % 5 == 0,
+            )
+            for i in range(options['videos'])
+        ], batch_size=1000)
+
+        password = make_password(None)
+        users = User.objects.bulk_create([
+            User(email=f'bench-{tag}-{i}@example.com', password=password)
+            for i in range(options['users'])
+        ], batch_size=1000)
+        points = UserPoints.objects.bulk_create([UserPoints(user=u) for u in users], batch_size=1000)
+        plan = SubscriptionPlan.objects.create(
+            name=f'Bench {tag}', plan_type='standard', description='Benchmark plan', price=0
+        )
+
+        history, bookmarks, ledger, subscriptions = [], [], [], []
+        video_count = len(videos)
+        for index, (user, user_points) in enumerate(zip(users, points)):
+            for j in range(min(options['history'], video_count)):
+                history.append(ViewHistory(
+                    user=user,
+                    video=videos[(index + j) % video_count],
+                    watched_duration=300,
+                    last_position=300,
+                    is_completed=j % 3 == 0,
+                ))
+            for j in range(min(options['bookmarks'], video_count)):
+                bookmarks.append(Bookmark(user=user, video=videos[(index * 7 + j) % video_count]))
+            for j in range(options['transactions']):
+                ledger.append(PointsTransaction(
+                    user_points=user_points,
+                    points=10,
+                    transaction_type='earned',
+                    reason='Benchmark award',
+                    video=videos[(index + j) % video_count],
+                ))
+            for j in range(options['subscriptions']):
+                start = now - timedelta(days=30 * (options['subscriptions'] - j))
+                subscriptions.append(UserSubscription(
+                    user=user,
+                    plan=plan,
+                    start_date=start,
+                    end_date=start + timedelta(days=30 if j < options['subscriptions'] - 1 else 60),
+                    is_active=j == options['subscriptions'] - 1,
+                    payment_reference=f'bench_{tag}_{index}_{j}',
+                ))
+
+        ViewHistory.objects.bulk_create(history, batch_size=2000)
+        Bookmark.objects.bulk_create(bookmarks, batch_size=2000)
+        PointsTransaction.objects.bulk_create(ledger, batch_size=2000)
+        UserSubscription.objects.bulk_create(subscriptions, batch_size=2000)
+
+        if connection.vendor in ('postgresql', 'sqlite'):
+            # Refresh planner statistics so the plans reflect the seeded volume
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+
+        self.stdout.write(
+            f'Seeded {len(users)} users, {len(videos)} lessons, {len(history)} view histories, '
+            f'{len(bookmarks)} bookmarks, {len(ledger)} points transactions and '
+            f'{len(subscriptions)} subscriptions in {time.perf_counter() - started:.1f}s.'
+        )
+        return users[len(users) // 2], videos
+
+    def benchmark_queries(self, user, videos):
+        now = timezone.now()
+        user_points = UserPoints.objects.get(user=user)
+        video = videos[0]
+        subject_videos = VideoLesson.objects.filter(subject_id=video.subject_id)
+        return [
+            ('content RecentActivityView / dashboards: latest history',
+             ViewHistory.objects.filter(user=user).order_by('-updated_at')[:10]),
+            ('content ProgressDashboardView: completed count',
+             ViewHistory.objects.filter(user=user, is_completed=True).order_by()),
+            ('content AnalyticsSubjectStrengthsView: completed per subject',
+             ViewHistory.objects.filter(user=user, is_completed=True)
+             .values('video__subject__name').order_by()),
+            ('content SubjectProgressView: completed in subject',
+             ViewHistory.objects.filter(user=user, video__in=subject_videos, is_completed=True).order_by()),
+            ('content VideoProgressView: progress row',
+             ViewHistory.objects.filter(user=user, video=video)),
+            ('content / dashboards: latest bookmarks',
+             Bookmark.objects.filter(user=user).order_by('-created_at')[:10]),
+            ('content permissions: active subscription check',
+             UserSubscription.objects.filter(user=user, is_active=True, start_date__lte=now, end_date__gte=now)),
+            ('dashboards: latest active subscription',
+             UserSubscription.objects.filter(user=user, is_active=True).order_by('-end_date')[:1]),
+            ('subscription VerifySubscriptionView: by reference',
+             UserSubscription.objects.filter(payment_reference=f'missing-{user.pk}', user=user)),
+            ('content signals: already awarded for video',
+             PointsTransaction.objects.filter(user_points=user_points, video=video, transaction_type='earned')),
+            ('rewards: latest ledger entries',
+             PointsTransaction.objects.filter(user_points=user_points).order_by('-created_at')[:20]),
+        ]
+
+    def run_queries(self, user, videos, options):
+        repeat = max(options['repeat'], 1)
+        for label, queryset in self.benchmark_queries(user, videos):
+            self.stdout.write(self.style.MIGRATE_HEADING(label))
+            if not options['no_explain']:
+                self.stdout.write(queryset.explain())
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                list(queryset.all())
+                timings.append((time.perf_counter() - started) * 1000)
+            timings.sort()
+            self.stdout.write(
+                f'  mean {sum(timings) / repeat:.3f} ms, '
+                f'p50 {timings[repeat // 2]:.3f} ms, max {timings[-1]:.3f} ms'
+            )
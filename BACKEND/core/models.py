@@ -9,6 +9,11 @@ from django.dispatch import receiver
 
 @receiver(post_migrate)
 def create_lms_admin_groups(sender, **kwargs):
+    # post_migrate is sent once per app, in INSTALLED_APPS order: wait until the
+    # rewards app (listed after this one) has its content types, e.g. when a
+    # fresh test database is created.
+    if not ContentType.objects.filter(app_label='rewards').exists():
+        return
     # Super Admin: can do everything (already exists as is_superuser)
     # Content Admin: can upload content, view analytics, but not manage users or other admins
     content_admin_group, _ = Group.objects.get_or_create(name='Content Admin')
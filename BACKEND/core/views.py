@@ -5,7 +5,7 @@ from users.permissions import IsSuperAdmin
 from rest_framework.permissions import IsAuthenticated
 from rewards.models import UserStreak, UserPoints
 from rewards.serializers import UserStreakSerializer, UserPointsSerializer
-from content.models import Bookmark, ViewHistory, VideoLesson
+from content.models import Bookmark, ViewHistory, VideoLesson, UserLearningStats, listing_video_prefetch
 from content.serializers import BookmarkSerializer, VideoLessonSerializer
 from subscription.models import UserSubscription
 from subscription.serializers import UserSubscriptionSerializer
@@ -27,19 +27,31 @@ class DashboardStatsView(APIView):
     permission_classes = [IsAuthenticated]
     def get(self, request):
         user = request.user
-        total_watched = ViewHistory.objects.filter(user=user).count()
-        total_completed = ViewHistory.objects.filter(user=user, is_completed=True).count()
+        totals = UserLearningStats.objects.filter(user=user).totals()
         streak, _ = UserStreak.objects.get_or_create(user=user)
         points, _ = UserPoints.objects.get_or_create(user=user)
-        bookmarks = Bookmark.objects.filter(user=user).order_by('-created_at')[:10]
+        bookmarks = (
+            Bookmark.objects.filter(user=user)
+            .prefetch_related(listing_video_prefetch())
+            .order_by('-created_at')[:10]
+        )
         bookmarks_data = BookmarkSerializer(bookmarks, many=True).data
-        history = ViewHistory.objects.filter(user=user).order_by('-updated_at')[:10]
+        history = (
+            ViewHistory.objects.filter(user=user)
+            .prefetch_related(listing_video_prefetch())
+            .order_by('-updated_at')[:10]
+        )
         history_data = VideoLessonSerializer([h.video for h in history if h.video], many=True).data
-        subscription = UserSubscription.objects.filter(user=user, is_active=True).order_by('-end_date').first()
+        subscription = (
+            UserSubscription.objects.filter(user=user, is_active=True)
+            .select_related('plan', 'voucher')
+            .order_by('-end_date')
+            .first()
+        )
         subscription_data = UserSubscriptionSerializer(subscription).data if subscription else None
         return Response({
-            'total_watched': total_watched,
-            'total_completed': total_completed,
+            'total_watched': totals['watched'],
+            'total_completed': totals['completed'],
             'streak': UserStreakSerializer(streak).data,
             'points': UserPointsSerializer(points).data,
             'bookmarks': bookmarks_data,
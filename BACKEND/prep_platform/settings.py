@@ -106,6 +106,25 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Local memory by default; point CACHE_BACKEND/CACHE_LOCATION at a shared
+# cache (e.g. django.core.cache.backends.redis.RedisCache) in production so
+# all workers see the same entries. A local-memory cache is private to each
+# process, so invalidations only reach the worker that made the change: cached
+# copies of database state (catalog tree, points rules, roles, entitlements)
+# are then kept at most LOCAL_CACHE_TIMEOUT seconds.
+
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='prep-platform'),
+    }
+}
+
+LOCAL_CACHE_TIMEOUT = config('LOCAL_CACHE_TIMEOUT', default=30, cast=int)
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -160,12 +179,64 @@ REST_FRAMEWORK = {
     )
 }
 
+# Lesson listings use keyset (cursor) pagination, see content/pagination.py
+LESSON_PAGE_SIZE = config('LESSON_PAGE_SIZE', default=20, cast=int)
+LESSON_MAX_PAGE_SIZE = config('LESSON_MAX_PAGE_SIZE', default=100, cast=int)
+
+# Video progress heartbeats: 'direct' writes ViewHistory on every request,
+# 'buffered' queues them in PROGRESS_BUFFER_CACHE and writes them in bulk every
+# PROGRESS_FLUSH_INTERVAL seconds (run `manage.py flush_progress_buffer --loop`
+# when the cache is shared). With a local-memory cache every process buffers
+# and flushes its own heartbeats on a background thread, so heartbeats still
+# waiting in a process are lost if it exits; use a shared cache in production.
+PROGRESS_INGEST_MODE = config('PROGRESS_INGEST_MODE', default='direct')
+PROGRESS_BUFFER_CACHE = 'default'
+PROGRESS_FLUSH_INTERVAL = config('PROGRESS_FLUSH_INTERVAL', default=10, cast=int)
+
+# Cached subscription entitlements expire when the subscription does (or
+# after LOCAL_CACHE_TIMEOUT without a shared cache); users without one are
+# re-checked after ENTITLEMENT_CACHE_TIMEOUT seconds.
+ENTITLEMENT_CACHE_TIMEOUT = config('ENTITLEMENT_CACHE_TIMEOUT', default=30, cast=int)
+
+# Ended subscriptions are switched to is_active=False by
+# `manage.py expire_subscriptions --loop`, every SUBSCRIPTION_EXPIRY_INTERVAL
+# seconds.
+SUBSCRIPTION_EXPIRY_INTERVAL = config('SUBSCRIPTION_EXPIRY_INTERVAL', default=300, cast=int)
+
+# Largest voucher batch the admin API mints in one request; use
+# `manage.py generate_vouchers` for bigger runs.
+VOUCHER_GENERATE_MAX = config('VOUCHER_GENERATE_MAX', default=100000, cast=int)
+
+# Group names behind IsSuperAdmin/IsContentAdmin are cached per user; group
+# membership changes invalidate them right away. That needs a shared cache:
+# with local memory, admin memberships are not cached at all and other group
+# lists for LOCAL_CACHE_TIMEOUT seconds at most.
+ROLE_CACHE_TIMEOUT = config('ROLE_CACHE_TIMEOUT', default=3600, cast=int)
+
+# Points awards from progress, logins, streaks and refunds are queued in
+# RewardOutbox inside the request. 'queued' leaves them to `manage.py
+# drain_rewards_outbox --loop`, which must run alongside the web workers;
+# 'inline' (for deployments without that worker) applies each request's own
+# awards right after it commits. Several drains may run at once: each claims
+# its batch with row locks.
+REWARDS_AWARD_MODE = config('REWARDS_AWARD_MODE', default='queued')
+REWARDS_OUTBOX_INTERVAL = config('REWARDS_OUTBOX_INTERVAL', default=2, cast=int)
+
+# Leaderboards live in Redis sorted sets with the Redis cache backend;
+# otherwise every process keeps its own copy, reloaded from the points ledger
+# after LEADERBOARD_LOCAL_REFRESH seconds. The in-process copy is for
+# development and small deployments: each update is linear in its size.
+LEADERBOARD_LOCAL_REFRESH = config('LEADERBOARD_LOCAL_REFRESH', default=60, cast=int)
+
 # JWT Settings
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
     'ROTATE_REFRESH_TOKENS': True,
     'AUTH_HEADER_TYPES': ('Bearer',),
+    # Access tokens carry plan/role claims, see users/tokens.py
+    'TOKEN_OBTAIN_SERIALIZER': 'users.tokens.EntitledTokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'users.tokens.EntitledTokenRefreshSerializer',
 }
 
 # Email Settings
@@ -214,6 +285,31 @@ else:
 FLUTTERWAVE_PUBLIC_KEY = config('FLUTTERWAVE_PUBLIC_KEY', default='')
 FLUTTERWAVE_SECRET_KEY = config('FLUTTERWAVE_SECRET_KEY', default='')
 FLUTTERWAVE_WEBHOOK_HASH = config('FLUTTERWAVE_WEBHOOK_HASH', default='')
+FLUTTERWAVE_BASE_URL = config('FLUTTERWAVE_BASE_URL', default='https://api.flutterwave.com/v3')
+
+# Paystack settings
+PAYSTACK_SECRET_KEY = config('PAYSTACK_SECRET_KEY', default='')
+PAYSTACK_BASE_URL = config('PAYSTACK_BASE_URL', default='https://api.paystack.co')
+
+# Payment gateway HTTP client (subscription/gateways.py). Point the base URLs
+# at `manage.py fake_payment_gateway` to run without the real gateways.
+PAYMENT_GATEWAY_CONNECT_TIMEOUT = config('PAYMENT_GATEWAY_CONNECT_TIMEOUT', default=3.05, cast=float)
+PAYMENT_GATEWAY_READ_TIMEOUT = config('PAYMENT_GATEWAY_READ_TIMEOUT', default=10, cast=float)
+PAYMENT_GATEWAY_RETRIES = config('PAYMENT_GATEWAY_RETRIES', default=2, cast=int)
+PAYMENT_GATEWAY_BACKOFF = config('PAYMENT_GATEWAY_BACKOFF', default=0.5, cast=float)
+PAYMENT_GATEWAY_POOL_SIZE = config('PAYMENT_GATEWAY_POOL_SIZE', default=20, cast=int)
+PAYMENT_GATEWAY_BREAKER_THRESHOLD = config('PAYMENT_GATEWAY_BREAKER_THRESHOLD', default=5, cast=int)
+PAYMENT_GATEWAY_BREAKER_RESET = config('PAYMENT_GATEWAY_BREAKER_RESET', default=30, cast=int)
+
+# Gateway webhooks are stored in WebhookEvent and acknowledged at once.
+# 'inline' applies them right after the webhook request commits (no worker
+# needed); 'queued' is opt-in and leaves them to `manage.py
+# process_webhook_events --loop`, which must then be running or paid
+# subscriptions are never activated. Events that cannot be applied yet are
+# retried PAYMENT_WEBHOOK_MAX_ATTEMPTS times.
+PAYMENT_WEBHOOK_MODE = config('PAYMENT_WEBHOOK_MODE', default='inline')
+PAYMENT_WEBHOOK_INTERVAL = config('PAYMENT_WEBHOOK_INTERVAL', default=2, cast=int)
+PAYMENT_WEBHOOK_MAX_ATTEMPTS = config('PAYMENT_WEBHOOK_MAX_ATTEMPTS', default=10, cast=int)
 
 # Subscription Settings
 SUBSCRIPTION_PRICE = 5000  # Amount in smallest currency unit (e.g., kobo for NGN)
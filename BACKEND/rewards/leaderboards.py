@@ -0,0 +1,399 @@
+"""
+Weekly, monthly and all-time points leaderboards, overall and per class level.
+
+Each board is a sorted set of ``user_id -> points`` kept up to date as awards
+are applied. With the Redis cache backend the boards are Redis sorted sets
+shared by every process, and updates and rank lookups take logarithmic time.
+
+Otherwise each process keeps its boards in memory (LocalLeaderboardStore),
+loads them from the points ledger on first use and reloads them every
+LEADERBOARD_LOCAL_REFRESH seconds. This store is meant for development and
+small single-server deployments: an update shifts a Python list, so it costs
+time linear in the number of ranked users, and every process holds its own
+copy. `manage.py rebuild_leaderboards` reloads the boards of the process it
+runs in; other processes notice it through the default cache, except with the
+local-memory cache, whose entries never leave their process, where they
+catch up at their next periodic reload.
+
+Class level boards count points earned on that class level's lessons; login,
+streak and other awards without a lesson count on the overall boards only.
+Refunds of rejected redemptions are not earnings and count nowhere.
+"""
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.redis import RedisCache
+from django.db.models import Sum
+from django.utils import timezone
+
+from core.cache import bump_version
+from .models import PointsTransaction
+
+PERIODS = ('weekly', 'monthly', 'all')
+OVERALL = 'all'
+VERSION_KEY = 'rewards:leaderboards:version'
+SEED_LOCK_TIMEOUT = 60
+# How long a reader waits for a board another process is seeding before
+# answering from the ledger itself.
+SEED_WAIT = 2
+# Ledger rows newer than this are read one by one when a board is seeded, so
+# awards applied during the seed can be told apart. A transaction writing
+# awards is assumed to commit within this window.
+SEED_RECENT = timedelta(minutes=10)
+
+
+def counts_for_leaderboard(idempotency_key):
+    return not (idempotency_key or '').startswith('refund:')
+
+
+def period_start(period, today=None):
+    """First moment of the current ``period`` (None for all-time)."""
+    today = today or timezone.localdate()
+    if period == 'weekly':
+        start = today - timedelta(days=today.weekday())
+    elif period == 'monthly':
+        start = today.replace(day=1)
+    else:
+        return None
+    return timezone.make_aware(datetime.combine(start, datetime.min.time()))
+
+
+def period_end(period, today=None):
+    """First moment after the current ``period`` (None for all-time)."""
+    start = period_start(period, today)
+    if start is None:
+        return None
+    if period == 'weekly':
+        return start + timedelta(days=7)
+    return (start + timedelta(days=32)).replace(day=1)
+
+
+def board_key(period, scope=OVERALL, today=None):
+    """
+    Name of the current board for ``period`` and ``scope`` (OVERALL or a class
+    level ID); weekly and monthly boards roll over by name.
+    """
+    today = today or timezone.localdate()
+    if period == 'weekly':
+        year, week, _ = today.isocalendar()
+        stamp = f'{year}-W{week:02d}'
+    elif period == 'monthly':
+        stamp = today.strftime('%Y-%m')
+    else:
+        stamp = 'all'
+    return f'leaderboard:{period}:{stamp}:{scope}'
+
+
+def _board_ledger(period, scope=OVERALL, today=None):
+    """The ledger rows counted on one board."""
+    ledger = PointsTransaction.objects.filter(transaction_type='earned').exclude(
+        idempotency_key__startswith='refund:'
+    )
+    start = period_start(period, today)
+    if start is not None:
+        ledger = ledger.filter(created_at__gte=start, created_at__lt=period_end(period, today))
+    if scope != OVERALL:
+        ledger = ledger.filter(video__class_level_id=scope)
+    return ledger
+
+
+def _sum_by_user(ledger):
+    rows = ledger.values('user_points__user_id').annotate(total=Sum('points'))
+    return {row['user_points__user_id']: row['total'] for row in rows.order_by()}
+
+
+def load_board_scores(period, scope=OVERALL, today=None):
+    """``{user_id: points}`` for one board, aggregated from the ledger."""
+    return _sum_by_user(_board_ledger(period, scope, today))
+
+
+def load_board_seed(period, scope=OVERALL, today=None):
+    """
+    ``({user_id: points}, ledger_ids)`` for one board, where ``ledger_ids``
+    are the rows written in the last SEED_RECENT. Older rows are summed in
+    the database; the recent ones are read individually, so the scores and
+    the IDs describe the same rows even while awards are being written.
+    """
+    ledger = _board_ledger(period, scope, today)
+    cutoff = timezone.now() - SEED_RECENT
+    scores = _sum_by_user(ledger.filter(created_at__lt=cutoff))
+    ledger_ids = set()
+    for ledger_id, user_id, points in ledger.filter(created_at__gte=cutoff).values_list(
+        'id', 'user_points__user_id', 'points'
+    ).order_by():
+        ledger_ids.add(ledger_id)
+        scores[user_id] = scores.get(user_id, 0) + points
+    return scores, ledger_ids
+
+
+def _board_timeout(period, today=None):
+    """Keep finished weekly/monthly boards around for one more period."""
+    end = period_end(period, today)
+    if end is None:
+        return None
+    return int((end - timezone.now()).total_seconds()) + int((end - period_start(period, today)).total_seconds())
+
+
+class SortedBoard:
+    """
+    Scores plus a list of ``(-points, user_id)`` kept sorted with bisect.
+    Ranks are found by binary search, but an update inserts into and deletes
+    from the list, which is linear in the board's size.
+    """
+
+    def __init__(self, scores=None):
+        self.scores = dict(scores or {})
+        self.order = sorted((-points, user_id) for user_id, points in self.scores.items())
+
+    def incr(self, user_id, points):
+        old = self.scores.get(user_id)
+        if old is not None:
+            del self.order[bisect_left(self.order, (-old, user_id))]
+        new = (old or 0) + points
+        self.scores[user_id] = new
+        insort(self.order, (-new, user_id))
+
+    def rank(self, user_id):
+        points = self.scores.get(user_id)
+        if points is None:
+            return None
+        return bisect_left(self.order, (-points, user_id)), points
+
+    def top(self, count):
+        return [(user_id, -points) for points, user_id in self.order[:count]]
+
+
+class LocalLeaderboardStore:
+    """
+    Boards held in this process, loaded from the ledger and reloaded every
+    LEADERBOARD_LOCAL_REFRESH seconds, or sooner once the version token in
+    the default cache changes (which other processes only see if that cache
+    is shared). For development and small deployments; see the module
+    docstring.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._boards = {}  # key -> (loaded_at, version, SortedBoard)
+
+    def _board(self, period, scope):
+        key = board_key(period, scope)
+        version = cache.get(VERSION_KEY)
+        with self._lock:
+            loaded = self._boards.get(key)
+        if loaded is not None:
+            loaded_at, loaded_version, board = loaded
+            if loaded_version == version and time.monotonic() - loaded_at < settings.LEADERBOARD_LOCAL_REFRESH:
+                return board
+        board = SortedBoard(load_board_scores(period, scope))
+        with self._lock:
+            # Drop boards of finished periods.
+            prefix, current = f'leaderboard:{period}:', key.rsplit(':', 1)[0] + ':'
+            for stale in [k for k in self._boards if k.startswith(prefix) and not k.startswith(current)]:
+                del self._boards[stale]
+            self._boards[key] = (time.monotonic(), version, board)
+        return board
+
+    def incr_many(self, period, scope, awards):
+        key = board_key(period, scope)
+        with self._lock:
+            loaded = self._boards.get(key)
+            if loaded is None:
+                # Loaded from the ledger, awards included, on first read.
+                return
+            board = loaded[2]
+            for _, user_id, points in awards:
+                board.incr(user_id, points)
+
+    def top(self, period, scope, count):
+        board = self._board(period, scope)
+        with self._lock:
+            return board.top(count)
+
+    def rank(self, period, scope, user_id):
+        board = self._board(period, scope)
+        with self._lock:
+            return board.rank(user_id)
+
+    def rebuild(self, period, scope):
+        board = SortedBoard(load_board_scores(period, scope))
+        with self._lock:
+            self._boards[board_key(period, scope)] = (time.monotonic(), cache.get(VERSION_KEY), board)
+
+
+# Applies awards to a board that is ready, buffers them while the board is
+# being seeded (ARGV holds ledger_id, user_id, points triples) and ignores
+# them before seeding starts: the seed reads them from the ledger then.
+INCR_SCRIPT = """
+local state = redis.call('GET', KEYS[2])
+if state == 'ready' then
+    for i = 1, #ARGV, 3 do
+        redis.call('ZINCRBY', KEYS[1], ARGV[i + 2], ARGV[i + 1])
+    end
+elseif state == 'seeding' then
+    for i = 1, #ARGV, 3 do
+        redis.call('RPUSH', KEYS[3], ARGV[i] .. ':' .. ARGV[i + 1] .. ':' .. ARGV[i + 2])
+    end
+    redis.call('EXPIRE', KEYS[3], redis.call('TTL', KEYS[2]))
+end
+return state
+"""
+
+
+class RedisLeaderboardStore:
+    """
+    Boards as Redis sorted sets in the cache's Redis server.
+
+    Each board has a state key: absent until the board is first used,
+    'seeding' while one process loads it from the ledger and 'ready' after.
+    Awards applied during the seed are buffered under the board's pending
+    key with their ledger IDs and replayed once it is loaded, unless the
+    seed has already read them from the ledger.
+    """
+
+    def __init__(self, redis_cache):
+        self.cache = redis_cache
+
+    def _client(self):
+        return self.cache._cache.get_client(write=True)
+
+    def _keys(self, period, scope):
+        key = self.cache.make_key(board_key(period, scope))
+        return key, key + ':state', key + ':pending'
+
+    def _seed(self, period, scope, force=False):
+        """
+        Load a board from the ledger, unless another process is already
+        seeding it (or it is ready and ``force`` is false). Returns whether
+        this process seeded it.
+        """
+        key, state_key, pending_key = self._keys(period, scope)
+        client = self._client()
+        if not client.set(state_key, 'seeding', ex=SEED_LOCK_TIMEOUT, nx=not force):
+            return False
+        scores, ledger_ids = load_board_seed(period, scope)
+        timeout = _board_timeout(period)
+        pipe = client.pipeline(transaction=True)
+        pipe.delete(key)
+        if scores:
+            pipe.zadd(key, scores)
+        pipe.set(state_key, 'ready', ex=timeout)
+        if timeout:
+            pipe.expire(key, timeout)
+        pipe.lrange(pending_key, 0, -1)
+        pipe.delete(pending_key)
+        pending = pipe.execute()[-2]
+        # The board is ready now, so new awards go to it directly; replay the
+        # buffered ones the ledger read missed.
+        pipe = client.pipeline(transaction=False)
+        for entry in pending:
+            ledger_id, user_id, points = (int(value) for value in entry.split(b':'))
+            if ledger_id not in ledger_ids:
+                pipe.zincrby(key, points, user_id)
+        pipe.execute()
+        return True
+
+    def _ensure(self, period, scope):
+        """
+        The board's key once it is ready, seeding it from the ledger the first
+        time it is used. Returns None if another process is still seeding it
+        after SEED_WAIT seconds.
+        """
+        key, state_key, _ = self._keys(period, scope)
+        client = self._client()
+        state = client.get(state_key)
+        if state == b'ready' or (state is None and self._seed(period, scope)):
+            return key
+        deadline = time.monotonic() + SEED_WAIT
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            if client.get(state_key) == b'ready':
+                return key
+        return None
+
+    def incr_many(self, period, scope, awards):
+        key, state_key, pending_key = self._keys(period, scope)
+        args = [value for award in awards for value in award]
+        script = self._client().register_script(INCR_SCRIPT)
+        script(keys=[key, state_key, pending_key], args=args)
+
+    def top(self, period, scope, count):
+        key = self._ensure(period, scope)
+        if key is None:
+            return SortedBoard(load_board_scores(period, scope)).top(count)
+        rows = self._client().zrevrange(key, 0, count - 1, withscores=True)
+        return [(int(member), int(score)) for member, score in rows]
+
+    def rank(self, period, scope, user_id):
+        key = self._ensure(period, scope)
+        if key is None:
+            return SortedBoard(load_board_scores(period, scope)).rank(user_id)
+        pipe = self._client().pipeline()
+        pipe.zrevrank(key, user_id)
+        pipe.zscore(key, user_id)
+        rank, score = pipe.execute()
+        return None if rank is None else (rank, int(score))
+
+    def rebuild(self, period, scope):
+        self._seed(period, scope, force=True)
+
+
+_local_store = LocalLeaderboardStore()
+
+
+def get_store():
+    # ``cache`` is a proxy, so test the backend object behind it.
+    backend = caches[DEFAULT_CACHE_ALIAS]
+    if isinstance(backend, RedisCache):
+        return RedisLeaderboardStore(backend)
+    return _local_store
+
+
+def record_awards(awards):
+    """
+    Add ``(ledger_id, user_id, points, class_level_id)`` awards to the current
+    boards. Call after the ledger rows are committed.
+    """
+    by_scope = defaultdict(list)
+    for ledger_id, user_id, points, class_level_id in awards:
+        by_scope[OVERALL].append((ledger_id, user_id, points))
+        if class_level_id is not None:
+            by_scope[class_level_id].append((ledger_id, user_id, points))
+    store = get_store()
+    for period in PERIODS:
+        for scope, scope_awards in by_scope.items():
+            store.incr_many(period, scope, scope_awards)
+
+
+def top(period, scope=OVERALL, count=10):
+    """``[(user_id, points)]`` of the ``count`` best users, best first."""
+    return get_store().top(period, scope, count)
+
+
+def rank(user_id, period, scope=OVERALL):
+    """``(rank, points)`` of ``user_id`` (rank 1 is best), or None if unranked."""
+    found = get_store().rank(period, scope, user_id)
+    return None if found is None else (found[0] + 1, found[1])
+
+
+def rebuild_leaderboards(class_level_ids=()):
+    """
+    Reload the current overall boards, and those of ``class_level_ids``, from
+    the ledger. Redis boards are shared, so this covers every process; local
+    boards of other processes reload once they see the new version token, or
+    at their next periodic reload with a local-memory cache. Returns the
+    number of boards written.
+    """
+    bump_version(VERSION_KEY)
+    store = get_store()
+    written = 0
+    for period in PERIODS:
+        for scope in [OVERALL, *class_level_ids]:
+            store.rebuild(period, scope)
+            written += 1
+    return written
@@ -0,0 +1,26 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from rewards.outbox import drain_rewards_outbox
+
+
+class Command(BaseCommand):
+    help = 'Apply queued points awards to the ledger and balances in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep draining every --interval seconds')
+        parser.add_argument('--interval', type=int, default=settings.REWARDS_OUTBOX_INTERVAL)
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.perf_counter()
+            applied = drain_rewards_outbox()
+            if applied or not options['loop']:
+                self.stdout.write(f'Applied {applied} awards in {time.perf_counter() - started:.2f}s.')
+            if not options['loop']:
+                break
+            close_old_connections()
+            time.sleep(options['interval'])
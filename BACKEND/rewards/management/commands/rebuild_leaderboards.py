@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from content.models import ClassLevel
+from rewards.leaderboards import rebuild_leaderboards
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the current weekly, monthly and all-time leaderboards from the points ledger'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--class-level', type=int, action='append', dest='class_levels',
+                            help='Only rebuild this class level (repeatable); default: all class levels')
+
+    def handle(self, *args, **options):
+        class_levels = options['class_levels']
+        if class_levels is None:
+            class_levels = list(ClassLevel.objects.values_list('pk', flat=True))
+        started = time.perf_counter()
+        written = rebuild_leaderboards(class_levels)
+        self.stdout.write(f'Rebuilt {written} leaderboards in {time.perf_counter() - started:.2f}s.')
@@ -0,0 +1,130 @@
+import random
+import threading
+import time
+from uuid import uuid4
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, close_old_connections, connection
+from django.db.models import Sum
+
+from rewards.models import PointsTransaction, UserPoints
+from users.models import User
+
+
+def legacy_add(user_points, points, key):
+    """The old path: read the balance into Python, add, save, then log."""
+    user_points.total_points += points
+    user_points.available_points += points
+    user_points.save(update_fields=['total_points', 'available_points', 'updated_at'])
+    PointsTransaction.objects.create(user_points=user_points, points=points, transaction_type='earned',
+                                     reason='Stress award')
+
+
+def legacy_redeem(user_points, points):
+    if points > user_points.available_points:
+        return
+    user_points.redeemed_points += points
+    user_points.available_points -= points
+    user_points.save(update_fields=['redeemed_points', 'available_points', 'updated_at'])
+    PointsTransaction.objects.create(user_points=user_points, points=points, transaction_type='redeemed',
+                                     reason='Stress redemption')
+
+
+def atomic_add(user_points, points, key):
+    user_points.add_points(points, 'Stress award', idempotency_key=key)
+
+
+def atomic_redeem(user_points, points):
+    user_points.redeem_points(points, 'Stress redemption')
+
+
+class Command(BaseCommand):
+    help = (
+        'Award and redeem points for one user from several threads at once, with the legacy '
+        'read-modify-save path and with the atomic F() updates, then check that the balance '
+        'equals the ledger. Some awards reuse idempotency keys across threads. Seeded rows '
+        'are deleted afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--operations', type=int, default=200, help='Operations per thread')
+        parser.add_argument('--seed', type=int, default=None)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        for label, add, redeem in (('read-modify-save', legacy_add, legacy_redeem),
+                                   ('F() updates', atomic_add, atomic_redeem)):
+            tag = uuid4().hex[:8]
+            # Creating the user creates its UserPoints row through the users signal
+            user = User.objects.create(email=f'stress-{tag}@example.com', password=make_password(None))
+            try:
+                self.run(label, add, redeem, user, tag, rng, options)
+            finally:
+                user.delete()
+
+    def run(self, label, add, redeem, user, tag, rng, options):
+        threads = max(options['threads'], 1)
+        per_thread = max(options['operations'], 1)
+        # Two in three operations award 1-10 points, some under keys shared by
+        # every thread; the rest redeem 1-15 points.
+        plans = [
+            [
+                ('add', rng.randint(1, 10), f'stress:{tag}:{rng.randrange(per_thread)}' if rng.random() < 0.3 else None)
+                if rng.random() < 2 / 3 else ('redeem', rng.randint(1, 15), None)
+                for _ in range(per_thread)
+            ]
+            for _ in range(threads)
+        ]
+        errors = [0] * threads
+        barrier = threading.Barrier(threads)
+
+        def worker(index):
+            close_old_connections()
+            try:
+                barrier.wait()
+                for action, points, key in plans[index]:
+                    try:
+                        # Every operation loads the balance afresh, as a request would.
+                        user_points = UserPoints.objects.get(user=user)
+                        if action == 'add':
+                            add(user_points, points, key)
+                        else:
+                            redeem(user_points, points)
+                    except DatabaseError:
+                        errors[index] += 1
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+        started = time.perf_counter()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        balance = UserPoints.objects.get(user=user)
+        ledger = dict(
+            PointsTransaction.objects.filter(user_points=balance)
+            .values_list('transaction_type').annotate(total=Sum('points'))
+            .values_list('transaction_type', 'total')
+        )
+        earned, spent = ledger.get('earned', 0), ledger.get('redeemed', 0)
+        consistent = (
+            balance.total_points == earned
+            and balance.redeemed_points == spent
+            and balance.available_points == earned - spent
+        )
+        operations = threads * per_thread
+        self.stdout.write(self.style.MIGRATE_HEADING(label))
+        self.stdout.write(
+            f'  {operations} operations from {threads} threads in {elapsed:.2f}s '
+            f'({operations / elapsed:.0f}/s), {sum(errors)} failed'
+        )
+        result = (
+            f'  balance total/redeemed/available {balance.total_points}/{balance.redeemed_points}/'
+            f'{balance.available_points}, ledger earned/redeemed {earned}/{spent}'
+        )
+        self.stdout.write(result if consistent else self.style.ERROR(result + ' - balance does not match ledger'))
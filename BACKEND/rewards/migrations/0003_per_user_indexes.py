@@ -0,0 +1,22 @@
+# Generated by Django 5.2.1 on 2026-10-18 12:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('content', '0008_per_user_indexes'),
+        ('rewards', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pointstransaction',
+            index=models.Index(fields=['user_points', '-created_at'], name='pointstx_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pointstransaction',
+            index=models.Index(fields=['user_points', 'video', 'transaction_type'], name='pointstx_user_video_type_idx'),
+        ),
+    ]
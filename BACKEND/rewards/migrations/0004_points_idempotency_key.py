@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 12:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rewards', '0003_per_user_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pointstransaction',
+            name='idempotency_key',
+            field=models.CharField(blank=True, help_text='Identifies the award, e.g. complete:<user>:<video>; each key is awarded once', max_length=100, null=True, unique=True),
+        ),
+    ]
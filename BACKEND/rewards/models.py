@@ -1,4 +1,7 @@
-from django.db import models
+from functools import partial
+
+from django.db import IntegrityError, connections, models, transaction
+from django.db.models import F
 from django.utils import timezone
 from users.models import User
 from content.models import VideoLesson
@@ -73,46 +76,82 @@ class UserPoints(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    BALANCE_FIELDS = ['total_points', 'redeemed_points', 'available_points', 'updated_at']
+
     class Meta:
         verbose_name_plural = 'User points'
     
     def __str__(self):
         return f"{self.user.email} - {self.available_points} points"
     
-    def add_points(self, points, reason=None):
-        """Add points to user balance."""
-        self.total_points += points
-        self.available_points += points
-        self.save(update_fields=['total_points', 'available_points', 'updated_at'])
-        
-        # Create transaction record
-        PointsTransaction.objects.create(
-            user_points=self,
-            points=points,
-            transaction_type='earned',
-            reason=reason or 'Points earned'
-        )
+    def add_points(self, points, reason=None, video=None, idempotency_key=None):
+        """
+        Add points to user balance.
+
+        The ledger row and an F() update of the balance are written in one
+        transaction, so concurrent awards never overwrite each other. With an
+        ``idempotency_key`` the ledger row is inserted first and a key that is
+        already in the ledger makes this a no-op, so an award can be retried
+        or raced safely. Returns the new available balance, or None if the
+        award had already been made.
+        """
+        with transaction.atomic():
+            try:
+                # Create transaction record
+                with transaction.atomic():
+                    ledger_row = PointsTransaction.objects.create(
+                        user_points=self,
+                        points=points,
+                        transaction_type='earned',
+                        reason=reason or 'Points earned',
+                        video=video,
+                        idempotency_key=idempotency_key,
+                    )
+            except IntegrityError:
+                if idempotency_key is None:
+                    raise
+                return None
+
+            UserPoints.objects.filter(pk=self.pk).update(
+                total_points=F('total_points') + points,
+                available_points=F('available_points') + points,
+                updated_at=timezone.now(),
+            )
+            self.refresh_from_db(fields=self.BALANCE_FIELDS)
+
+            # Imported here: the leaderboards module imports this one.
+            from .leaderboards import counts_for_leaderboard, record_awards
+            if counts_for_leaderboard(idempotency_key):
+                award = (ledger_row.pk, self.user_id, points, video.class_level_id if video else None)
+                transaction.on_commit(partial(record_awards, [award]))
         
         return self.available_points
     
     def redeem_points(self, points, reason=None):
-        """Redeem points from user balance."""
-        if points > self.available_points:
+        """
+        Redeem points from user balance with a conditional UPDATE ... WHERE
+        available_points >= points, so concurrent redemptions cannot
+        overspend. Returns False if the balance is too low.
+        """
+        if points <= 0:
             return False
+        with transaction.atomic():
+            redeemed = UserPoints.objects.filter(pk=self.pk, available_points__gte=points).update(
+                redeemed_points=F('redeemed_points') + points,
+                available_points=F('available_points') - points,
+                updated_at=timezone.now(),
+            )
+            if redeemed:
+                # Create transaction record
+                PointsTransaction.objects.create(
+                    user_points=self,
+                    points=points,
+                    transaction_type='redeemed',
+                    reason=reason or 'Points redeemed'
+                )
+            self.refresh_from_db(fields=self.BALANCE_FIELDS)
         
-        self.redeemed_points += points
-        self.available_points -= points
-        self.save(update_fields=['redeemed_points', 'available_points', 'updated_at'])
-        
-        # Create transaction record
-        PointsTransaction.objects.create(
-            user_points=self,
-            points=points,
-            transaction_type='redeemed',
-            reason=reason or 'Points redeemed'
-        )
-        
-        return True
+        return bool(redeemed)
 
 
 class PointsTransaction(models.Model):
@@ -128,15 +167,74 @@ class PointsTransaction(models.Model):
     transaction_type = models.CharField(max_length=10, choices=TRANSACTION_TYPES)
     reason = models.CharField(max_length=255)
     video = models.ForeignKey(VideoLesson, on_delete=models.SET_NULL, null=True, blank=True, related_name='point_transactions')
+    idempotency_key = models.CharField(
+        max_length=100, unique=True, null=True, blank=True,
+        help_text="Identifies the award, e.g. complete:<user>:<video>; each key is awarded once"
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # A user's ledger, newest first
+            models.Index(fields=['user_points', '-created_at'], name='pointstx_user_created_idx'),
+            # "Already awarded for this video?" checks
+            models.Index(fields=['user_points', 'video', 'transaction_type'], name='pointstx_user_video_type_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user_points.user.email} - {self.points} points ({self.transaction_type})"
 
 
+class RewardOutboxQuerySet(models.QuerySet):
+    def claim(self, count):
+        """
+        Lock and return the ``count`` oldest queued awards in this queryset
+        for the rest of the transaction, skipping rows another drain has
+        locked. SQLite has no row locks: a no-op UPDATE of the batch takes the
+        database write lock up front instead, so concurrent drains queue for it
+        and each one then sees only the rows the others left.
+        """
+        connection = connections[self.db]
+        rows = self.order_by('pk')
+        if connection.features.has_select_for_update:
+            skip_locked = connection.features.has_select_for_update_skip_locked
+            return list(rows.select_for_update(skip_locked=skip_locked)[:count])
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        batch_sql, params = rows.values('pk')[:count].query.sql_with_params()
+        sql = f"""
+            UPDATE {table} SET id = id
+            WHERE id IN ({batch_sql})
+            RETURNING id
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            ids = [pk for pk, in cursor.fetchall()]
+        return list(rows.filter(pk__in=ids)) if ids else []
+
+
+class RewardOutbox(models.Model):
+    """
+    A points award queued by a request, written in the request's transaction
+    and applied to the ledger and balances by the drain_rewards_outbox worker.
+    """
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='pending_awards')
+    points = models.PositiveIntegerField()
+    reason = models.CharField(max_length=255, help_text="Ledger reason; the video title is appended when a video is set")
+    video = models.ForeignKey(VideoLesson, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    idempotency_key = models.CharField(max_length=100)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = RewardOutboxQuerySet.as_manager()
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self):
+        return f"{self.user_id} +{self.points} ({self.idempotency_key})"
+
+
 class Reward(models.Model):
     """Rewards that can be redeemed with points."""
     
@@ -0,0 +1,159 @@
+import logging
+from collections import defaultdict
+from functools import partial
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from content.models import VideoLesson
+
+from .leaderboards import counts_for_leaderboard, record_awards
+from .models import PointsTransaction, RewardOutbox, UserPoints
+
+logger = logging.getLogger(__name__)
+
+DRAIN_BATCH_SIZE = 1000
+
+
+def enqueue_award(user_id, points, reason, idempotency_key, video_id=None):
+    """
+    Queue a points award with one INSERT in the caller's transaction. The
+    award is applied by drain_rewards_outbox, at most once per key; in
+    'inline' mode it is applied on its own as soon as the caller commits.
+    """
+    if not points:
+        return
+    entry = RewardOutbox.objects.create(
+        user_id=user_id,
+        points=points,
+        reason=reason,
+        video_id=video_id,
+        idempotency_key=idempotency_key,
+    )
+    if settings.REWARDS_AWARD_MODE == 'inline':
+        transaction.on_commit(partial(_drain_after_commit, entry.pk))
+
+
+def _drain_after_commit(entry_id):
+    # The request has already committed: a failure here must not turn its
+    # response into an error. The award stays queued for the worker. Only
+    # this award is applied, never other requests' backlog.
+    try:
+        drain_rewards_outbox(entry_ids=[entry_id])
+    except Exception:
+        logger.exception('Applying queued points awards failed')
+
+
+def _insert_ledger_rows(rows):
+    """
+    Insert ``rows`` and return those written. A key that reached the ledger
+    since it was checked (a direct add_points with the same key) fails the
+    bulk insert; the rows are then inserted one by one and such keys skipped.
+    """
+    try:
+        with transaction.atomic():
+            PointsTransaction.objects.bulk_create(rows, batch_size=500)
+        return rows
+    except IntegrityError:
+        pass
+    inserted = []
+    for row in rows:
+        # Primary keys the rolled back bulk insert may have assigned.
+        row.pk = None
+        try:
+            with transaction.atomic():
+                row.save(force_insert=True)
+        except IntegrityError:
+            continue
+        inserted.append(row)
+    return inserted
+
+
+def apply_awards(entries):
+    """
+    Apply a batch of queued awards: skip keys already in the ledger (or
+    repeated in the batch), write the new ledger rows with bulk_create and
+    move each user's balance with one F() update; the leaderboards follow
+    once the batch commits. Users without a balance row get one. Returns the
+    ledger rows written.
+    """
+    keys = {entry.idempotency_key for entry in entries}
+    awarded = set(
+        PointsTransaction.objects.filter(idempotency_key__in=keys).values_list('idempotency_key', flat=True)
+    )
+    user_ids = {entry.user_id for entry in entries}
+    user_points = dict(UserPoints.objects.filter(user_id__in=user_ids).values_list('user_id', 'id'))
+    if missing := user_ids - user_points.keys():
+        UserPoints.objects.bulk_create([UserPoints(user_id=user_id) for user_id in missing], ignore_conflicts=True)
+        user_points.update(UserPoints.objects.filter(user_id__in=missing).values_list('user_id', 'id'))
+    videos = {
+        video_id: (title, class_level_id)
+        for video_id, title, class_level_id in VideoLesson.objects.filter(
+            id__in={entry.video_id for entry in entries if entry.video_id}
+        ).values_list('id', 'title', 'class_level_id')
+    }
+
+    rows = []
+    awards = {}
+    for entry in entries:
+        if entry.idempotency_key in awarded:
+            continue
+        awarded.add(entry.idempotency_key)
+        reason = entry.reason
+        title, class_level_id = videos.get(entry.video_id, (None, None))
+        if title is not None:
+            reason = f'{reason}: {title}'
+        rows.append(PointsTransaction(
+            user_points_id=user_points[entry.user_id],
+            points=entry.points,
+            transaction_type='earned',
+            reason=reason[:255],
+            video_id=entry.video_id,
+            idempotency_key=entry.idempotency_key,
+        ))
+        awards[entry.idempotency_key] = (entry.user_id, class_level_id)
+
+    rows = _insert_ledger_rows(rows)
+    totals = defaultdict(int)
+    ranked = []
+    for row in rows:
+        totals[row.user_points_id] += row.points
+        if counts_for_leaderboard(row.idempotency_key):
+            user_id, class_level_id = awards[row.idempotency_key]
+            ranked.append((row.pk, user_id, row.points, class_level_id))
+
+    now = timezone.now()
+    for points_id, points in totals.items():
+        UserPoints.objects.filter(pk=points_id).update(
+            total_points=F('total_points') + points,
+            available_points=F('available_points') + points,
+            updated_at=now,
+        )
+    transaction.on_commit(partial(record_awards, ranked))
+    return rows
+
+
+def drain_rewards_outbox(batch_size=DRAIN_BATCH_SIZE, entry_ids=None):
+    """
+    Apply and delete every queued award, oldest first, one batch per
+    transaction. Each batch is claimed with row locks, so several workers
+    (and inline drains) can run at once without applying an award twice.
+    With ``entry_ids`` only those queued awards are applied. Returns the
+    number of awards applied.
+    """
+    queued = RewardOutbox.objects.all()
+    if entry_ids is not None:
+        queued = queued.filter(pk__in=entry_ids)
+    applied = 0
+    while True:
+        with transaction.atomic():
+            entries = queued.claim(batch_size)
+            if not entries:
+                break
+            applied += len(apply_awards(entries))
+            RewardOutbox.objects.filter(pk__in=[entry.pk for entry in entries]).delete()
+        if len(entries) < batch_size:
+            break
+    return applied
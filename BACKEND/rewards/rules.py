@@ -0,0 +1,51 @@
+import time
+from types import MappingProxyType
+
+from django.conf import settings
+
+from core.cache import bump_version, get_version, is_shared
+from .models import PointsRule
+
+RULES_VERSION_KEY = 'rewards:points-rules:version'
+
+# (version, loaded_at, {action_type: points}) of the active rules held by this
+# process. Replaced as a whole so concurrent readers always see a consistent tuple.
+_rules = (None, 0.0, MappingProxyType({}))
+
+
+def load_points_rules():
+    """Active rules as a read-only ``{action_type: points}`` mapping."""
+    points = {}
+    # The oldest active rule wins if an action has several.
+    rules = PointsRule.objects.filter(is_active=True).order_by('-pk').values_list('action_type', 'points')
+    for action_type, value in rules:
+        points[action_type] = value
+    return MappingProxyType(points)
+
+
+def get_points_rules():
+    """
+    Return the active points rules.
+
+    The rules live in process memory; a version token in the shared cache tells
+    each worker when a rule changed and its copy must be reloaded. A
+    per-process cache cannot carry the token between workers, so the rules
+    are then also reloaded every LOCAL_CACHE_TIMEOUT seconds.
+    """
+    global _rules
+    version = get_version(RULES_VERSION_KEY)
+    rules_version, loaded_at, rules = _rules
+    expired = not is_shared() and time.monotonic() - loaded_at >= settings.LOCAL_CACHE_TIMEOUT
+    if rules_version != version or expired:
+        rules = load_points_rules()
+        _rules = (version, time.monotonic(), rules)
+    return rules
+
+
+def rule_points(action_type):
+    """Points for ``action_type``, or None if it has no active rule."""
+    return get_points_rules().get(action_type)
+
+
+def invalidate_points_rules():
+    bump_version(RULES_VERSION_KEY)
@@ -1,6 +1,9 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from .models import UserStreak, PointsRule, UserPoints, RewardRedemption
+from .models import UserStreak, PointsRule, RewardRedemption
+from .outbox import enqueue_award
+from .rules import invalidate_points_rules, rule_points
 
 
 @receiver(post_save, sender=UserStreak)
@@ -10,20 +13,22 @@ def award_streak_milestone_points(sender, instance, **kwargs):
     streak_milestones = [7, 14, 30, 60, 90, 180, 365]
     
     if instance.current_streak_days in streak_milestones:
-        try:
-            streak_rule = PointsRule.objects.get(action_type='streak_milestone', is_active=True)
-            user_points = UserPoints.objects.get(user=instance.user)
-            
-            # Bonus multiplier based on milestone level
-            multiplier = streak_milestones.index(instance.current_streak_days) + 1
-            bonus_points = streak_rule.points * multiplier
-            
-            user_points.add_points(
-                bonus_points,
-                f'{instance.current_streak_days}-day streak milestone bonus'
-            )
-        except (PointsRule.DoesNotExist, UserPoints.DoesNotExist):
-            pass
+        streak_points = rule_points('streak_milestone')
+        if streak_points is None:
+            return
+        
+        # Bonus multiplier based on milestone level
+        multiplier = streak_milestones.index(instance.current_streak_days) + 1
+        bonus_points = streak_points * multiplier
+        
+        # update_streak() saves on every login, so key the bonus to the
+        # day the milestone was reached
+        enqueue_award(
+            instance.user_id,
+            bonus_points,
+            f'{instance.current_streak_days}-day streak milestone bonus',
+            f'streak:{instance.user_id}:{instance.current_streak_days}:{instance.last_activity_date}'
+        )
 
 
 @receiver(post_save, sender=RewardRedemption)
@@ -31,11 +36,15 @@ def process_reward_redemption(sender, instance, created, **kwargs):
     """Process reward redemption status changes."""
     if not created and instance.status == 'rejected':
         # Refund points if redemption is rejected
-        try:
-            user_points = UserPoints.objects.get(user=instance.user)
-            user_points.add_points(
-                instance.points_spent,
-                f'Refund for rejected redemption: {instance.reward.name}'
-            )
-        except UserPoints.DoesNotExist:
-            pass
\ No newline at end of file
+        enqueue_award(
+            instance.user_id,
+            instance.points_spent,
+            f'Refund for rejected redemption: {instance.reward.name}',
+            f'refund:{instance.pk}'
+        )
+
+
+@receiver([post_save, post_delete], sender=PointsRule)
+def reload_points_rules_on_change(sender, **kwargs):
+    """Tell every worker to reload its points rules after the commit."""
+    transaction.on_commit(invalidate_points_rules)
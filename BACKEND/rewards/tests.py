@@ -1,3 +1,136 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.test import TestCase, override_settings
+
+from users.models import User
+from . import leaderboards, outbox
+from .models import PointsTransaction, RewardOutbox, UserPoints
+from .outbox import drain_rewards_outbox, enqueue_award
+
+
+class PointsBalanceTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(email='learner@example.com')
+        self.points = UserPoints.objects.get(user=self.user)
+
+    def balance(self):
+        points = UserPoints.objects.get(pk=self.points.pk)
+        return points.total_points, points.redeemed_points, points.available_points
+
+    def test_award_with_key_is_made_once(self):
+        self.assertEqual(self.points.add_points(10, 'Login', idempotency_key='login:1'), 10)
+        self.assertIsNone(self.points.add_points(10, 'Login', idempotency_key='login:1'))
+        self.assertEqual(self.balance(), (10, 0, 10))
+        self.assertEqual(PointsTransaction.objects.filter(idempotency_key='login:1').count(), 1)
+
+    def test_awards_without_key_add_up(self):
+        self.points.add_points(10)
+        self.points.add_points(5)
+        self.assertEqual(self.balance(), (15, 0, 15))
+        self.assertEqual(self.points.transactions.count(), 2)
+
+    def test_stale_instances_add_to_the_stored_balance(self):
+        stale = UserPoints.objects.get(pk=self.points.pk)
+        self.points.add_points(10, idempotency_key='a')
+        self.assertEqual(stale.add_points(5, idempotency_key='b'), 15)
+        self.assertEqual(self.balance(), (15, 0, 15))
+
+    def test_redeem_within_balance(self):
+        self.points.add_points(30)
+        self.assertTrue(self.points.redeem_points(20, 'Reward'))
+        self.assertEqual(self.balance(), (30, 20, 10))
+        self.assertEqual(self.points.available_points, 10)
+        self.assertEqual(self.points.transactions.filter(transaction_type='redeemed').count(), 1)
+
+    def test_redeem_refuses_to_overspend(self):
+        self.points.add_points(30)
+        # Two requests holding the same stale balance: only one can spend it.
+        other = UserPoints.objects.get(pk=self.points.pk)
+        self.assertTrue(self.points.redeem_points(20))
+        self.assertFalse(other.redeem_points(20))
+        self.assertEqual(other.available_points, 10)
+        self.assertFalse(self.points.redeem_points(0))
+        self.assertEqual(self.balance(), (30, 20, 10))
+        self.assertEqual(self.points.transactions.filter(transaction_type='redeemed').count(), 1)
+
+
+class RewardOutboxTests(TestCase):
+    def setUp(self):
+        self.users = [User.objects.create(email=f'learner{i}@example.com') for i in range(2)]
+
+    def balances(self):
+        return sorted(UserPoints.objects.values_list('user_id', 'total_points', 'available_points'))
+
+    def test_drain_applies_each_key_once(self):
+        first, second = self.users
+        UserPoints.objects.get(user=first).add_points(7, idempotency_key='login:1:a')
+        for user, points, key in [
+            (first, 5, 'login:1:a'),   # already in the ledger
+            (first, 10, 'watch:1:b'),
+            (first, 10, 'watch:1:b'),  # repeated in the batch
+            (second, 3, 'login:2:a'),
+            (second, 4, 'streak:2:a'),
+        ]:
+            enqueue_award(user.pk, points, 'Award', key)
+        self.assertEqual(drain_rewards_outbox(batch_size=2), 3)
+        self.assertFalse(RewardOutbox.objects.exists())
+        self.assertEqual(self.balances(), [(first.pk, 17, 17), (second.pk, 7, 7)])
+        self.assertEqual(PointsTransaction.objects.count(), 4)
+        self.assertEqual(drain_rewards_outbox(), 0)
+
+    def test_drain_creates_missing_balances(self):
+        UserPoints.objects.filter(user=self.users[0]).delete()
+        enqueue_award(self.users[0].pk, 5, 'Award', 'login:1:a')
+        self.assertEqual(drain_rewards_outbox(), 1)
+        self.assertEqual(self.balances()[0], (self.users[0].pk, 5, 5))
+
+    def test_keys_written_after_the_check_are_skipped(self):
+        points = UserPoints.objects.get(user=self.users[0])
+        rows = [
+            PointsTransaction(user_points=points, points=5, transaction_type='earned', reason='Award', idempotency_key=key)
+            for key in ('a', 'b', 'c')
+        ]
+        points.add_points(5, idempotency_key='b')
+        inserted = outbox._insert_ledger_rows(rows)
+        self.assertEqual([row.idempotency_key for row in inserted], ['a', 'c'])
+        self.assertEqual(sorted(PointsTransaction.objects.values_list('idempotency_key', flat=True)), ['a', 'b', 'c'])
+
+    def test_inline_drain_applies_only_its_own_awards(self):
+        enqueue_award(self.users[1].pk, 3, 'Award', 'login:2:a')
+        with override_settings(REWARDS_AWARD_MODE='inline'):
+            with self.captureOnCommitCallbacks(execute=True):
+                enqueue_award(self.users[0].pk, 5, 'Award', 'login:1:a')
+        self.assertEqual(list(RewardOutbox.objects.values_list('idempotency_key', flat=True)), ['login:2:a'])
+        self.assertEqual(self.balances(), [(self.users[0].pk, 5, 5), (self.users[1].pk, 0, 0)])
+
+    @override_settings(REWARDS_AWARD_MODE='inline')
+    def test_failed_inline_drain_keeps_awards_queued(self):
+        with mock.patch.object(outbox, 'apply_awards', side_effect=RuntimeError('down')):
+            with self.assertLogs('rewards.outbox', 'ERROR'):
+                with self.captureOnCommitCallbacks(execute=True):
+                    enqueue_award(self.users[0].pk, 5, 'Award', 'login:1:a')
+        self.assertEqual(RewardOutbox.objects.count(), 1)
+        self.assertEqual(drain_rewards_outbox(), 1)
+
+
+class LeaderboardTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(leaderboards, '_local_store', leaderboards.LocalLeaderboardStore())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.users = [User.objects.create(email=f'learner{i}@example.com') for i in range(3)]
+        self.points = [UserPoints.objects.get(user=user) for user in self.users]
+
+    def award(self, index, points, key):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.points[index].add_points(points, idempotency_key=key)
+
+    def test_awards_after_first_read_are_applied(self):
+        self.award(0, 10, 'a')
+        self.assertEqual(leaderboards.top('weekly'), [(self.users[0].pk, 10)])
+        self.award(1, 30, 'b')
+        self.award(0, 5, 'c')
+        self.award(2, 1, 'refund:1')
+        self.assertEqual(leaderboards.top('weekly'), [(self.users[1].pk, 30), (self.users[0].pk, 15)])
+        self.assertEqual(leaderboards.rank(self.users[0].pk, 'all'), (2, 15))
+        self.assertIsNone(leaderboards.rank(self.users[2].pk, 'all'))
@@ -1,8 +1,9 @@
 from django.urls import path
-from .views import DashboardSummaryView, AdminRewardListCreateView, AdminRewardDetailView, AdminRewardRedemptionListView
+from .views import DashboardSummaryView, AdminRewardListCreateView, AdminRewardDetailView, AdminRewardRedemptionListView, LeaderboardView
 
 urlpatterns = [
     path('dashboard/', DashboardSummaryView.as_view(), name='dashboard-summary'),
+    path('leaderboard/', LeaderboardView.as_view(), name='leaderboard'),
     path('admin/available-rewards/', AdminRewardListCreateView.as_view(), name='admin-reward-list-create'),
     path('admin/available-rewards/<int:id>/', AdminRewardDetailView.as_view(), name='admin-reward-detail'),
     path('admin/redemptions/', AdminRewardRedemptionListView.as_view(), name='admin-reward-redemptions'),
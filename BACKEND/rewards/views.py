@@ -5,7 +5,7 @@ from rest_framework.permissions import IsAuthenticated
 from .models import UserStreak, UserPoints
 from .serializers import UserStreakSerializer, UserPointsSerializer
 from django.utils import timezone
-from content.models import Bookmark, ViewHistory
+from content.models import Bookmark, ViewHistory, listing_video_prefetch
 from content.serializers import BookmarkSerializer, ViewHistorySerializer
 from subscription.models import UserSubscription
 from subscription.serializers import UserSubscriptionSerializer
@@ -13,6 +13,8 @@ from users.permissions import IsSuperAdmin
 from rest_framework import generics
 from .models import Reward, RewardRedemption
 from .serializers import RewardSerializer, RewardRedemptionSerializer
+from .leaderboards import OVERALL, PERIODS, rank, top
+from users.models import User
 
 class DashboardSummaryView(APIView):
     permission_classes = [IsAuthenticated]
@@ -24,13 +26,26 @@ class DashboardSummaryView(APIView):
         # Ensure points exists
         points, _ = UserPoints.objects.get_or_create(user=user)
         # Bookmarks (latest 10)
-        bookmarks = Bookmark.objects.filter(user=user).order_by('-created_at')[:10]
+        bookmarks = (
+            Bookmark.objects.filter(user=user)
+            .prefetch_related(listing_video_prefetch())
+            .order_by('-created_at')[:10]
+        )
         bookmarks_data = BookmarkSerializer(bookmarks, many=True).data
         # History (latest 10)
-        history = ViewHistory.objects.filter(user=user).order_by('-updated_at')[:10]
+        history = (
+            ViewHistory.objects.filter(user=user)
+            .prefetch_related(listing_video_prefetch())
+            .order_by('-updated_at')[:10]
+        )
         history_data = ViewHistorySerializer(history, many=True).data
         # Subscription (latest active)
-        subscription = UserSubscription.objects.filter(user=user, is_active=True).order_by('-end_date').first()
+        subscription = (
+            UserSubscription.objects.filter(user=user, is_active=True)
+            .select_related('plan', 'voucher')
+            .order_by('-end_date')
+            .first()
+        )
         subscription_data = UserSubscriptionSerializer(subscription).data if subscription else None
         streak_data = UserStreakSerializer(streak).data
         points_data = UserPointsSerializer(points).data
@@ -57,3 +72,40 @@ class AdminRewardRedemptionListView(generics.ListAPIView):
     queryset = RewardRedemption.objects.all()
     serializer_class = RewardRedemptionSerializer
     permission_classes = [IsSuperAdmin]
+
+class LeaderboardView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        period = request.query_params.get('period', 'weekly')
+        if period not in PERIODS:
+            return Response({'error': f"period must be one of {', '.join(PERIODS)}"}, status=400)
+        scope = request.query_params.get('class_level') or OVERALL
+        if scope != OVERALL:
+            if not scope.isdigit():
+                return Response({'error': 'class_level must be an id'}, status=400)
+            scope = int(scope)
+        try:
+            limit = min(max(int(request.query_params.get('limit', 10)), 1), 100)
+        except ValueError:
+            return Response({'error': 'limit must be a number'}, status=400)
+
+        # Ranks come from the sorted boards; only the names hit the database
+        leaders = top(period, scope, limit)
+        names = {
+            pk: f'{first_name} {last_name[:1]}.' if last_name else first_name or 'Learner'
+            for pk, first_name, last_name in User.objects.filter(
+                pk__in=[user_id for user_id, _ in leaders]
+            ).values_list('pk', 'first_name', 'last_name')
+        }
+        mine = rank(request.user.pk, period, scope)
+        return Response({
+            'period': period,
+            'class_level': None if scope == OVERALL else scope,
+            'results': [
+                {'rank': position, 'user_id': user_id, 'name': names.get(user_id, 'Learner'), 'points': points}
+                for position, (user_id, points) in enumerate(leaders, start=1)
+            ],
+            'me': {'rank': mine[0], 'points': mine[1]} if mine else {'rank': None, 'points': 0},
+        })
+
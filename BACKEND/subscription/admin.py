@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import SubscriptionPlan, UserSubscription, Payment, VoucherCode
+from .models import SubscriptionPlan, UserSubscription, Payment, VoucherCode, WebhookEvent
 
 
 @admin.register(SubscriptionPlan)
@@ -38,5 +38,15 @@ class VoucherCodeAdmin(admin.ModelAdmin):
 
     list_display = ('code', 'plan', 'is_used', 'used_by', 'used_at', 'expiry_date')
     list_filter = ('is_used', 'plan')
-    search_fields = ('code', 'used_by__email')
-    raw_id_fields = ('plan', 'used_by')
\ No newline at end of file
+    search_fields = ('code', 'batch', 'used_by__email')
+    raw_id_fields = ('plan', 'used_by')
+
+
+@admin.register(WebhookEvent)
+class WebhookEventAdmin(admin.ModelAdmin):
+    """Admin configuration for WebhookEvent model."""
+
+    list_display = ('event_id', 'gateway', 'event_type', 'reference', 'status', 'attempts', 'received_at')
+    list_filter = ('status', 'gateway', 'event_type')
+    search_fields = ('event_id', 'reference')
+    readonly_fields = ('received_at', 'processed_at')
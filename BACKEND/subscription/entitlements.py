@@ -0,0 +1,86 @@
+import math
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from core.cache import cache_timeout
+from .models import UserSubscription
+
+ENTITLEMENT_KEY = 'subscription:entitlement:%s'
+
+Entitlement = namedtuple('Entitlement', ['plan_type', 'end_date'])
+
+
+def _timeout_until(moment, now):
+    return max(1, math.ceil((moment - now).total_seconds()))
+
+
+def load_entitlement(user_id, now=None):
+    """
+    Read the user's effective subscription from the database.
+
+    Returns ``(entitlement, valid_until)``: the active subscription running
+    longest (or None), and the moment this answer may change on its own,
+    i.e. when that subscription ends or the next one starts.
+    """
+    now = now or timezone.now()
+    subscriptions = (
+        UserSubscription.objects.filter(user_id=user_id, is_active=True, end_date__gte=now)
+        .values_list('plan__plan_type', 'start_date', 'end_date')
+    )
+    current = None
+    valid_until = None
+    for plan_type, start_date, end_date in subscriptions:
+        if start_date <= now:
+            if current is None or end_date > current.end_date:
+                current = Entitlement(plan_type, end_date)
+        elif valid_until is None or start_date < valid_until:
+            valid_until = start_date
+    if current is not None and (valid_until is None or current.end_date < valid_until):
+        valid_until = current.end_date
+    return current, valid_until
+
+
+def get_entitlement(user):
+    """
+    Return the user's cached Entitlement, or None without an active
+    subscription. The cache entry expires exactly when the answer would change
+    by itself; saves of subscriptions and payments drop it earlier. "No
+    subscription" is kept for ENTITLEMENT_CACHE_TIMEOUT seconds only, and a
+    per-process cache keeps nothing longer than LOCAL_CACHE_TIMEOUT, since
+    drops made by other workers do not reach it.
+    """
+    if not user or not user.is_authenticated:
+        return None
+    now = timezone.now()
+    key = ENTITLEMENT_KEY % user.pk
+    cached = cache.get(key)
+    if cached is None:
+        entitlement, valid_until = load_entitlement(user.pk, now)
+        # Store a tuple so "no subscription" is cached too.
+        cached = (entitlement,)
+        if entitlement is None:
+            timeout = settings.ENTITLEMENT_CACHE_TIMEOUT
+            if valid_until is not None:
+                timeout = min(timeout, _timeout_until(valid_until, now))
+        else:
+            timeout = _timeout_until(valid_until, now)
+        cache.set(key, cached, timeout=cache_timeout(timeout))
+    entitlement = cached[0]
+    if entitlement is not None and entitlement.end_date < now:
+        return None
+    return entitlement
+
+
+def has_active_subscription(user):
+    return get_entitlement(user) is not None
+
+
+def invalidate_entitlement(user_id):
+    cache.delete(ENTITLEMENT_KEY % user_id)
+
+
+def invalidate_entitlements(user_ids):
+    cache.delete_many([ENTITLEMENT_KEY % user_id for user_id in set(user_ids)])
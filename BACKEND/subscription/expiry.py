@@ -0,0 +1,19 @@
+from functools import partial
+
+from django.db import transaction
+
+from .entitlements import invalidate_entitlements
+from .models import UserSubscription
+
+
+def expire_subscriptions(now=None):
+    """
+    Flip every subscription that has ended to inactive in one UPDATE and drop
+    the affected users' cached entitlements once it commits. Returns the
+    number of subscriptions expired.
+    """
+    with transaction.atomic():
+        user_ids = UserSubscription.objects.expire(now)
+        if user_ids:
+            transaction.on_commit(partial(invalidate_entitlements, user_ids))
+    return len(user_ids)
@@ -0,0 +1,126 @@
+"""
+A local stand-in for the Flutterwave and Paystack APIs, for development and
+load tests without network access. Serve it with `manage.py
+fake_payment_gateway` and point FLUTTERWAVE_BASE_URL at ``<url>/v3`` and
+PAYSTACK_BASE_URL at ``<url>``.
+"""
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class FakeGatewayHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, like the real gateways
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if not length:
+            return {}
+        try:
+            return json.loads(self.rfile.read(length))
+        except ValueError:
+            return {}
+
+    def _send(self, status, body):
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _simulate(self):
+        """Apply the configured latency; return True if this call should fail."""
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        return random.random() < self.server.failure_rate
+
+    def _status_for(self, reference):
+        """Deterministic outcome per reference so repeated verifications agree."""
+        if reference and reference in self.server.failed_references:
+            return False
+        return random.Random(reference).random() >= self.server.decline_rate
+
+    def do_POST(self):
+        data = self._read_json()
+        if self._simulate():
+            return self._send(503, {'status': 'error', 'message': 'Service unavailable'})
+        path = urlparse(self.path).path
+        base = f'http://{self.headers.get("Host")}'
+        if path == '/v3/payments':
+            tx_ref = data.get('tx_ref', '')
+            return self._send(200, {
+                'status': 'success',
+                'message': 'Hosted Link',
+                'data': {'link': f'{base}/checkout/{tx_ref}'},
+            })
+        if path == '/transaction/initialize':
+            reference = data.get('reference', '')
+            return self._send(200, {
+                'status': True,
+                'message': 'Authorization URL created',
+                'data': {
+                    'authorization_url': f'{base}/checkout/{reference}',
+                    'access_code': reference,
+                    'reference': reference,
+                },
+            })
+        self._send(404, {'status': 'error', 'message': 'Not found'})
+
+    def do_GET(self):
+        if self._simulate():
+            return self._send(503, {'status': 'error', 'message': 'Service unavailable'})
+        url = urlparse(self.path)
+        if url.path == '/v3/transactions/verify_by_reference':
+            tx_ref = parse_qs(url.query).get('tx_ref', [''])[0]
+            paid = self._status_for(tx_ref)
+            return self._send(200, {
+                'status': 'success',
+                'message': 'Transaction fetched successfully',
+                'data': {
+                    'id': abs(hash(tx_ref)) % 10 ** 9,
+                    'tx_ref': tx_ref,
+                    'status': 'successful' if paid else 'failed',
+                },
+            })
+        if url.path.startswith('/transaction/verify/'):
+            reference = url.path.rsplit('/', 1)[-1]
+            paid = self._status_for(reference)
+            return self._send(200, {
+                'status': True,
+                'message': 'Verification successful',
+                'data': {'reference': reference, 'status': 'success' if paid else 'failed'},
+            })
+        self._send(404, {'status': 'error', 'message': 'Not found'})
+
+
+class FakeGatewayServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.0, failure_rate=0.0, decline_rate=0.0,
+                 failed_references=(), verbose=False):
+        super().__init__(address, FakeGatewayHandler)
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.decline_rate = decline_rate
+        self.failed_references = set(failed_references)
+        self.verbose = verbose
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start_in_thread(self):
+        """Serve from a daemon thread (for benchmarks); returns the thread."""
+        thread = threading.Thread(target=self.serve_forever, name='fake-payment-gateway', daemon=True)
+        thread.start()
+        return thread
@@ -0,0 +1,204 @@
+import logging
+import threading
+import time
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+
+class GatewayError(Exception):
+    """A payment gateway call failed."""
+
+
+class GatewayUnavailable(GatewayError):
+    """The gateway timed out, kept failing, or its circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Stop calling a gateway after ``failure_threshold`` consecutive failures.
+
+    While open, calls fail immediately for ``reset_timeout`` seconds; after
+    that a single trial call is let through and its outcome closes or re-opens
+    the circuit. Thread-safe.
+    """
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+
+    def allow(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_timeout or self._trial_running:
+                return False
+            self._trial_running = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_running = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+    def end_trial(self):
+        """Let another trial through, e.g. after a call that recorded no outcome."""
+        with self._lock:
+            self._trial_running = False
+
+    @property
+    def is_open(self):
+        with self._lock:
+            return self._opened_at is not None
+
+
+class GatewayClient:
+    """
+    HTTP client for one payment gateway: a pooled keep-alive session, connect
+    and read timeouts, retries with exponential backoff and a circuit breaker.
+
+    Connection failures are retried for every method. Read timeouts and
+    429/5xx answers are retried for GET only, so a payment is never
+    initialized twice.
+    """
+
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+    def __init__(self, name, base_url, secret_key, timeout=(3.05, 10), retries=2,
+                 backoff=0.5, pool_size=20, failure_threshold=5, reset_timeout=30):
+        self.name = name
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.session = requests.Session()
+        self.session.headers.update({
+            'Authorization': f'Bearer {secret_key}',
+            'Content-Type': 'application/json',
+        })
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=retries,
+            status=retries,
+            backoff_factor=backoff,
+            status_forcelist=self.RETRY_STATUSES,
+            allowed_methods=frozenset({'GET'}),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def request(self, method, path, **kwargs):
+        """
+        Send a request and return ``(status_code, json_body)``. Raises
+        GatewayUnavailable on timeouts, connection errors and 5xx answers that
+        persist after the retries.
+        """
+        if not self.breaker.allow():
+            raise GatewayUnavailable(f'{self.name} is unavailable (circuit open)')
+        kwargs.setdefault('timeout', self.timeout)
+        try:
+            try:
+                response = self.session.request(method, f'{self.base_url}{path}', **kwargs)
+            except requests.RequestException as exc:
+                self.breaker.record_failure()
+                logger.warning('%s %s %s failed: %s', self.name, method, path, exc)
+                raise GatewayUnavailable(f'{self.name} request failed: {exc}') from exc
+
+            if response.status_code >= 500:
+                self.breaker.record_failure()
+                raise GatewayUnavailable(f'{self.name} answered {response.status_code}')
+            self.breaker.record_success()
+        finally:
+            # Any other error records no outcome; a half-open circuit must
+            # still let the next trial through.
+            self.breaker.end_trial()
+        try:
+            body = response.json()
+        except ValueError:
+            body = {}
+        return response.status_code, body
+
+    def get(self, path, **kwargs):
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request('POST', path, **kwargs)
+
+
+class FlutterwaveClient(GatewayClient):
+    def initialize_payment(self, payment_data):
+        return self.post('/payments', json=payment_data)
+
+    def verify_by_reference(self, tx_ref):
+        return self.get('/transactions/verify_by_reference', params={'tx_ref': tx_ref})
+
+
+class PaystackClient(GatewayClient):
+    def initialize_payment(self, email, amount, reference, callback_url):
+        return self.post('/transaction/initialize', json={
+            'email': email,
+            'amount': int(amount * 100),  # Paystack expects amount in kobo
+            'reference': reference,
+            'callback_url': callback_url,
+        })
+
+    def verify_payment(self, reference):
+        return self.get(f'/transaction/verify/{reference}')
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def _client_options():
+    return {
+        'timeout': (settings.PAYMENT_GATEWAY_CONNECT_TIMEOUT, settings.PAYMENT_GATEWAY_READ_TIMEOUT),
+        'retries': settings.PAYMENT_GATEWAY_RETRIES,
+        'backoff': settings.PAYMENT_GATEWAY_BACKOFF,
+        'pool_size': settings.PAYMENT_GATEWAY_POOL_SIZE,
+        'failure_threshold': settings.PAYMENT_GATEWAY_BREAKER_THRESHOLD,
+        'reset_timeout': settings.PAYMENT_GATEWAY_BREAKER_RESET,
+    }
+
+
+def _shared(name, factory):
+    client = _clients.get(name)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(name)
+            if client is None:
+                client = _clients[name] = factory()
+    return client
+
+
+def flutterwave():
+    """The process-wide Flutterwave client."""
+    return _shared('flutterwave', lambda: FlutterwaveClient(
+        'Flutterwave', settings.FLUTTERWAVE_BASE_URL, settings.FLUTTERWAVE_SECRET_KEY, **_client_options()
+    ))
+
+
+def paystack():
+    """The process-wide Paystack client."""
+    return _shared('paystack', lambda: PaystackClient(
+        'Paystack', settings.PAYSTACK_BASE_URL, getattr(settings, 'PAYSTACK_SECRET_KEY', ''), **_client_options()
+    ))
@@ -0,0 +1,104 @@
+import threading
+import time
+from uuid import uuid4
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, close_old_connections, connection
+from django.utils import timezone
+
+from subscription.models import SubscriptionPlan, VoucherCode
+from subscription.vouchers import mint_vouchers, redeem_voucher
+from users.models import User
+
+
+def legacy_redeem(code, user, plan):
+    """The old read-check-write path: is_valid() on a loaded row, then save."""
+    try:
+        voucher = VoucherCode.objects.get(code=code, plan=plan)
+    except VoucherCode.DoesNotExist:
+        return False
+    if not voucher.is_valid():
+        return False
+    voucher.is_used = True
+    voucher.used_by = user
+    voucher.used_at = timezone.now()
+    voucher.save(update_fields=['is_used', 'used_by', 'used_at'])
+    return True
+
+
+def atomic_redeem(code, user, plan):
+    return redeem_voucher(code, user, plan) is not None
+
+
+class Command(BaseCommand):
+    help = (
+        'Redeem a batch of vouchers from several threads, every code being tried by every '
+        'thread at the same moment, with the legacy read-check-write path and with the '
+        'conditional UPDATE. Reports redemptions per second and double spends. Seeded rows '
+        'are deleted afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--vouchers', type=int, default=500)
+
+    def handle(self, *args, **options):
+        tag = uuid4().hex[:8]
+        plan = SubscriptionPlan.objects.create(
+            name=f'Bench {tag}', plan_type='scholar', description='Benchmark plan', price=0
+        )
+        threads = max(options['threads'], 1)
+        users = [
+            User.objects.create(email=f'bench-{tag}-{i}@example.com', password=make_password(None))
+            for i in range(threads)
+        ]
+        try:
+            for label, redeem in (('read-check-write', legacy_redeem), ('conditional UPDATE', atomic_redeem)):
+                batch = mint_vouchers(plan, max(options['vouchers'], 1), prefix='B')
+                codes = list(VoucherCode.objects.filter(batch=batch).values_list('code', flat=True))
+                self.run(label, redeem, codes, users, plan)
+        finally:
+            VoucherCode.objects.filter(plan=plan).delete()
+            User.objects.filter(pk__in=[user.pk for user in users]).delete()
+            plan.delete()
+
+    def run(self, label, redeem, codes, users, plan):
+        threads = len(users)
+        wins = [0] * threads
+        errors = [0] * threads
+        barrier = threading.Barrier(threads)
+
+        def worker(index):
+            close_old_connections()
+            try:
+                barrier.wait()
+                # All threads walk the codes in the same order, so every code
+                # is contended by all of them at the same moment.
+                for code in codes:
+                    try:
+                        wins[index] += redeem(code, users[index], plan)
+                    except DatabaseError:
+                        errors[index] += 1
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+        started = time.perf_counter()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        attempts = threads * len(codes)
+        redeemed = sum(wins)
+        double_spent = redeemed - VoucherCode.objects.filter(code__in=codes, is_used=True).count()
+        self.stdout.write(self.style.MIGRATE_HEADING(label))
+        self.stdout.write(
+            f'  {attempts} attempts on {len(codes)} vouchers from {threads} threads in {elapsed:.2f}s '
+            f'({attempts / elapsed:.0f} attempts/s, {redeemed / elapsed:.0f} redemptions/s), '
+            f'{sum(errors)} failed'
+        )
+        result = f'  {redeemed} successful redemptions, {double_spent} double spends'
+        self.stdout.write(self.style.ERROR(result) if double_spent else result)
@@ -0,0 +1,26 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from subscription.expiry import expire_subscriptions
+
+
+class Command(BaseCommand):
+    help = 'Deactivate subscriptions whose end date has passed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep sweeping every --interval seconds')
+        parser.add_argument('--interval', type=int, default=settings.SUBSCRIPTION_EXPIRY_INTERVAL)
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.perf_counter()
+            expired = expire_subscriptions()
+            if expired or not options['loop']:
+                self.stdout.write(f'Expired {expired} subscriptions in {time.perf_counter() - started:.2f}s.')
+            if not options['loop']:
+                break
+            close_old_connections()
+            time.sleep(options['interval'])
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from subscription.fake_gateway import FakeGatewayServer
+
+
+class Command(BaseCommand):
+    help = (
+        'Serve a local fake Flutterwave/Paystack API for offline development and load tests. '
+        'Set FLUTTERWAVE_BASE_URL=<url>/v3 and PAYSTACK_BASE_URL=<url> to use it.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--latency', type=float, default=0.05, help='Seconds added to every response')
+        parser.add_argument('--failure-rate', type=float, default=0.0, help='Share of calls answered with 503')
+        parser.add_argument('--decline-rate', type=float, default=0.0, help='Share of references reported as failed payments')
+        parser.add_argument('--verbose', action='store_true', help='Log every request')
+
+    def handle(self, *args, **options):
+        server = FakeGatewayServer(
+            (options['host'], options['port']),
+            latency=options['latency'],
+            failure_rate=options['failure_rate'],
+            decline_rate=options['decline_rate'],
+            verbose=options['verbose'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Fake payment gateway on {server.url} '
+            f'(FLUTTERWAVE_BASE_URL={server.url}/v3, PAYSTACK_BASE_URL={server.url})'
+        ))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,47 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from subscription.models import SubscriptionPlan, VoucherCode
+from subscription.vouchers import CODE_LENGTH, MIN_CODE_LENGTH, mint_vouchers, write_vouchers_csv
+
+
+class Command(BaseCommand):
+    help = 'Mint unique voucher codes for a plan in bulk and optionally export them as CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--plan', type=int, required=True, help='Subscription plan ID')
+        parser.add_argument('--count', type=int, required=True)
+        parser.add_argument('--expires-in-days', type=int, default=None)
+        parser.add_argument('--prefix', default='', help='Prepended to every code, e.g. "SCH-"')
+        parser.add_argument('--length', type=int, default=CODE_LENGTH, help=f'Random characters per code (at least {MIN_CODE_LENGTH})')
+        parser.add_argument('--csv', dest='csv_path', default=None, help='Write the new codes to this CSV file')
+
+    def handle(self, *args, **options):
+        try:
+            plan = SubscriptionPlan.objects.get(pk=options['plan'])
+        except SubscriptionPlan.DoesNotExist:
+            raise CommandError(f"Plan {options['plan']} does not exist")
+        if options['count'] < 1:
+            raise CommandError('--count must be positive')
+        expiry_date = None
+        if options['expires_in_days'] is not None:
+            expiry_date = timezone.now() + timedelta(days=options['expires_in_days'])
+
+        started = time.perf_counter()
+        try:
+            batch = mint_vouchers(plan, options['count'], expiry_date=expiry_date,
+                                  prefix=options['prefix'], length=options['length'])
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Minted {options['count']} vouchers for {plan.name} in {elapsed:.2f}s "
+            f"({options['count'] / elapsed:.0f}/s), batch {batch}"
+        ))
+        if options['csv_path']:
+            with open(options['csv_path'], 'w', newline='') as out:
+                write_vouchers_csv(VoucherCode.objects.filter(batch=batch), out)
+            self.stdout.write(f"Wrote {options['csv_path']}")
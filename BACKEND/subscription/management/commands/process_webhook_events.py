@@ -0,0 +1,27 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from subscription.webhooks import process_webhook_events
+
+
+class Command(BaseCommand):
+    help = 'Apply stored payment gateway webhook events in arrival order'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep polling every --interval seconds')
+        parser.add_argument('--interval', type=int, default=settings.PAYMENT_WEBHOOK_INTERVAL)
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.perf_counter()
+            counts = process_webhook_events()
+            if any(counts.values()) or not options['loop']:
+                summary = ', '.join(f'{count} {outcome}' for outcome, count in counts.items())
+                self.stdout.write(f'Webhook events: {summary} in {time.perf_counter() - started:.2f}s.')
+            if not options['loop']:
+                break
+            close_old_connections()
+            time.sleep(options['interval'])
@@ -0,0 +1,67 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from subscription.fake_gateway import FakeGatewayServer
+from subscription.gateways import FlutterwaveClient
+from subscription.reconcile import reconcile_pending_payments
+
+
+class Command(BaseCommand):
+    help = (
+        'Verify pending payments against Flutterwave on a bounded thread pool and store '
+        'the results in bulk. Use --fake-gateway to run against a local stand-in.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500, help='Payments read and written per batch')
+        parser.add_argument('--workers', type=int, default=settings.PAYMENT_GATEWAY_POOL_SIZE,
+                            help='Concurrent gateway verifications')
+        parser.add_argument('--limit', type=int, default=None, help='Stop after this many payments')
+        parser.add_argument('--min-age-minutes', type=int, default=30,
+                            help='Skip payments younger than this; their users may still be checking out')
+        parser.add_argument('--abandon-after-hours', type=int, default=24,
+                            help='Fail payments the gateway has no record of after this long')
+        parser.add_argument('--fake-gateway', action='store_true',
+                            help='Verify against an in-process fake gateway instead of Flutterwave')
+        parser.add_argument('--latency', type=float, default=0.05, help='Fake gateway latency in seconds')
+        parser.add_argument('--decline-rate', type=float, default=0.0, help='Fake gateway share of failed payments')
+
+    def handle(self, *args, **options):
+        client = server = None
+        workers = max(options['workers'], 1)
+        if options['fake_gateway']:
+            server = FakeGatewayServer(('127.0.0.1', 0), latency=options['latency'],
+                                       decline_rate=options['decline_rate'])
+            server.start_in_thread()
+            client = FlutterwaveClient('Fake Flutterwave', f'{server.url}/v3', 'fake', pool_size=workers)
+            self.stdout.write(f'Using fake gateway on {server.url}')
+
+        def progress(totals, elapsed):
+            self.stdout.write(
+                f"  {totals['checked']} checked in {elapsed:.1f}s ({totals['checked'] / elapsed:.0f}/s)"
+            )
+
+        try:
+            totals = reconcile_pending_payments(
+                client=client,
+                min_age=timedelta(minutes=options['min_age_minutes']),
+                abandon_after=timedelta(hours=options['abandon_after_hours']),
+                chunk_size=max(options['chunk_size'], 1),
+                workers=workers,
+                limit=options['limit'],
+                progress=progress,
+            )
+        finally:
+            if server is not None:
+                server.shutdown()
+                server.server_close()
+
+        elapsed = totals['elapsed']
+        rate = totals['checked'] / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Reconciled {totals['checked']} payments in {elapsed:.2f}s ({rate:.0f}/s): "
+            f"{totals['successful']} successful, {totals['failed']} failed, "
+            f"{totals['unresolved']} still pending, {totals['errors']} gateway errors."
+        ))
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-18 12:10
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscription', '0004_alter_payment_options_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='usersubscription',
+            index=models.Index(fields=['user', 'is_active', 'end_date'], name='usersub_user_active_end_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='usersubscription',
+            index=models.Index(fields=['payment_reference'], name='usersub_payment_ref_idx'),
+        ),
+    ]
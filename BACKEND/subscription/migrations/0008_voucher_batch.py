@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 12:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscription', '0007_subscription_expiry_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vouchercode',
+            name='batch',
+            field=models.CharField(blank=True, db_index=True, help_text='Bulk generation run this code belongs to', max_length=32),
+        ),
+    ]
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import connections, models
 from django.utils import timezone
 from django.conf import settings
 from datetime import timedelta
@@ -42,6 +42,7 @@ class VoucherCode(models.Model):
     used_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='used_vouchers')
     used_at = models.DateTimeField(null=True, blank=True)
     expiry_date = models.DateTimeField(null=True, blank=True)
+    batch = models.CharField(max_length=32, blank=True, db_index=True, help_text="Bulk generation run this code belongs to")
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
@@ -49,6 +50,14 @@ class VoucherCode(models.Model):
     
     def __str__(self):
         return f"{self.code} - {self.plan.name}"
+
+    @classmethod
+    def redeemable(cls, now=None):
+        """Unused vouchers that have not expired."""
+        now = now or timezone.now()
+        return cls.objects.filter(is_used=False).filter(
+            models.Q(expiry_date__isnull=True) | models.Q(expiry_date__gt=now)
+        )
     
     def is_valid(self):
         """Check if voucher is valid."""
@@ -59,14 +68,39 @@ class VoucherCode(models.Model):
         return True
     
     def use_voucher(self, user):
-        """Mark voucher as used."""
-        if self.is_valid():
+        """
+        Mark voucher as used with a single conditional UPDATE, so a voucher
+        redeemed concurrently is only ever used once.
+        """
+        now = timezone.now()
+        used = VoucherCode.redeemable(now).filter(pk=self.pk).update(is_used=True, used_by=user, used_at=now)
+        if used:
             self.is_used = True
             self.used_by = user
-            self.used_at = timezone.now()
-            self.save(update_fields=['is_used', 'used_by', 'used_at'])
-            return True
-        return False
+            self.used_at = now
+        return bool(used)
+
+
+class UserSubscriptionQuerySet(models.QuerySet):
+    def expire(self, now=None):
+        """
+        Deactivate every active subscription that ended before ``now`` with a
+        single UPDATE ... RETURNING (SQLite and PostgreSQL) and return the
+        affected user IDs. Signals are not sent.
+        """
+        connection = connections[self.db]
+        qn = connection.ops.quote_name
+        now = now or timezone.now()
+        # A bare "WHERE is_active" matches the partial index's condition.
+        sql = f"""
+            UPDATE {qn(self.model._meta.db_table)}
+            SET is_active = %s, updated_at = %s
+            WHERE is_active AND end_date < %s
+            RETURNING user_id
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [False, now, now])
+            return [user_id for user_id, in cursor.fetchall()]
 
 
 class UserSubscription(models.Model):
@@ -81,9 +115,19 @@ class UserSubscription(models.Model):
     voucher = models.ForeignKey(VoucherCode, on_delete=models.SET_NULL, null=True, blank=True, related_name='user_subscriptions')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    objects = UserSubscriptionQuerySet.as_manager()
     
     class Meta:
         ordering = ['-end_date']
+        indexes = [
+            # Active-subscription checks and "latest active subscription"
+            models.Index(fields=['user', 'is_active', 'end_date'], name='usersub_user_active_end_idx'),
+            # Payment verification / webhooks look subscriptions up by reference
+            models.Index(fields=['payment_reference'], name='usersub_payment_ref_idx'),
+            # The expiry sweeper only ever looks at active subscriptions
+            models.Index(fields=['end_date'], condition=models.Q(is_active=True), name='usersub_active_end_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.email} - {self.plan.name}"
@@ -100,6 +144,26 @@ class UserSubscription(models.Model):
         super().save(*args, **kwargs)
 
 
+class PaymentQuerySet(models.QuerySet):
+    def lock_pending(self):
+        """
+        Lock the payments in this queryset that are still pending until the end
+        of the transaction and return their IDs. SQLite has no row locks: a
+        no-op UPDATE takes the database write lock up front instead, so a
+        webhook cannot settle one of them before the transaction commits.
+        """
+        connection = connections[self.db]
+        pending = self.filter(status='pending').order_by()
+        if connection.features.has_select_for_update:
+            return list(pending.select_for_update().values_list('pk', flat=True))
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        pending_sql, params = pending.values('pk').query.sql_with_params()
+        sql = f"UPDATE {table} SET status = status WHERE id IN ({pending_sql}) RETURNING id"
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return [pk for pk, in cursor.fetchall()]
+
+
 class Payment(models.Model):
     """Payment model for tracking transactions."""
     
@@ -118,8 +182,45 @@ class Payment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = PaymentQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created_at']
 
     def __str__(self):
-        return f"{self.reference} - {self.amount} {self.currency}"
\ No newline at end of file
+        return f"{self.reference} - {self.amount} {self.currency}"
+
+class WebhookEvent(models.Model):
+    """A payment gateway webhook delivery, stored once per gateway event ID."""
+
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('processed', 'Processed'),
+        ('ignored', 'Ignored'),
+        ('failed', 'Failed'),
+    )
+
+    gateway = models.CharField(max_length=20, default='flutterwave')
+    event_id = models.CharField(max_length=255)
+    event_type = models.CharField(max_length=100, blank=True)
+    reference = models.CharField(max_length=255, blank=True)
+    payload = models.JSONField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['id']
+        constraints = [
+            # Redeliveries of the same event are dropped on insert
+            models.UniqueConstraint(fields=['gateway', 'event_id'], name='webhookevent_gateway_event_uniq'),
+        ]
+        indexes = [
+            # The worker scans pending events in arrival order
+            models.Index(fields=['status', 'id'], name='webhookevent_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.gateway} {self.event_type} {self.event_id} ({self.status})"
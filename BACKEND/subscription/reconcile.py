@@ -0,0 +1,127 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .entitlements import invalidate_entitlements
+from .gateways import GatewayError, flutterwave
+from .models import Payment, UserSubscription
+
+
+def _verify(client, reference):
+    try:
+        return client.verify_by_reference(reference)
+    except GatewayError as exc:
+        return exc
+
+
+def _outcome(result, payment, abandon_before):
+    """New payment status for one verification result, or None to leave it pending."""
+    if isinstance(result, Exception):
+        return None
+    status_code, body = result
+    data = body.get('data') or {}
+    if status_code == 200 and body.get('status') == 'success':
+        if data.get('status') == 'successful':
+            return 'successful'
+        if data.get('status') == 'failed':
+            return 'failed'
+        return None
+    # The gateway has no transaction for this reference: checkout abandoned.
+    if status_code in (400, 404) and payment.created_at <= abandon_before:
+        return 'failed'
+    return None
+
+
+def apply_results(payments, results, now, abandon_before):
+    """
+    Write the verification results of one chunk. The payments that are still
+    pending are locked and written with one bulk_update, so a stale result
+    never overwrites the outcome a webhook stored during the run; the
+    subscriptions of the payments that succeeded are activated with one more
+    UPDATE. Returns ``(successful, failed, unresolved, errors)`` counts,
+    leaving out payments settled in the meantime.
+    """
+    outcomes = {}
+    unresolved = errors = 0
+    for payment, result in zip(payments, results):
+        if isinstance(result, Exception):
+            errors += 1
+        status = _outcome(result, payment, abandon_before)
+        if status is None:
+            unresolved += not isinstance(result, Exception)
+            continue
+        outcomes[payment.pk] = (payment, status, result[1])
+    if not outcomes:
+        return 0, 0, unresolved, errors
+
+    with transaction.atomic():
+        settled = []
+        for pk in Payment.objects.filter(pk__in=outcomes).lock_pending():
+            payment, status, response = outcomes[pk]
+            payment.status = status
+            payment.payment_response = response
+            payment.updated_at = now
+            settled.append(payment)
+        Payment.objects.bulk_update(settled, ['status', 'payment_response', 'updated_at'], batch_size=500)
+
+        activated = [payment.subscription for payment in settled if payment.status == 'successful']
+        if activated:
+            UserSubscription.objects.filter(
+                pk__in=[subscription.pk for subscription in activated], is_active=False
+            ).update(is_active=True, updated_at=now)
+            # update() sends no signals, so drop the cached entitlements here.
+            user_ids = [subscription.user_id for subscription in activated]
+            transaction.on_commit(lambda: invalidate_entitlements(user_ids))
+
+    return len(activated), len(settled) - len(activated), unresolved, errors
+
+
+def reconcile_pending_payments(client=None, min_age=timedelta(minutes=30), abandon_after=timedelta(hours=24),
+                               chunk_size=500, workers=None, limit=None, progress=None):
+    """
+    Verify pending payments older than ``min_age`` against the gateway and
+    store the outcome. Payments are read in primary-key chunks and each chunk
+    is verified concurrently on a bounded thread pool sharing the client's
+    connection pool. Payments the gateway has no record of are failed once
+    older than ``abandon_after``; the rest stay pending for the next run.
+
+    Returns a dict of counts plus ``elapsed`` seconds. ``progress`` is called
+    with the running totals after every chunk.
+    """
+    client = client or flutterwave()
+    workers = workers or settings.PAYMENT_GATEWAY_POOL_SIZE
+    now = timezone.now()
+    abandon_before = now - abandon_after
+    pending = (
+        Payment.objects.filter(status='pending', created_at__lte=now - min_age)
+        .select_related('subscription')
+        .order_by('pk')
+    )
+    totals = {'checked': 0, 'successful': 0, 'failed': 0, 'unresolved': 0, 'errors': 0}
+    started = time.perf_counter()
+    last_pk = 0
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='reconcile') as pool:
+        while limit is None or totals['checked'] < limit:
+            size = chunk_size if limit is None else min(chunk_size, limit - totals['checked'])
+            payments = list(pending.filter(pk__gt=last_pk)[:size])
+            if not payments:
+                break
+            last_pk = payments[-1].pk
+            results = list(pool.map(lambda payment: _verify(client, payment.reference), payments))
+            successful, failed, unresolved, errors = apply_results(payments, results, timezone.now(), abandon_before)
+            totals['checked'] += len(payments)
+            totals['successful'] += successful
+            totals['failed'] += failed
+            totals['unresolved'] += unresolved
+            totals['errors'] += errors
+            if progress:
+                progress(totals, time.perf_counter() - started)
+            if client.breaker.is_open:
+                # The gateway is down; leave the rest for the next run.
+                break
+    totals['elapsed'] = time.perf_counter() - started
+    return totals
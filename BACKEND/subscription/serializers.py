@@ -1,3 +1,4 @@
+from django.conf import settings
 from rest_framework import serializers
 from .models import UserSubscription, SubscriptionPlan, Payment, VoucherCode
 import uuid
@@ -31,3 +32,10 @@ class SubscriptionCreateSerializer(serializers.Serializer):
     plan_id = serializers.IntegerField()
     voucher_code = serializers.CharField(required=False, allow_blank=True)
     redirect_url = serializers.URLField()
+
+class VoucherGenerateSerializer(serializers.Serializer):
+    plan_id = serializers.IntegerField()
+    count = serializers.IntegerField(min_value=1, max_value=settings.VOUCHER_GENERATE_MAX)
+    expiry_date = serializers.DateTimeField(required=False, allow_null=True)
+    prefix = serializers.RegexField(r'^[A-Z0-9-]*$', max_length=8, required=False, default='')
+
@@ -1,6 +1,10 @@
-from django.db.models.signals import post_save
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from .models import Payment, UserSubscription
+from .entitlements import invalidate_entitlement
 
 
 @receiver(post_save, sender=Payment)
@@ -12,12 +16,12 @@ def update_subscription_on_payment(sender, instance, created, **kwargs):
         instance.subscription.save(update_fields=['is_active'])
 
 
-@receiver(post_save, sender=UserSubscription)
-def check_subscription_status(sender, instance, **kwargs):
-    """Check and update subscription status based on end date."""
-    from django.utils import timezone
-    
-    # Update active status based on end date
-    if instance.end_date and timezone.now() > instance.end_date and instance.is_active:
-        instance.is_active = False
-        instance.save(update_fields=['is_active'])
\ No newline at end of file
+@receiver([post_save, post_delete], sender=UserSubscription)
+def invalidate_entitlement_on_subscription_change(sender, instance, **kwargs):
+    """Drop the user's cached entitlement once the change is committed."""
+    transaction.on_commit(partial(invalidate_entitlement, instance.user_id))
+
+
+@receiver(post_save, sender=Payment)
+def invalidate_entitlement_on_payment(sender, instance, **kwargs):
+    transaction.on_commit(partial(invalidate_entitlement, instance.subscription.user_id))
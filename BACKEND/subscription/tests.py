@@ -1,3 +1,192 @@
-from django.test import TestCase
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import requests
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from users.models import User
+from .entitlements import has_active_subscription
+from .expiry import expire_subscriptions
+from .gateways import GatewayClient, GatewayError, GatewayUnavailable
+from .models import Payment, SubscriptionPlan, UserSubscription, VoucherCode
+from .reconcile import apply_results
+from .vouchers import mint_vouchers, redeem_voucher
+
+
+class PlanMixin:
+    def setUp(self):
+        cache.clear()
+        self.plan = SubscriptionPlan.objects.create(
+            name='Standard', plan_type='standard', description='Standard', price=1000
+        )
+        self.users = [User.objects.create(email=f'learner{i}@example.com') for i in range(3)]
+
+
+class ExpireSubscriptionsTests(PlanMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.now = timezone.now()
+        self.subscriptions = [
+            UserSubscription.objects.create(user=user, plan=self.plan, end_date=self.now + timedelta(days=days))
+            for user, days in zip(self.users, (1, 2, 3))
+        ]
+
+    def active(self):
+        return sorted(UserSubscription.objects.filter(is_active=True).values_list('user_id', flat=True))
+
+    def test_expires_only_ended_subscriptions(self):
+        later = self.now + timedelta(days=2, hours=1)
+        self.assertEqual(sorted(UserSubscription.objects.expire(later)), [u.pk for u in self.users[:2]])
+        self.assertEqual(self.active(), [self.users[2].pk])
+        # Already inactive subscriptions are not returned again.
+        self.assertEqual(UserSubscription.objects.expire(later), [])
+
+    def test_nothing_ended(self):
+        self.assertEqual(UserSubscription.objects.expire(self.now), [])
+        self.assertEqual(self.active(), [u.pk for u in self.users])
+
+    def test_sweeper_drops_cached_entitlements(self):
+        self.assertTrue(has_active_subscription(self.users[0]))
+        # Moved back without a signal: only the sweeper can drop the cached entry.
+        UserSubscription.objects.filter(pk=self.subscriptions[0].pk).update(end_date=self.now - timedelta(hours=1))
+        self.assertTrue(has_active_subscription(self.users[0]))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(expire_subscriptions(), 1)
+        self.assertFalse(has_active_subscription(self.users[0]))
+
+
+class VoucherTests(PlanMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.voucher = VoucherCode.objects.create(code='ABC234', plan=self.plan)
+
+    def test_voucher_is_used_once(self):
+        # Two requests holding the same unused voucher: only one can use it.
+        other = VoucherCode.objects.get(pk=self.voucher.pk)
+        self.assertTrue(self.voucher.use_voucher(self.users[0]))
+        self.assertFalse(other.use_voucher(self.users[1]))
+        self.assertFalse(other.is_used)
+        stored = VoucherCode.objects.get(pk=self.voucher.pk)
+        self.assertEqual((stored.is_used, stored.used_by_id), (True, self.users[0].pk))
+
+    def test_redeem_by_code(self):
+        redeemed = redeem_voucher('ABC234', self.users[0], plan=self.plan)
+        self.assertEqual((redeemed.pk, redeemed.used_by_id), (self.voucher.pk, self.users[0].pk))
+        self.assertIsNone(redeem_voucher('ABC234', self.users[1]))
+        self.assertIsNone(redeem_voucher('MISSING', self.users[1]))
+
+    def test_expired_voucher_is_refused(self):
+        VoucherCode.objects.filter(pk=self.voucher.pk).update(expiry_date=timezone.now() - timedelta(minutes=1))
+        self.assertFalse(self.voucher.use_voucher(self.users[0]))
+        self.assertIsNone(redeem_voucher('ABC234', self.users[0]))
+        self.assertFalse(VoucherCode.objects.get(pk=self.voucher.pk).is_used)
+
+    def test_voucher_of_another_plan_is_refused(self):
+        other_plan = SubscriptionPlan.objects.create(name='Scholar', plan_type='scholar', description='Scholar')
+        self.assertIsNone(redeem_voucher('ABC234', self.users[0], plan=other_plan))
+
+    def test_mint_refuses_a_small_code_space(self):
+        with self.assertRaises(ValueError):
+            mint_vouchers(self.plan, 10, length=2)
+        # 31 ** 6 codes cannot hold ten million vouchers with room to spare.
+        with self.assertRaises(ValueError):
+            mint_vouchers(self.plan, 10_000_000, length=6)
+        self.assertEqual(VoucherCode.objects.count(), 1)
+
+    def test_mint_gives_up_when_codes_keep_colliding(self):
+        with mock.patch('subscription.vouchers.random_code', return_value='ABC234'):
+            with self.assertRaises(ValueError):
+                mint_vouchers(self.plan, 3)
+
+    def test_mint_creates_exact_count(self):
+        batch = mint_vouchers(self.plan, 25, prefix='T', length=6, batch_size=10)
+        codes = VoucherCode.objects.filter(batch=batch).values_list('code', flat=True)
+        self.assertEqual(len(set(codes)), 25)
+        self.assertTrue(all(code.startswith('T') and len(code) == 7 for code in codes))
+
+
+class ApplyResultsTests(PlanMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.now = timezone.now()
+        self.payments = []
+        for i, user in enumerate(self.users):
+            subscription = UserSubscription.objects.create(
+                user=user, plan=self.plan, end_date=self.now + timedelta(days=30), is_active=False
+            )
+            self.payments.append(Payment.objects.create(subscription=subscription, amount=1000, reference=f'ref-{i}'))
+
+    def verified(self, status):
+        return 200, {'status': 'success', 'data': {'status': status}}
+
+    def test_settles_pending_payments_in_bulk(self):
+        results = [self.verified('successful'), self.verified('failed'), GatewayError('down')]
+        with self.assertNumQueries(5):  # savepoint, lock, bulk update, activate, release
+            counts = apply_results(self.payments, results, self.now, self.now)
+        self.assertEqual(counts, (1, 1, 0, 1))
+        self.assertEqual(
+            list(Payment.objects.order_by('pk').values_list('status', 'subscription__is_active')),
+            [('successful', True), ('failed', False), ('pending', False)],
+        )
+
+    def test_payment_settled_meanwhile_is_left_alone(self):
+        # A webhook failed the first payment after the chunk was read.
+        Payment.objects.filter(pk=self.payments[0].pk).update(status='failed')
+        counts = apply_results(self.payments[:2], [self.verified('successful')] * 2, self.now, self.now)
+        self.assertEqual(counts, (1, 0, 0, 0))
+        self.assertEqual(
+            list(Payment.objects.order_by('pk').values_list('status', 'subscription__is_active'))[:2],
+            [('failed', False), ('successful', True)],
+        )
+
+
+@override_settings(FLUTTERWAVE_WEBHOOK_HASH='secret')
+class WebhookTests(PlanMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        subscription = UserSubscription.objects.create(
+            user=self.users[0], plan=self.plan, end_date=timezone.now() + timedelta(days=30), is_active=False
+        )
+        self.payment = Payment.objects.create(subscription=subscription, amount=1000, reference='ref-1')
+
+    def deliver(self):
+        payload = {'event': 'charge.completed', 'data': {'id': 77, 'tx_ref': 'ref-1', 'status': 'successful'}}
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                '/api/subscription/webhook/', payload, content_type='application/json', HTTP_VERIF_HASH='secret'
+            )
+        self.assertEqual(response.status_code, 200)
+
+    def test_webhook_is_applied_without_a_worker(self):
+        self.deliver()
+        self.payment.refresh_from_db()
+        self.assertEqual((self.payment.status, self.payment.subscription.is_active), ('successful', True))
+
+    @override_settings(PAYMENT_WEBHOOK_MODE='queued')
+    def test_queued_mode_leaves_webhook_to_the_worker(self):
+        self.deliver()
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, 'pending')
+
+
+class CircuitBreakerTests(TestCase):
+    def setUp(self):
+        self.client = GatewayClient('test', 'https://gateway.invalid', 'key', failure_threshold=1, reset_timeout=0)
+        self.session = mock.patch.object(self.client.session, 'request').start()
+        self.addCleanup(mock.patch.stopall)
+
+    def test_unexpected_error_in_trial_call_keeps_circuit_usable(self):
+        self.session.side_effect = requests.ConnectionError('down')
+        with self.assertRaises(GatewayUnavailable):
+            self.client.get('/ping')
+        self.assertTrue(self.client.breaker.is_open)
+        # The half-open trial call fails with an error the client does not handle.
+        self.session.side_effect = TypeError('bad argument')
+        with self.assertRaises(TypeError):
+            self.client.get('/ping')
+        self.session.side_effect = None
+        self.session.return_value = mock.Mock(status_code=200, json=lambda: {'status': 'success'})
+        self.assertEqual(self.client.get('/ping'), (200, {'status': 'success'}))
+        self.assertFalse(self.client.breaker.is_open)
@@ -4,7 +4,9 @@ from .views import (
     InitiateSubscriptionView,
     VerifySubscriptionView,
     FlutterwaveWebhookView,
-    UserSubscriptionView
+    UserSubscriptionView,
+    VoucherGenerateView,
+    VoucherExportView
 )
 
 urlpatterns = [
@@ -13,4 +15,6 @@ urlpatterns = [
     path('verify/', VerifySubscriptionView.as_view(), name='verify-subscription'),
     path('webhook/', FlutterwaveWebhookView.as_view(), name='flutterwave-webhook'),
     path('current/', UserSubscriptionView.as_view(), name='user-subscription'),
+    path('vouchers/generate/', VoucherGenerateView.as_view(), name='voucher-generate'),
+    path('vouchers/export/', VoucherExportView.as_view(), name='voucher-export'),
 ]
\ No newline at end of file
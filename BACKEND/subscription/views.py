@@ -9,16 +9,22 @@ from .serializers import (
     UserSubscriptionSerializer,
     PaymentSerializer,
     SubscriptionCreateSerializer,
-    VoucherCodeSerializer
+    VoucherCodeSerializer,
+    VoucherGenerateSerializer
 )
 from django.conf import settings
 from django.utils import timezone
 from django.shortcuts import get_object_or_404
-import requests
+from django.db import transaction
+from django.http import StreamingHttpResponse
 import hmac
 import hashlib
 import json
 from uuid import uuid4
+from .gateways import GatewayUnavailable, flutterwave
+from .vouchers import iter_vouchers_csv, mint_vouchers, redeem_voucher
+from users.permissions import IsSuperAdmin
+from .webhooks import flutterwave_event_id, handles, store_webhook_event
 
 class SubscriptionPlanListView(generics.ListAPIView):
     queryset = SubscriptionPlan.objects.filter(is_active=True)
@@ -37,23 +43,33 @@ class InitiateSubscriptionView(APIView):
         voucher_code = serializer.validated_data.get('voucher_code')
         redirect_url = serializer.validated_data.get('redirect_url')
 
-        # Handle voucher code if provided
+        # Generate payment reference
+        tx_ref = f"sub_{uuid4().hex[:16]}"
+
+        # If it's a voucher-based subscription, redeem the voucher (one
+        # conditional UPDATE, so it cannot be spent twice) and activate directly
         if voucher_code:
-            try:
-                voucher = VoucherCode.objects.get(code=voucher_code, plan=plan)
-                if not voucher.is_valid():
+            with transaction.atomic():
+                voucher = redeem_voucher(voucher_code, request.user, plan)
+                if voucher is None:
+                    known = VoucherCode.objects.filter(code=voucher_code, plan=plan).exists()
                     return Response(
-                        {"error": "Invalid or expired voucher code"},
+                        {"error": "Invalid or expired voucher code" if known else "Invalid voucher code"},
                         status=status.HTTP_400_BAD_REQUEST
                     )
-            except VoucherCode.DoesNotExist:
-                return Response(
-                    {"error": "Invalid voucher code"},
-                    status=status.HTTP_400_BAD_REQUEST
+                subscription = UserSubscription.objects.create(
+                    user=request.user,
+                    plan=plan,
+                    payment_reference=tx_ref,
+                    start_date=timezone.now(),
+                    voucher=voucher,
+                    is_active=True
                 )
-
-        # Generate payment reference
-        tx_ref = f"sub_{uuid4().hex[:16]}"
+            return Response({
+                "status": "success",
+                "message": "Subscription activated with voucher",
+                "subscription": UserSubscriptionSerializer(subscription).data
+            })
 
         # Create subscription
         subscription = UserSubscription.objects.create(
@@ -64,18 +80,6 @@ class InitiateSubscriptionView(APIView):
             is_active=False  # Will be activated after payment
         )
 
-        # If it's a voucher-based subscription, process it directly
-        if voucher_code and voucher.is_valid():
-            voucher.use_voucher(request.user)
-            subscription.voucher = voucher
-            subscription.is_active = True
-            subscription.save()
-            return Response({
-                "status": "success",
-                "message": "Subscription activated with voucher",
-                "subscription": UserSubscriptionSerializer(subscription).data
-            })
-
         # Initialize Flutterwave payment
         try:
             payment_data = {
@@ -98,19 +102,9 @@ class InitiateSubscriptionView(APIView):
                 }
             }
 
-            headers = {
-                "Authorization": f"Bearer {settings.FLUTTERWAVE_SECRET_KEY}",
-                "Content-Type": "application/json",
-            }
+            status_code, response_data = flutterwave().initialize_payment(payment_data)
 
-            response = requests.post(
-                "https://api.flutterwave.com/v3/payments",
-                json=payment_data,
-                headers=headers
-            )
-            response_data = response.json()
-
-            if response.status_code == 200 and response_data.get('status') == 'success':
+            if status_code == 200 and response_data.get('status') == 'success':
                 # Create payment record
                 payment = Payment.objects.create(
                     amount=plan.price,
@@ -131,6 +125,12 @@ class InitiateSubscriptionView(APIView):
                     "detail": response_data.get('message', 'Unknown error')
                 }, status=status.HTTP_400_BAD_REQUEST)
 
+        except GatewayUnavailable as e:
+            subscription.delete()
+            return Response({
+                "error": "Payment gateway unavailable, please try again shortly",
+                "detail": str(e)
+            }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
         except Exception as e:
             subscription.delete()  # Clean up on error
             return Response({
@@ -151,17 +151,9 @@ class VerifySubscriptionView(APIView):
             payment = get_object_or_404(Payment, reference=tx_ref)
 
             # Verify with Flutterwave
-            headers = {
-                "Authorization": f"Bearer {settings.FLUTTERWAVE_SECRET_KEY}",
-                "Content-Type": "application/json",
-            }
-            response = requests.get(
-                f"https://api.flutterwave.com/v3/transactions/verify_by_reference?tx_ref={tx_ref}",
-                headers=headers
-            )
-            response_data = response.json()
+            status_code, response_data = flutterwave().verify_by_reference(tx_ref)
 
-            if response.status_code == 200 and response_data.get('status') == 'success':
+            if status_code == 200 and response_data.get('status') == 'success':
                 data = response_data.get('data', {})
                 if data.get('status') == 'successful':
                     # Update payment status
@@ -188,43 +180,32 @@ class VerifySubscriptionView(APIView):
             return Response({
                 "error": "Subscription not found"
             }, status=status.HTTP_404_NOT_FOUND)
+        except GatewayUnavailable as e:
+            return Response({
+                "error": "Payment gateway unavailable, please try again shortly",
+                "detail": str(e)
+            }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
 
 class FlutterwaveWebhookView(APIView):
     permission_classes = [AllowAny]
 
     def post(self, request):
         # Verify webhook signature
-        signature = request.headers.get('verif-hash')
-        if not signature or signature != settings.FLUTTERWAVE_WEBHOOK_HASH:
+        signature = request.headers.get('verif-hash') or ''
+        expected = settings.FLUTTERWAVE_WEBHOOK_HASH
+        if not expected or not hmac.compare_digest(signature, expected):
             return Response({"error": "Invalid signature"}, status=status.HTTP_400_BAD_REQUEST)
 
         event_data = request.data
-        if event_data.get('event') == 'charge.completed':
-            tx_ref = event_data.get('data', {}).get('tx_ref')
-            if not tx_ref:
-                return Response({"error": "Missing tx_ref"}, status=status.HTTP_400_BAD_REQUEST)
-
-            try:
-                subscription = UserSubscription.objects.get(payment_reference=tx_ref)
-                payment = Payment.objects.get(reference=tx_ref)
-
-                # Update payment status
-                payment.status = 'successful'
-                payment.payment_response = event_data
-                payment.save()
-
-                # Activate subscription
-                subscription.is_active = True
-                subscription.save()
+        if not handles('flutterwave', event_data.get('event')):
+            return Response({"status": "ignored"})
 
-                return Response({"status": "success"})
-
-            except (UserSubscription.DoesNotExist, Payment.DoesNotExist):
-                return Response({
-                    "error": "Subscription or payment not found"
-                }, status=status.HTTP_404_NOT_FOUND)
-
-        return Response({"status": "ignored"})
+        # Store the event and acknowledge right away; it is applied once this
+        # request commits (or by the process_webhook_events worker in queued
+        # mode). Redeliveries hit the unique event ID and are dropped.
+        event_id = flutterwave_event_id(event_data)
+        store_webhook_event('flutterwave', event_id, event_data)
+        return Response({"status": "received"})
 
 class UserSubscriptionView(generics.RetrieveAPIView):
     permission_classes = [permissions.IsAuthenticated]
@@ -235,3 +216,42 @@ class UserSubscriptionView(generics.RetrieveAPIView):
             user=self.request.user,
             is_active=True
         ).first()
+
+class VoucherGenerateView(APIView):
+    permission_classes = [IsSuperAdmin]
+
+    def post(self, request):
+        serializer = VoucherGenerateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        plan = get_object_or_404(SubscriptionPlan, id=data['plan_id'])
+        try:
+            batch = mint_vouchers(plan, data['count'], expiry_date=data.get('expiry_date'), prefix=data['prefix'])
+        except ValueError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            "status": "success",
+            "batch": batch,
+            "count": data['count'],
+        }, status=status.HTTP_201_CREATED)
+
+class VoucherExportView(APIView):
+    permission_classes = [IsSuperAdmin]
+
+    def get(self, request):
+        vouchers = VoucherCode.objects.all()
+        batch = request.query_params.get('batch')
+        plan_id = request.query_params.get('plan')
+        if batch:
+            vouchers = vouchers.filter(batch=batch)
+        if plan_id:
+            if not plan_id.isdigit():
+                return Response({"error": "plan must be an id"}, status=status.HTTP_400_BAD_REQUEST)
+            vouchers = vouchers.filter(plan_id=plan_id)
+        if request.query_params.get('unused') in ('1', 'true'):
+            vouchers = vouchers.filter(is_used=False)
+        # Streamed, so exports of hundreds of thousands of codes stay flat in memory
+        response = StreamingHttpResponse(iter_vouchers_csv(vouchers), content_type='text/csv')
+        response['Content-Disposition'] = f'attachment; filename="vouchers-{batch or "all"}.csv"'
+        return response
+
@@ -0,0 +1,109 @@
+import csv
+import secrets
+from uuid import uuid4
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import VoucherCode
+
+# No 0/O, 1/I/L: codes are typed in by hand.
+CODE_ALPHABET = 'ABCDEFGHJKMNPQRSTUVWXYZ23456789'
+CODE_LENGTH = 12
+MIN_CODE_LENGTH = 6
+# The code space must be this many times larger than the codes it will hold,
+# so random draws rarely collide.
+CODE_SPACE_FACTOR = 100
+# Rounds allowed on top of the ones ``count`` needs, to replace codes lost to
+# collisions with stored or concurrently minted codes.
+MINT_EXTRA_ROUNDS = 10
+MINT_BATCH_SIZE = 5000
+CSV_FIELDS = ['code', 'plan', 'batch', 'expiry_date', 'is_used', 'used_by', 'used_at']
+
+
+def random_code(prefix='', length=CODE_LENGTH):
+    return prefix + ''.join(secrets.choice(CODE_ALPHABET) for _ in range(length))
+
+
+def mint_vouchers(plan, count, expiry_date=None, prefix='', length=CODE_LENGTH, batch_size=MINT_BATCH_SIZE):
+    """
+    Create ``count`` unique voucher codes for ``plan`` and return the batch ID
+    they are tagged with.
+
+    Codes are drawn in batches, those already stored are discarded with one
+    lookup per batch, and the rest are inserted with bulk_create ignoring
+    conflicts; counting the batch afterwards tops up any code a concurrent
+    run took in between, so exactly ``count`` codes are created.
+
+    Raises ValueError if the codes would not fit the column, if ``length``
+    leaves too few possible codes for ``count`` plus the codes already stored
+    under ``prefix``, or if collisions keep codes from being created.
+    """
+    if len(prefix) + length > VoucherCode._meta.get_field('code').max_length:
+        raise ValueError('Voucher prefix and length exceed the code column')
+    if length < MIN_CODE_LENGTH:
+        raise ValueError(f'Voucher codes need at least {MIN_CODE_LENGTH} random characters')
+    existing = VoucherCode.objects.filter(code__startswith=prefix).count()
+    if len(CODE_ALPHABET) ** length < CODE_SPACE_FACTOR * (count + existing):
+        raise ValueError(
+            f'{length} random characters leave too few codes for {count} more vouchers '
+            f'({existing} already use this prefix); use a longer length or another prefix'
+        )
+    batch = uuid4().hex
+    created = 0
+    rounds = -(-count // batch_size) + MINT_EXTRA_ROUNDS
+    while created < count:
+        if not rounds:
+            raise ValueError(f'Only {created} of {count} voucher codes could be created (batch {batch})')
+        rounds -= 1
+        wanted = min(batch_size, count - created)
+        # Codes drawn twice are simply made up for in the next round.
+        candidates = {random_code(prefix, length) for _ in range(wanted)}
+        taken = set(VoucherCode.objects.filter(code__in=candidates).values_list('code', flat=True))
+        VoucherCode.objects.bulk_create(
+            [
+                VoucherCode(code=code, plan=plan, expiry_date=expiry_date, batch=batch)
+                for code in candidates - taken
+            ],
+            batch_size=1000,
+            ignore_conflicts=True,
+        )
+        created = VoucherCode.objects.filter(batch=batch).count()
+    return batch
+
+
+def redeem_voucher(code, user, plan=None):
+    """
+    Mark an unused, unexpired voucher as used by ``user`` with one conditional
+    UPDATE and return it, or None if it does not exist, is expired, belongs to
+    another plan or was already redeemed (possibly a moment ago, concurrently).
+    """
+    now = timezone.now()
+    vouchers = VoucherCode.redeemable(now).filter(code=code)
+    if plan is not None:
+        vouchers = vouchers.filter(plan=plan)
+    with transaction.atomic():
+        if not vouchers.update(is_used=True, used_by=user, used_at=now):
+            return None
+        return VoucherCode.objects.select_related('plan').get(code=code)
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def iter_vouchers_csv(vouchers):
+    """Yield ``vouchers`` as CSV lines, reading the rows in chunks."""
+    writer = csv.writer(_Echo())
+    yield writer.writerow(CSV_FIELDS)
+    rows = vouchers.order_by('pk').values_list(
+        'code', 'plan__name', 'batch', 'expiry_date', 'is_used', 'used_by__email', 'used_at'
+    )
+    for row in rows.iterator(chunk_size=5000):
+        yield writer.writerow(['' if value is None else value for value in row])
+
+
+def write_vouchers_csv(vouchers, out):
+    for line in iter_vouchers_csv(vouchers):
+        out.write(line)
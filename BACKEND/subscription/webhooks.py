@@ -0,0 +1,150 @@
+import hashlib
+import json
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Payment, WebhookEvent
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_BATCH_SIZE = 500
+
+
+class WebhookRetry(Exception):
+    """The event cannot be applied yet (e.g. its payment is not stored yet)."""
+
+
+def flutterwave_event_id(payload):
+    """
+    Flutterwave sends the same transaction ``data.id`` on every redelivery of
+    an event; deliveries without one are keyed by a hash of the payload.
+    """
+    transaction_id = (payload.get('data') or {}).get('id')
+    if transaction_id:
+        return f"{payload.get('event', '')}:{transaction_id}"
+    body = json.dumps(payload, sort_keys=True, separators=(',', ':'), default=str)
+    return 'sha256:' + hashlib.sha256(body.encode('utf-8')).hexdigest()
+
+
+def store_webhook_event(gateway, event_id, payload):
+    """
+    Insert the event unless this gateway event ID is already stored, in a
+    single ``INSERT ... ON CONFLICT DO NOTHING``.
+    """
+    data = payload.get('data') or {}
+    WebhookEvent.objects.bulk_create(
+        [WebhookEvent(
+            gateway=gateway,
+            event_id=event_id,
+            event_type=payload.get('event', ''),
+            reference=data.get('tx_ref') or '',
+            payload=payload,
+        )],
+        ignore_conflicts=True,
+    )
+    if settings.PAYMENT_WEBHOOK_MODE == 'inline':
+        transaction.on_commit(process_webhook_events)
+
+
+def apply_charge_completed(event):
+    """Mark the payment and activate its subscription, once."""
+    data = event.payload.get('data') or {}
+    tx_ref = data.get('tx_ref')
+    if not tx_ref:
+        return 'ignored', 'Missing tx_ref'
+
+    payment = Payment.objects.select_related('subscription').filter(reference=tx_ref).first()
+    if payment is None:
+        # The webhook can beat the Payment row written after initialization.
+        raise WebhookRetry(f'Payment {tx_ref} not found')
+    if payment.status == 'successful':
+        return 'ignored', 'Payment already successful'
+
+    if data.get('status', 'successful') != 'successful':
+        payment.status = 'failed'
+        payment.payment_response = event.payload
+        payment.save(update_fields=['status', 'payment_response', 'updated_at'])
+        return 'processed', ''
+
+    payment.status = 'successful'
+    payment.payment_response = event.payload
+    payment.save(update_fields=['status', 'payment_response', 'updated_at'])
+
+    subscription = payment.subscription
+    if not subscription.is_active:
+        subscription.is_active = True
+        subscription.save(update_fields=['is_active', 'updated_at'])
+    return 'processed', ''
+
+
+HANDLERS = {
+    ('flutterwave', 'charge.completed'): apply_charge_completed,
+}
+
+
+def handles(gateway, event_type):
+    return (gateway, event_type) in HANDLERS
+
+
+def process_webhook_event(pk):
+    """
+    Apply one pending event. The event is claimed with a conditional UPDATE in
+    the same transaction as its effects, so concurrent workers apply it at
+    most once and a failure leaves it pending. Returns the new status, or
+    None if another worker got to it first.
+    """
+    try:
+        with transaction.atomic():
+            claimed = WebhookEvent.objects.filter(pk=pk, status='pending').update(
+                status='processed', processed_at=timezone.now(), last_error=''
+            )
+            if not claimed:
+                return None
+            event = WebhookEvent.objects.get(pk=pk)
+            handler = HANDLERS.get((event.gateway, event.event_type))
+            if handler is None:
+                outcome, note = 'ignored', 'No handler'
+            else:
+                outcome, note = handler(event)
+            if outcome != 'processed':
+                WebhookEvent.objects.filter(pk=pk).update(status=outcome, last_error=note)
+            return outcome
+    except Exception as exc:
+        if not isinstance(exc, WebhookRetry):
+            logger.exception('Applying webhook event %s failed', pk)
+        event = WebhookEvent.objects.get(pk=pk)
+        event.attempts += 1
+        event.last_error = str(exc)
+        if event.attempts >= settings.PAYMENT_WEBHOOK_MAX_ATTEMPTS:
+            event.status = 'failed'
+        event.save(update_fields=['attempts', 'last_error', 'status'])
+        return 'failed' if event.status == 'failed' else 'pending'
+
+
+def process_webhook_events(limit=WEBHOOK_BATCH_SIZE):
+    """
+    Apply pending events in arrival order. Once an event for a payment
+    reference has to wait, later events for that reference wait too, so each
+    payment sees its events in order. Returns a count per outcome.
+    """
+    counts = {'processed': 0, 'ignored': 0, 'pending': 0, 'failed': 0}
+    pending = (
+        WebhookEvent.objects.filter(status='pending')
+        .order_by('id')
+        .values_list('pk', 'reference')[:limit]
+    )
+    blocked = set()
+    for pk, reference in pending:
+        if reference and reference in blocked:
+            counts['pending'] += 1
+            continue
+        outcome = process_webhook_event(pk)
+        if outcome is None:
+            continue
+        counts[outcome] += 1
+        if outcome == 'pending' and reference:
+            blocked.add(reference)
+    return counts
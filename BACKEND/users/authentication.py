@@ -0,0 +1,55 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import router
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+
+from core.cache import is_shared
+from .tokens import ENTITLEMENT_CLAIMS
+
+INACTIVE_KEY = 'users:inactive:%s'
+
+
+def _inactive_timeout():
+    # Access tokens issued before the account was deactivated expire by then,
+    # and no new ones are issued to an inactive account.
+    return int(settings.SIMPLE_JWT['ACCESS_TOKEN_LIFETIME'].total_seconds())
+
+
+def mark_inactive(user_id):
+    """Refuse ``user_id``'s outstanding access tokens (deactivated or deleted account)."""
+    cache.set(INACTIVE_KEY % user_id, True, timeout=_inactive_timeout())
+
+
+def mark_active(user_id):
+    cache.delete(INACTIVE_KEY % user_id)
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that does not load the user row when the access token
+    carries entitlement claims (see users.tokens.EntitledRefreshToken).
+
+    request.user is a User with only its primary key loaded; any other field
+    is fetched from the database on first access. Instead of the account's
+    is_active flag, a shared-cache marker set when the account is deactivated
+    or deleted is checked. Without a shared cache the marker would not reach
+    other workers, so the user row is loaded as usual. Only use this on
+    read-only endpoints.
+    """
+
+    def get_user(self, validated_token):
+        if any(claim not in validated_token for claim in ENTITLEMENT_CLAIMS) or not is_shared():
+            return super().get_user(validated_token)
+        user_id = validated_token[api_settings.USER_ID_CLAIM]
+        if cache.get(INACTIVE_KEY % user_id):
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        user_model = get_user_model()
+        return user_model.from_db(
+            router.db_for_read(user_model),
+            [api_settings.USER_ID_FIELD],
+            [user_id],
+        )
@@ -1,11 +1,13 @@
 from rest_framework.permissions import BasePermission
+from .roles import CONTENT_ADMIN_GROUP, SUPER_ADMIN_ROLE, get_group_names, user_role
 
 class IsSuperAdmin(BasePermission):
     def has_permission(self, request, view):
-        return request.user and request.user.is_authenticated and (
-            request.user.is_superuser or request.user.groups.filter(name='Super Admin').exists()
-        )
+        return user_role(request.user) == SUPER_ADMIN_ROLE
 
 class IsContentAdmin(BasePermission):
     def has_permission(self, request, view):
-        return request.user and request.user.is_authenticated and request.user.groups.filter(name='Content Admin').exists()
+        return bool(
+            request.user and request.user.is_authenticated
+            and CONTENT_ADMIN_GROUP in get_group_names(request.user)
+        )
@@ -0,0 +1,65 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from core.cache import bump_version, cache_timeout, get_version, is_shared
+
+SUPER_ADMIN_GROUP = 'Super Admin'
+CONTENT_ADMIN_GROUP = 'Content Admin'
+SUPER_ADMIN_ROLE = 'super_admin'
+CONTENT_ADMIN_ROLE = 'content_admin'
+ADMIN_GROUPS = frozenset({SUPER_ADMIN_GROUP, CONTENT_ADMIN_GROUP})
+
+GROUPS_VERSION_KEY = 'users:groups:version'
+GROUPS_KEY = 'users:groups:%s:%s'
+
+
+def get_group_names(user):
+    """
+    The names of the user's groups, loaded at most once per request (kept on
+    the user object) and cached per user across requests. Uses
+    ``prefetch_related('groups')`` results when present.
+
+    Membership changes only invalidate the cache of every worker when it is
+    shared. With a per-process cache, admin memberships are therefore read
+    from the database on every request, so a revoked role stops working at
+    once, and other lists are kept for LOCAL_CACHE_TIMEOUT seconds at most.
+    """
+    names = getattr(user, '_group_names', None)
+    if names is not None:
+        return names
+    prefetched = getattr(user, '_prefetched_objects_cache', {}).get('groups')
+    if prefetched is not None:
+        names = frozenset(group.name for group in prefetched)
+    else:
+        key = GROUPS_KEY % (get_version(GROUPS_VERSION_KEY), user.pk)
+        names = cache.get(key)
+        if names is None:
+            names = frozenset(user.groups.values_list('name', flat=True))
+            if is_shared() or not names & ADMIN_GROUPS:
+                cache.set(key, names, timeout=cache_timeout(settings.ROLE_CACHE_TIMEOUT))
+    user._group_names = names
+    return names
+
+
+def user_role(user):
+    """'super_admin', 'content_admin' or None."""
+    if not user or not user.is_authenticated:
+        return None
+    if user.is_superuser:
+        return SUPER_ADMIN_ROLE
+    names = get_group_names(user)
+    if SUPER_ADMIN_GROUP in names:
+        return SUPER_ADMIN_ROLE
+    if CONTENT_ADMIN_GROUP in names:
+        return CONTENT_ADMIN_ROLE
+    return None
+
+
+def invalidate_user_roles(user_ids):
+    version = get_version(GROUPS_VERSION_KEY)
+    cache.delete_many([GROUPS_KEY % (version, user_id) for user_id in user_ids])
+
+
+def invalidate_all_roles():
+    """Forget every cached group list, e.g. after a group is renamed or deleted."""
+    bump_version(GROUPS_VERSION_KEY)
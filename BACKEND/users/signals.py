@@ -1,9 +1,14 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete, m2m_changed
 from django.dispatch import receiver
+from django.contrib.auth.models import Group
 from django.contrib.auth.signals import user_logged_in
 from django.utils import timezone
+from .authentication import mark_active, mark_inactive
 from .models import User, LoginHistory
+from .roles import invalidate_user_roles, invalidate_all_roles
 from rewards.models import UserStreak, UserPoints
+from rewards.outbox import enqueue_award
+from rewards.rules import rule_points
 
 
 @receiver(post_save, sender=User)
@@ -17,6 +22,21 @@ def create_user_profile(sender, instance, created, **kwargs):
         UserPoints.objects.create(user=instance)
 
 
+@receiver(post_save, sender=User)
+def track_account_deactivation(sender, instance, created, **kwargs):
+    """Let token-only authentication refuse deactivated accounts at once."""
+    if instance.is_active:
+        if not created:
+            mark_active(instance.pk)
+    else:
+        mark_inactive(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def track_account_deletion(sender, instance, **kwargs):
+    mark_inactive(instance.pk)
+
+
 @receiver(user_logged_in)
 def update_user_login_info(sender, user, request, **kwargs):
     """Update user login information and streak."""
@@ -46,15 +66,30 @@ def update_user_login_info(sender, user, request, **kwargs):
         streak = UserStreak.objects.get(user=user)
         streak.update_streak()
         
-        # Add points for daily login if applicable
+        # Add points for the first login of the day; the key makes later
+        # logins that day a no-op
         current_date = timezone.now().date()
-        if not streak.last_activity_date or streak.last_activity_date != current_date:
-            from rewards.models import PointsRule
-            try:
-                login_rule = PointsRule.objects.get(action_type='login', is_active=True)
-                user_points = UserPoints.objects.get(user=user)
-                user_points.add_points(login_rule.points, 'Daily login reward')
-            except PointsRule.DoesNotExist:
-                pass
+        login_points = rule_points('login')
+        if login_points is not None:
+            enqueue_award(user.pk, login_points, 'Daily login reward', f'login:{user.pk}:{current_date}')
     except UserStreak.DoesNotExist:
-        pass
\ No newline at end of file
+        pass
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def invalidate_roles_on_membership_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """Forget cached group names when users are added to or removed from groups."""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        invalidate_user_roles([instance.pk])
+    elif pk_set:
+        invalidate_user_roles(pk_set)
+    else:
+        # group.custom_user_set.clear() does not say which users were members.
+        invalidate_all_roles()
+
+
+@receiver([post_save, post_delete], sender=Group)
+def invalidate_roles_on_group_change(sender, **kwargs):
+    invalidate_all_roles()
@@ -1,3 +1,79 @@
+from unittest import mock
+
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .models import User
+from .roles import CONTENT_ADMIN_GROUP, CONTENT_ADMIN_ROLE, user_role
+
+LESSONS_URL = '/api/content/videos/'
+
+
+class ClaimsAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(email='learner@example.com', is_active=True)
+        token = AccessToken.for_user(self.user)
+        token['plan'] = token['plan_exp'] = token['role'] = None
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def deactivate(self):
+        self.user.is_active = False
+        self.user.save()
+
+    def test_deactivated_account_is_refused(self):
+        self.assertEqual(self.client.get(LESSONS_URL).status_code, 200)
+        self.deactivate()
+        self.assertEqual(self.client.get(LESSONS_URL).status_code, 401)
+
+    @mock.patch('users.authentication.is_shared', return_value=True)
+    def test_token_only_user_is_refused_once_deactivated(self, is_shared):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(LESSONS_URL).status_code, 200)
+        self.assertFalse([query for query in queries if 'FROM "users_user"' in query['sql']])
+        self.deactivate()
+        self.assertEqual(self.client.get(LESSONS_URL).status_code, 401)
+        self.user.is_active = True
+        self.user.save()
+        self.assertEqual(self.client.get(LESSONS_URL).status_code, 200)
+
+    @mock.patch('users.authentication.is_shared', return_value=True)
+    def test_token_only_user_is_refused_once_deleted(self, is_shared):
+        self.user.delete()
+        self.assertEqual(self.client.get(LESSONS_URL).status_code, 401)
+
+
+class RoleCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(email='tutor@example.com')
+        self.group = Group.objects.create(name='Tutors')
+        self.user.groups.add(self.group)
+
+    def role(self):
+        # A fresh object per request, as the authentication backend gives.
+        return user_role(User.objects.get(pk=self.user.pk))
+
+    def assertRoleFollowsChanges(self):
+        self.assertIsNone(self.role())
+        # Renaming a group drops every cached group list.
+        self.group.name = CONTENT_ADMIN_GROUP
+        self.group.save()
+        self.assertEqual(self.role(), CONTENT_ADMIN_ROLE)
+        self.user.groups.remove(self.group)
+        self.assertIsNone(self.role())
+
+    def test_role_follows_changes(self):
+        self.assertRoleFollowsChanges()
 
-# Create your tests here.
+    @mock.patch('users.roles.is_shared', return_value=True)
+    def test_role_follows_changes_with_shared_cache(self, is_shared):
+        self.assertRoleFollowsChanges()
+        with self.assertNumQueries(1):
+            self.role()
@@ -0,0 +1,56 @@
+from django.contrib.auth import get_user_model
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from subscription.entitlements import get_entitlement
+from .roles import user_role
+
+ENTITLEMENT_CLAIMS = ('plan', 'plan_exp', 'role')
+
+
+def entitlement_claims(user):
+    entitlement = get_entitlement(user)
+    return {
+        'plan': entitlement.plan_type if entitlement else None,
+        'plan_exp': int(entitlement.end_date.timestamp()) if entitlement else None,
+        'role': user_role(user),
+    }
+
+
+class EntitledRefreshToken(RefreshToken):
+    """
+    Refresh token whose access tokens carry the user's plan type, plan expiry
+    (unix time) and admin role, so read-only content endpoints can authorize
+    from the token alone (see users.authentication.ClaimsJWTAuthentication).
+
+    The claims are worked out afresh every time an access token is minted,
+    including on refresh, so they are at most one access token lifetime old.
+    """
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token._user = user
+        return token
+
+    @property
+    def access_token(self):
+        access = super().access_token
+        user = getattr(self, '_user', None)
+        if user is None:
+            user = get_user_model().objects.filter(
+                **{api_settings.USER_ID_FIELD: self.payload.get(api_settings.USER_ID_CLAIM)}
+            ).first()
+        if user is not None:
+            for claim, value in entitlement_claims(user).items():
+                access[claim] = value
+        return access
+
+
+class EntitledTokenObtainPairSerializer(TokenObtainPairSerializer):
+    token_class = EntitledRefreshToken
+
+
+class EntitledTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = EntitledRefreshToken
@@ -2,7 +2,7 @@ from django.shortcuts import render
 from rest_framework import generics, status, permissions
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework_simplejwt.tokens import RefreshToken
+from .tokens import EntitledRefreshToken
 from django.contrib.auth import get_user_model
 from .serializers import (
     UserRegistrationSerializer, UserLoginSerializer, PasswordResetRequestSerializer,
@@ -15,6 +15,7 @@ from rest_framework.parsers import JSONParser, MultiPartParser, FormParser
 from datetime import timedelta
 from django.conf import settings
 from .permissions import IsSuperAdmin, IsContentAdmin
+from .roles import user_role
 from django.contrib.auth.models import Group
 
 User = get_user_model()
@@ -116,7 +117,7 @@ class UserLoginView(APIView):
             serializer = self.serializer_class(data=request.data)
             if serializer.is_valid():
                 user = serializer.user
-                refresh = RefreshToken.for_user(user)
+                refresh = EntitledRefreshToken.for_user(user)
                 # Get access token lifetime from settings or default to 1 hour
                 access_lifetime = getattr(settings, 'SIMPLE_JWT', {}).get('ACCESS_TOKEN_LIFETIME', timedelta(hours=1))
                 if isinstance(access_lifetime, timedelta):
@@ -213,12 +214,16 @@ class UserProfileView(generics.RetrieveUpdateAPIView):
 class AdminListView(APIView):
     permission_classes = [IsSuperAdmin]
     def get(self, request):
-        admins = User.objects.filter(groups__name__in=["Super Admin", "Content Admin"]).distinct()
+        admins = (
+            User.objects.filter(groups__name__in=["Super Admin", "Content Admin"])
+            .distinct()
+            .prefetch_related('groups')
+        )
         data = [
             {
                 "id": u.id,
                 "email": u.email,
-                "role": "super_admin" if u.groups.filter(name="Super Admin").exists() or u.is_superuser else "content_admin",
+                "role": user_role(u),
                 "is_active": u.is_active
             } for u in admins
         ]
@@ -259,8 +264,8 @@ class AdminProfileView(APIView):
     
     def get(self, request):
         user = request.user
-        if user.is_superuser or user.groups.filter(name__in=['Super Admin', 'Content Admin']).exists():
-            role = 'super_admin' if user.is_superuser or user.groups.filter(name='Super Admin').exists() else 'content_admin'
+        role = user_role(user)
+        if role:
             return Response({
                 'id': user.id,
                 'email': user.email,